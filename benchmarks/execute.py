@@ -0,0 +1,122 @@
+"""
+benchmarks/execute.py  -  Measure "ifup --all" against a simulated system
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from ifupdown_ng import simulate
+from ifupdown_ng import state
+from ifupdown_ng.commands import CommandHandlerType
+
+## Number of VLAN interfaces stacked on each trunk interface
+VLANS_PER_TRUNK = 9
+
+def write_config(path, count):
+	"""Write 'count' interfaces: trunks, each with a set of VLANs"""
+	names = []
+	with open(path, 'w') as ifile:
+		for i in xrange(count):
+			trunk = 'trunk%d' % (i // (VLANS_PER_TRUNK + 1))
+			if i % (VLANS_PER_TRUNK + 1) == 0:
+				names.append(trunk)
+				ifile.write('auto %s\niface %s inet manual\n'
+						% (trunk, trunk))
+				continue
+			name = 'vlan%d' % i
+			names.append(name)
+			ifile.write('auto %s\n'
+				'iface %s inet static\n'
+				'\taddress 10.%d.%d.1/24\n'
+				'\tvlan-raw-device %s\n'
+				'\tup /usr/local/sbin/announce $IFACE\n'
+				% (name, name, i // 256, i % 256, trunk))
+	return names
+
+def run_ifup(workdir, names, jobs, latencies):
+	"""Run "ifup --all" in-process and return (seconds, system)"""
+	system = simulate.SimulatedSystem(latencies)
+	for name in names:
+		system.add_link(name)
+	state.STATE_FILE = os.path.join(workdir, 'ifstate')
+	if os.path.exists(state.STATE_FILE):
+		os.unlink(state.STATE_FILE)
+
+	handler = CommandHandlerType.load_command('ifup')('ifup')
+	system.install()
+	try:
+		start = time.time()
+		status = handler.main(['-i',
+				os.path.join(workdir, 'interfaces'), '--all',
+				'--force', '--no-scripts', '--log-level',
+				'ERROR', '-j', str(jobs)])
+		elapsed = time.time() - start
+	finally:
+		system.uninstall()
+	if status:
+		sys.exit('ifup failed with status %d' % status)
+	return elapsed, system
+
+def main():
+	argp = argparse.ArgumentParser(
+			description='Benchmark "ifup --all" on a simulated '
+				'system')
+	argp.add_argument('-n', '--count', type=int, default=1000,
+			help='Number of interfaces to configure')
+	argp.add_argument('-j', '--jobs', type=int, action='append',
+			help='Number of parallel jobs to measure (repeatable, '
+				'default: 1 and 8)')
+	argp.add_argument('--ip-latency', type=float, default=0.002,
+			help='Seconds taken by each simulated ip(8) command')
+	argp.add_argument('--hook-latency', type=float, default=0.005,
+			help='Seconds taken by each simulated "up" command')
+	args = argp.parse_args()
+
+	latencies = {'ip': args.ip_latency, 'sh': args.hook_latency}
+	workdir = tempfile.mkdtemp(prefix='ifupdown-ng-bench.')
+	try:
+		names = write_config(os.path.join(workdir, 'interfaces'),
+				args.count)
+		baseline = None
+		print '%d interfaces, ip %gs, hooks %gs' % (len(names),
+				args.ip_latency, args.hook_latency)
+		print '%-6s %10s %12s %8s  %s' % ('jobs', 'seconds',
+				'ifaces/s', 'speedup', 'spawns')
+		for jobs in args.jobs or [1, 8]:
+			elapsed, system = run_ifup(workdir, names, jobs,
+					latencies)
+			if baseline is None:
+				baseline = elapsed
+			spawns = ' '.join('%s=%d' % item for item in
+					sorted(system.spawns.iteritems()))
+			print '%-6d %10.3f %12.1f %7.2fx  %s' % (jobs, elapsed,
+					len(names) / elapsed,
+					baseline / elapsed, spawns)
+	finally:
+		shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+"""
+benchmarks/spawn.py  -  Compare direct and fork-server command spawning
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir))
+
+from ifupdown_ng import script
+from ifupdown_ng import spawn
+from ifupdown_ng.commands import ARGS
+
+def make_ballast(megabytes):
+	"""Fill memory with many small objects, like a large parsed config"""
+	ballast = []
+	for i in xrange(megabytes * 1024):
+		ballast.append(dict(('option-%d' % j, 'x' * 64)
+				for j in xrange(8)))
+		ballast[-1]['name'] = 'vlan%d' % i
+	return ballast
+
+def time_spawns(env, count):
+	"""Run /bin/true 'count' times and return the spawns per second"""
+	start = time.time()
+	for _ in xrange(count):
+		env.call(['/bin/true'])
+	return count / (time.time() - start)
+
+def main():
+	argp = argparse.ArgumentParser(
+			description='Compare direct and fork-server spawning')
+	argp.add_argument('-n', '--count', type=int, default=500,
+			help='Number of commands to spawn in each case')
+	argp.add_argument('-m', '--ballast', type=int, default=256,
+			help='Approximate megabytes of objects to allocate '
+				'before spawning')
+	args = argp.parse_args()
+	ARGS.verbose = False
+
+	## As in ifup, the server is started before memory fills up
+	spawn.start_server()
+	try:
+		ballast = make_ballast(args.ballast)
+		env = script.Environment()
+		server = spawn.SERVER
+
+		spawn.SERVER = None
+		direct = time_spawns(env, args.count)
+		spawn.SERVER = server
+		served = time_spawns(env, args.count)
+	finally:
+		spawn.stop_server()
+
+	print '%d objects allocated, %d spawns each' % (len(ballast),
+			args.count)
+	print '%-14s %10.1f spawns/s' % ('direct', direct)
+	print '%-14s %10.1f spawns/s' % ('fork-server', served)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+"""
+benchmarks/startup.py  -  Measure command startup latency
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+		os.pardir, 'ifupdown-ng')
+
+## A small but realistic interfaces(5) file for the "ifup -n" case
+INTERFACES = '''
+auto lo eth0
+iface lo inet loopback
+
+iface eth0 inet static
+	address 192.0.2.10
+	netmask 255.255.255.0
+	gateway 192.0.2.1
+	up echo up
+'''
+
+def time_command(argv, repeat):
+	"""Run a command 'repeat' times and return the sorted wall times"""
+	results = []
+	with open(os.devnull, 'w') as devnull:
+		for _ in xrange(repeat):
+			start = time.time()
+			subprocess.call(argv, stdout=devnull, stderr=devnull)
+			results.append(time.time() - start)
+	return sorted(results)
+
+def main():
+	argp = argparse.ArgumentParser(
+			description='Measure ifupdown-ng startup latency')
+	argp.add_argument('-r', '--repeat', type=int, default=50,
+			help='Number of runs of each command')
+	args = argp.parse_args()
+
+	tmpdir = tempfile.mkdtemp()
+	try:
+		ifaces = os.path.join(tmpdir, 'interfaces')
+		with open(ifaces, 'w') as ifile:
+			ifile.write(INTERFACES)
+
+		cases = (
+			('python -c pass', [sys.executable, '-c', 'pass']),
+			('ifquery --version', [sys.executable, SCRIPT,
+				'ifquery', '--version']),
+			('ifup -n --all', [sys.executable, SCRIPT,
+				'ifup', '-n', '--all', '-i', ifaces]),
+		)
+		print '%-20s %9s %9s %9s' % ('command', 'min', 'median', 'max')
+		for name, argv in cases:
+			times = time_command(argv, args.repeat)
+			print '%-20s %7.2fms %7.2fms %7.2fms' % (name,
+				times[0] * 1000, times[len(times) // 2] * 1000,
+				times[-1] * 1000)
+	finally:
+		shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+	main()
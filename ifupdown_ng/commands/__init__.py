@@ -19,17 +19,36 @@ with this program; otherwise you can obtain it here:
 ## Futureproofing boilerplate
 from __future__ import absolute_import
 
-import argparse
+import importlib
 import logging
 import os.path
 import sys
 
 from ifupdown_ng.autogen.version import VERSION
 from ifupdown_ng import logfilter
+from ifupdown_ng import parser
+from ifupdown_ng import profiling
 
 
-## This is a namespace used to hold all the parsed command-line arguments
-ARGS = argparse.Namespace()
+## This is a namespace used to hold all the parsed command-line arguments.
+## ArgumentParser.parse_args() fills in any object, so a plain one is used
+## here; that way the config parser and the other library modules which
+## read ARGS do not pull in argparse when they are imported.
+class _Namespace(object):
+	pass
+
+ARGS = _Namespace()
+
+
+## Static registry of the module which implements each command.  Only the
+## module for the selected command is imported at runtime, which keeps the
+## startup cost of each command independent of all the others.
+COMMAND_MODULES = {
+	'ifup':    'ifupdown_ng.commands.ifupdown',
+	'ifdown':  'ifupdown_ng.commands.ifupdown',
+	'ifquery': 'ifupdown_ng.commands.ifquery',
+	'ifcheck': 'ifupdown_ng.commands.ifcheck',
+}
 
 
 ## This simple metaclass maintains a database of all command handler classes
@@ -38,6 +57,13 @@ class CommandHandlerType(type):
 	_known_commands = dict()
 	_max_command_len = 0
 
+	@classmethod
+	def load_command(mcs, command):
+		## Import the implementation of a command if necessary
+		if command not in mcs._known_commands:
+			importlib.import_module(COMMAND_MODULES[command])
+		return mcs._known_commands[command]
+
 	def __new__(mcs, name, bases, namespace):
 		cls = type.__new__(mcs, name, bases, namespace)
 		for command in cls.COMMANDS:
@@ -49,11 +75,16 @@ class CommandHandlerType(type):
 
 	@classmethod
 	def print_usage_error(mcs, command):
+		## Everything is needed for the descriptions
+		for known_command in COMMAND_MODULES:
+			mcs.load_command(known_command)
+
 		sys.stderr.write('Unknown command: %s\n' % command)
 		sys.stderr.write('This application contains code for multiple commands:\n')
-		for cmd, desc in sorted(mcs._known_commands.iteritems()):
+		for cmd, cls in sorted(mcs._known_commands.iteritems()):
 			sys.stderr.write('  %-*s  -  %s\n' %
-				(mcs._max_command_len, cmd, desc))
+				(mcs._max_command_len, cmd,
+				cls.COMMANDS[cmd]))
 
 		sys.stderr.write('''
 To select the appropriate command, you may either run this binary via a
@@ -76,15 +107,15 @@ first argument is one of the above commands.
 		## If that's not a known command, then hopefully the user
 		## specified one of "ifup", "ifdown", etc as the first
 		## argument.
-		if not command in mcs._known_commands:
-			if argv and argv[0] in mcs._known_commands:
+		if not command in COMMAND_MODULES:
+			if argv and argv[0] in COMMAND_MODULES:
 				command = argv.pop(0)
 			else:
 				mcs.print_usage_error(command)
 				sys.exit(2)
 
 		## Now let's actually run that command handler
-		cmdh = mcs._known_commands[command](command)
+		cmdh = mcs.load_command(command)(command)
 		return cmdh.main(argv)
 
 
@@ -123,7 +154,9 @@ with this program; otherwise you can obtain it here:
 	def __init__(self, command, **kwargs):
 		self.logger = None
 
-		## Create the argument parser
+		## Create the argument parser (argparse is only imported once
+		## a command has actually been selected)
+		import argparse
 		self.argp = argparse.ArgumentParser(prog=command,
 				description=self.COMMANDS[command],
 				**kwargs)
@@ -141,12 +174,36 @@ with this program; otherwise you can obtain it here:
 			choices=self._LOG_LEVELS, default='INFO',
 			help='Control which messages are displayed')
 
+		self.argp.add_argument('--log-json', type=str, metavar='FILE',
+			help='Also append messages to FILE as JSON lines')
+
+		self.argp.add_argument('--profile', type=str, metavar='FILE',
+			help='Profile the command and write the statistics to '
+				'FILE (or "-" for text on stderr)')
+
+		self.argp.add_argument('--profile-format',
+			choices=profiling.FORMATS, default='text',
+			help='Write sorted text statistics or pstats dumps')
+
+		self.argp.add_argument('--profile-sort',
+			choices=profiling.SORT_KEYS, default='cumulative',
+			help='The sort order for text statistics')
+
+		self.argp.add_argument('--profile-startup', action='store_true',
+			help='Also profile module imports and startup in a '
+				'separate section (requires --profile)')
+
 	def main(self, argv):
 		## Before doing anything that might generate log messages,
 		## set up the default global stderr logging handler.
 		logging.basicConfig(format='%(levelname)s: %(message)s')
 		self.logger = logging.getLogger()
-		self.logger.addFilter(self.log_total)
+
+		## Logger filters only see records logged directly to that
+		## logger, so count messages at the root handler instead in
+		## order to include those propagated from module loggers.
+		for handler in self.logger.handlers:
+			handler.addFilter(self.log_total)
 
 		## Begin redirecting python warnings into the logging system
 		logging.captureWarnings(True)
@@ -154,11 +211,55 @@ with this program; otherwise you can obtain it here:
 		## Perform argument parsing
 		self.argp.parse_args(argv, namespace=ARGS)
 
-		## Set up the global log-level
-		self.logger.setLevel(getattr(logging, ARGS.log_level))
+		## Set up the global log-level, which the (non-propagating)
+		## config-file loggers leave to their handlers.
+		level = getattr(logging, ARGS.log_level)
+		self.logger.setLevel(level)
+		parser.DEFAULT_HANDLER.setLevel(level)
+
+		## Add the structured log sink, which also needs to be given to
+		## the (non-propagating) loggers used for config-file parsing.
+		if ARGS.log_json is not None:
+			try:
+				handler = logging.FileHandler(ARGS.log_json)
+			except EnvironmentError as ex:
+				self.argp.error('%s: %s' % (ex.strerror,
+						ARGS.log_json))
+			handler.setFormatter(logfilter.JSONFormatter())
+			handler.setLevel(level)
+			self.logger.addHandler(handler)
+			parser.GLOBAL_HANDLERS.append(handler)
+
+		## The startup profile (if any) was started by the top-level
+		## script and ends here, just before the command executes.
+		startup_profiler = profiling.stop_startup()
+		if ARGS.profile_startup and ARGS.profile is None:
+			self.argp.error('--profile-startup requires --profile')
+		if ARGS.profile == '-' and ARGS.profile_format == 'pstats':
+			self.argp.error('--profile-format pstats cannot be '
+					'written to "-"')
 
 		## Now actually execute the command
-		return self.execute() or 0
+		if ARGS.profile is None:
+			return self.run() or 0
+
+		profiler = profiling.new_profiler()
+		try:
+			return profiler.runcall(self.run) or 0
+		finally:
+			try:
+				profiling.write_stats(ARGS.profile, (
+					('startup', startup_profiler),
+					('execute', profiler),
+				), ARGS.profile_format, ARGS.profile_sort)
+			except EnvironmentError as ex:
+				self.logger.error('%s: %s' % (ex.strerror,
+						ARGS.profile))
+
+	def run(self):
+		## Subclasses may override this to wrap the execution of
+		## the command with additional setup and teardown.
+		return self.execute()
 
 	def execute(self):
 		## Must be implemented by a subclass
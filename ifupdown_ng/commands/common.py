@@ -23,6 +23,9 @@ import os.path
 
 from ifupdown_ng import commands
 from ifupdown_ng import config
+from ifupdown_ng import trace
+from ifupdown_ng import utils
+from ifupdown_ng.config import parser
 
 ## The base command-handler class from which all others are derived
 class CommonCommandHandler(commands.CommandHandler):
@@ -61,6 +64,120 @@ class CommonCommandHandler(commands.CommandHandler):
 			help=('Disable all hooks (in %s)' %
 				os.path.join(config.CONFIG_DIR, 'if-*.d')))
 
+		self.argp.add_argument('--trace', type=str, metavar='FILE',
+			help='Write a Chrome trace-event JSON file of the time '
+				'spent in each phase, hook, and command')
+
+		self.argp.add_argument('--metrics-dir', type=str,
+			metavar='DIR',
+			help='Write Prometheus metrics about this run to a '
+				'node_exporter textfile directory')
+
+	def run(self):
+		args = commands.ARGS
+		if args.trace is None and args.metrics_dir is None:
+			return super(CommonCommandHandler, self).run()
+
+		## Record spans for the whole command, then save them even if
+		## the command fails or exits early.  Metrics are totalled up
+		## from the same spans.
+		tracer = collector = None
+		if args.trace is not None:
+			tracer = trace.Tracer()
+		if args.metrics_dir is not None:
+			## Imported here since metrics are rarely enabled
+			from ifupdown_ng import metrics
+			collector = metrics.MetricsCollector(self.command,
+					tracer)
+		status = 1
+		try:
+			with trace.enable(collector or tracer).span(
+					self.command, 'command'):
+				status = super(CommonCommandHandler,
+						self).run()
+		except SystemExit as ex:
+			status = ex.code
+			raise
+		finally:
+			trace.disable()
+			if tracer is not None:
+				self.write_output(tracer.write, args.trace)
+			if collector is not None:
+				## As with sys.exit(), a message means failure
+				if not isinstance(status, int):
+					status = 1 if status else 0
+				collector.finish(status, self.log_total)
+				self.write_output(collector.write_textfile,
+						args.metrics_dir)
+		return status
+
+	def write_output(self, write, path):
+		## Write a trace or metrics file, logging any failure
+		try:
+			write(path)
+		except EnvironmentError as ex:
+			self.logger.error('%s: %s' % (ex.strerror, path))
+
+	def option_overrides(self):
+		## Parse the "-o OPTION=VALUE" arguments into the overrides for
+		## parser.ConfigOverlay, once for all of the stanzas.
+		stanza = parser.InterfaceConfig
+		overrides = dict()
+		for arg in commands.ARGS.option or ():
+			option, sep, value = arg.partition('=')
+			option = stanza.LEGACY_OPTION_SYNONYMS.get(option,
+					option)
+			if not sep or not stanza.VALID_OPTION_RE.match(option):
+				self.argp.error('Invalid option override: %s'
+						% arg)
+			if option in stanza.MULTIVALUE_OPTIONS:
+				overrides.setdefault(option, []).append(value)
+			else:
+				overrides[option] = value
+		return overrides
+
+	def select_targets(self, sysconfig, use_groups, run_mappings=True):
+		## Compute the list of (ifname, config_name) to operate on
+		return list(self.iter_targets(sysconfig, use_groups,
+				run_mappings))
+
+	def iter_targets(self, sysconfig, use_groups, run_mappings=True):
+		## Yield each (ifname, config_name) to operate on, either from
+		## the allow-groups or from the command line.  Any mapping is
+		## only run once the previous target has been consumed.
+		if use_groups:
+			## "allow-critical" interfaces are also automatic
+			groups = commands.ARGS.allow or ('auto', 'critical')
+			targets = ((ifname, None) for ifname in
+					sysconfig.allowed_interfaces(groups))
+		else:
+			targets = self._iter_arg_targets(sysconfig)
+
+		run_mappings = run_mappings and commands.ARGS.mappings
+		for ifname, config_name in targets:
+			if (commands.ARGS.exclude and utils.interface_matches(
+					ifname, commands.ARGS.exclude)):
+				continue
+
+			## Fill in the config name if it wasn't explicitly given
+			if config_name is None:
+				if run_mappings:
+					config_name = sysconfig.map_interface(
+							ifname)
+				else:
+					config_name = ifname
+			yield (ifname, config_name)
+
+	def _iter_arg_targets(self, sysconfig):
+		for arg in commands.ARGS.iface:
+			ifname, config_name = utils.split_interface_arg(arg)
+			if (commands.ARGS.allow and not sysconfig.is_allowed(
+					ifname, commands.ARGS.allow)):
+				self.logger.debug('Skipping %s: not allowed',
+						ifname)
+				continue
+			yield (ifname, config_name)
+
 	def execute(self):
 		## Must be implemented by a subclass
 		raise NotImplementedError()
@@ -0,0 +1,215 @@
+"""
+ifupdown_ng.commands.ifcheck  -  Command specification for 'ifcheck'
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import itertools
+import logging
+import os
+import signal
+import sys
+import time
+
+from ifupdown_ng import commands
+from ifupdown_ng import config
+from ifupdown_ng import logfilter
+from ifupdown_ng import methods
+from ifupdown_ng.commands import ARGS
+from ifupdown_ng.config import parser
+from ifupdown_ng.config import tokenizer
+
+## The interfaces file of a root directory, relative to that directory
+ROOT_INTERFACES_FILE = os.path.relpath(config.INTERFACES_FILE, '/')
+
+
+class MessageCollector(logging.Handler):
+	"""Logging Handler which keeps the messages about one config tree
+
+	Attributes:
+		messages: List of dicts with the level, message, and (if known)
+			the file and line of each record
+	"""
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.messages = []
+
+	def emit(self, record):
+		message = {
+			'level': record.levelname,
+			'message': record.getMessage(),
+		}
+		for field, attr in logfilter.JSONFormatter.FIELDS:
+			value = getattr(record, attr, None)
+			if value is not None:
+				message[field] = value
+		self.messages.append(message)
+
+
+def find_trees(path):
+	"""Return (interfaces file, root) for each config tree under 'path'
+
+	A file is checked on its own.  A directory is searched for root
+	directories (those containing etc/network/interfaces, whose absolute
+	"source" paths are taken relative to the root), and any other file
+	named "interfaces" found along the way is checked on its own.
+	"""
+	if not os.path.isdir(path):
+		return [(path, None)]
+
+	basename = os.path.basename(ROOT_INTERFACES_FILE)
+	trees = []
+	for dirpath, dirnames, filenames in os.walk(path):
+		candidate = os.path.join(dirpath, ROOT_INTERFACES_FILE)
+		if os.path.isfile(candidate):
+			trees.append((candidate, dirpath))
+			del dirnames[:]
+			continue
+		dirnames.sort()
+		if basename in filenames:
+			trees.append((os.path.join(dirpath, basename), None))
+	return trees
+
+def check_tree(tree):
+	"""Load one config tree and return the result as a dict
+
+	This runs in the worker processes, each of which checks many trees.
+	Everything cached at module level (the method schemas, directory
+	listings for "source" globs, and compiled fnmatch patterns) is kept
+	from one tree to the next.
+	"""
+	filename, root = tree
+	start = time.time()
+	collector = MessageCollector()
+	system_config = parser.SystemConfig(root=root, log_handler=collector)
+	try:
+		ifile = tokenizer.InterfacesFile(filename, handler=collector)
+	except EnvironmentError as ex:
+		collector.messages.append(dict(level='ERROR', file=filename,
+				message=ex.strerror))
+		system_config.total_nr_errors += 1
+	else:
+		system_config.load_interfaces_file(ifile)
+
+	return {
+		'file': filename,
+		'root': root,
+		'errors': system_config.total_nr_errors,
+		'warnings': system_config.total_nr_warnings,
+		'messages': collector.messages,
+		'files': len(system_config.file_fingerprints),
+		'stanzas': len(system_config.configs),
+		'templates': len(system_config.templates),
+		'fingerprint': system_config.fingerprint,
+		'time': round(time.time() - start, 6),
+	}
+
+def _init_worker():
+	## Interrupts are handled by the parent, which stops the pool
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+###
+## Command-line interface
+###
+class IfCheckCommandHandler(commands.CommandHandler):
+	COMMANDS = {
+		'ifcheck': 'Validate many interfaces(5) config trees',
+	}
+
+	def __init__(self, command, **kwargs):
+		super(IfCheckCommandHandler, self).__init__(command, **kwargs)
+
+		self.argp.add_argument('paths', nargs='+', metavar='PATH',
+			help='An interfaces(5) file, or a directory to search '
+				'for root directories containing %s'
+				% config.INTERFACES_FILE)
+
+		self.argp.add_argument('-j', '--jobs', type=int, default=0,
+			metavar='N',
+			help='Check up to N trees at once (default: one per '
+				'CPU)')
+
+		self.argp.add_argument('--strict', action='store_true',
+			help='Also fail trees which have any warnings')
+
+	def _failed(self, result):
+		return result['errors'] or (ARGS.strict and result['warnings'])
+
+	def execute(self):
+		import json
+		import multiprocessing
+
+		if ARGS.jobs < 0:
+			self.argp.error('--jobs must not be negative')
+
+		trees = []
+		for path in ARGS.paths:
+			found = find_trees(path)
+			if not found:
+				self.logger.warning('No interfaces files found '
+						'in %s' % path)
+			trees.extend(found)
+		jobs = min(ARGS.jobs or multiprocessing.cpu_count(),
+				len(trees))
+
+		## Compile every method schema before the workers are forked,
+		## so that they all start out sharing them.
+		for address_family, method in methods.METHOD_MODULES:
+			methods.get_schema(address_family, method)
+
+		start = time.time()
+		pool = None
+		if jobs > 1:
+			pool = multiprocessing.Pool(jobs, _init_worker)
+			## Hand out several small trees at a time, but keep the
+			## chunks small enough to balance the load.
+			chunksize = max(1, len(trees) // (jobs * 16))
+			results = pool.imap_unordered(check_tree, trees,
+					chunksize)
+		else:
+			results = itertools.imap(check_tree, trees)
+
+		## Each result is written as soon as it is ready, followed by
+		## the totals for the whole run.
+		summary = dict(trees=0, failed=0, errors=0, warnings=0,
+				files=0, stanzas=0)
+		try:
+			for result in results:
+				sys.stdout.write(json.dumps(result,
+						sort_keys=True) + '\n')
+				sys.stdout.flush()
+				summary['trees'] += 1
+				if self._failed(result):
+					summary['failed'] += 1
+				for key in ('errors', 'warnings', 'files',
+						'stanzas'):
+					summary[key] += result[key]
+		except BaseException:
+			if pool is not None:
+				pool.terminate()
+			raise
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+		summary['jobs'] = max(jobs, 1)
+		summary['time'] = round(time.time() - start, 6)
+		sys.stdout.write(json.dumps({'summary': summary},
+				sort_keys=True) + '\n')
+		return 1 if summary['failed'] else 0
@@ -23,10 +23,111 @@ import argparse
 import logging
 import sys
 
+from ifupdown_ng import sysfs
 from ifupdown_ng.commands import ARGS
 from ifupdown_ng.commands import common
 from ifupdown_ng.config import parser
 
+
+###
+## Output formats
+###
+## Each writer is called once for every queried interface (as soon as it
+## is resolved) with the output file, the interface name, the list of
+## InterfaceConfig stanzas for it (which may be empty), and its kernel
+## state.  The state is False if it was not requested, or None if the
+## interface does not currently exist.
+###
+def _state_items(state):
+	## Flatten a sysfs.LinkState into "state-KEY" pairs for text and TSV
+	if state is None:
+		return [('state', 'absent')]
+	result = []
+	for key, value in state.items():
+		if isinstance(value, list):
+			result.extend(('state-%s' % key, item) for item in value)
+		elif value is not None:
+			if isinstance(value, bool):
+				value = int(value)
+			result.append(('state-%s' % key, str(value)))
+	return result
+
+def _write_text(ofile, ifname, configs, state):
+	if ARGS.list:
+		ofile.write('%s\n' % ifname)
+		return
+
+	for config in configs:
+		if ARGS.fingerprint:
+			ofile.write('%s  %s %s %s\n' % (config.fingerprint,
+					config.name, config.address_family,
+					config.method))
+			continue
+		for option in sorted(config):
+			value = config[option]
+			if option not in config.MULTIVALUE_OPTIONS:
+				value = (value,)
+			for item in value:
+				ofile.write('%s: %s\n' % (option, item))
+	if state is not False:
+		for key, value in _state_items(state):
+			ofile.write('%s: %s\n' % (key, value))
+
+def _stanza_record(ifname, config):
+	return {
+		'iface': ifname,
+		'config': config.name,
+		'address_family': config.address_family,
+		'method': config.method,
+		'fingerprint': config.fingerprint,
+		'options': dict(config.options),
+	}
+
+def _write_json(ofile, ifname, configs, state):
+	import json
+	records = [_stanza_record(ifname, config) for config in configs]
+	if not records:
+		records.append({'iface': ifname})
+	if state is not False:
+		state = dict(state.items()) if state is not None else None
+		for record in records:
+			record['state'] = state
+	for record in records:
+		ofile.write(json.dumps(record, sort_keys=True) + '\n')
+
+def _tsv_escape(value):
+	return (value.replace('\\', '\\\\').replace('\t', '\\t')
+			.replace('\n', '\\n'))
+
+def _write_tsv(ofile, ifname, configs, state):
+	## IFACE CONFIG ADDRESS-FAMILY METHOD FINGERPRINT [OPTION=VALUE...]
+	## followed by any "state-KEY=VALUE" fields
+	state_fields = []
+	if state is not False:
+		state_fields = ['%s=%s' % item for item in _state_items(state)]
+	if not configs:
+		ofile.write('\t'.join(_tsv_escape(f) for f in
+				[ifname] + state_fields) + '\n')
+	for config in configs:
+		fields = [ifname, config.name, config.address_family,
+				config.method, config.fingerprint]
+		for option in sorted(config):
+			value = config[option]
+			if option not in config.MULTIVALUE_OPTIONS:
+				value = (value,)
+			for item in value:
+				fields.append('%s=%s' % (option, item))
+		fields.extend(state_fields)
+		ofile.write('\t'.join(_tsv_escape(f) for f in fields) + '\n')
+
+WRITERS = {
+	'text': _write_text,
+	'json': _write_json,
+	'tsv':  _write_tsv,
+}
+
+
+
 class IfQueryCommandHandler(common.CommonCommandHandler):
 	COMMANDS = {
 		'ifquery': 'Display network interface configuration and state',
@@ -41,6 +142,23 @@ class IfQueryCommandHandler(common.CommonCommandHandler):
 		self.argp.add_argument('-l', '--list', action='store_true',
 			help='List all matching known interfaces')
 
+		self.argp.add_argument('--fingerprint', action='store_true',
+			help='Display content fingerprints of the loaded config '
+				'files (with --list) or interface stanzas')
+
+		self.argp.add_argument('--format', choices=sorted(WRITERS),
+			default='text',
+			help='Output format: plain text, one JSON object per '
+				'stanza, or one tab-separated line per stanza')
+
+		self.argp.add_argument('--state', action='store_true',
+			help='Also display the current kernel state of each '
+				'interface (from sysfs)')
+
+		self.argp.add_argument('--state-root', type=str, default='/',
+			metavar='DIR',
+			help='Read kernel state from DIR/sys and DIR/proc')
+
 		self.argp.add_argument('iface', type=str, nargs='*',
 			help=argparse.SUPPRESS)
 
@@ -62,9 +180,36 @@ class IfQueryCommandHandler(common.CommonCommandHandler):
 			self.logger.critical('Not safe to continue, exiting...')
 			sys.exit(255)
 
-		## Figure out what to do based on arguments
-		if ARGS.list:
-			print "FIXME: LIST INTERFACES"
-		else:
-			ifaces = ', '.join(ARGS.iface)
-			print "FIXME: QUERY INTERFACES: %s" % ifaces
+		## File fingerprints don't depend on any interfaces
+		if ARGS.list and ARGS.fingerprint:
+			self.print_file_fingerprints(sysconfig)
+			return 0
+
+		## Kernel state for every interface is collected in one pass
+		links = sysfs.snapshot(ARGS.state_root) if ARGS.state else None
+
+		## Stream out the results one interface at a time: each target
+		## is resolved (running any mapping), looked up in the config
+		## index, and written before the next one is considered.
+		overrides = self.option_overrides()
+		write = WRITERS[ARGS.format]
+		result = 0
+		for ifname, config_name in self.iter_targets(sysconfig,
+				ARGS.list, run_mappings=not ARGS.list):
+			configs = sysconfig.configs_for_name(config_name,
+					overrides)
+			if not configs and not ARGS.list:
+				self.logger.error('Unknown interface: %s',
+						config_name)
+				result = 1
+				continue
+			state = links.get(ifname) if ARGS.state else False
+			write(sys.stdout, ifname, configs, state)
+		return result
+
+	@staticmethod
+	def print_file_fingerprints(sysconfig):
+		## Use the same "DIGEST  NAME" layout as sha1sum(1)
+		for filename, digest in sysconfig.file_fingerprints:
+			print '%s  %s' % (digest, filename)
+		print '%s  -' % sysconfig.fingerprint
@@ -21,8 +21,21 @@ from __future__ import absolute_import
 
 import argparse
 import logging
+import os
 import sys
+import threading
 
+from ifupdown_ng import depends
+from ifupdown_ng import execute
+from ifupdown_ng import methods
+from ifupdown_ng import netlink
+from ifupdown_ng import plan
+from ifupdown_ng import plugins
+from ifupdown_ng import replay
+from ifupdown_ng import schedule
+from ifupdown_ng import spawn
+from ifupdown_ng import state
+from ifupdown_ng.commands import ARGS
 from ifupdown_ng.commands import common
 from ifupdown_ng.config import parser
 
@@ -35,6 +48,8 @@ class IfUpDownCommandHandler(common.CommonCommandHandler):
 		## Initialize the parent class
 		super(IfUpDownCommandHandler, self).__init__(command,
 			usage='%(prog)s [<options>] (--all | <iface>...)')
+		self.recorder = None
+		self.replayer = None
 
 		## Add state-mutation options
 		self.argp.add_argument('-n', '--no-act', action='store_false',
@@ -45,14 +60,158 @@ class IfUpDownCommandHandler(common.CommonCommandHandler):
 		self.argp.add_argument('--force', action='store_true',
 			help='Run commands even if already up/down')
 
+		self.argp.add_argument('--netlink', action='store_true',
+			help='Apply built-in methods directly over rtnetlink '
+				'instead of running ip(8)')
+
+		self.argp.add_argument('--command-timeout', type=float,
+			metavar='SECONDS',
+			help='Kill any command or hook which runs longer than '
+				'this (default: no limit)')
+
+		self.argp.add_argument('--phase-timeout', type=float,
+			metavar='SECONDS',
+			help='Fail an interface if one of its phases runs longer '
+				'than this (default: no limit)')
+
+		self.argp.add_argument('--entry-point-hooks',
+			action='store_true',
+			help='Also run Python hook plugins from installed '
+				'packages (the "%s" entry points)'
+				% plugins.ENTRY_POINT_GROUP)
+
+		self.argp.add_argument('--fork-server', action='store_true',
+			help='Start commands and hooks from a small helper '
+				'process forked before the config is loaded')
+
+		self.argp.add_argument('--record', type=str, metavar='FILE',
+			help='Write every command, hook and mapping script '
+				'run (with its timing and result) to a trace '
+				'file (Python hook plugins cannot be traced, '
+				'so use --no-scripts if there are any)')
+
+		self.argp.add_argument('--replay', type=str, metavar='FILE',
+			help='Answer commands, hooks and mapping scripts '
+				'from a recorded trace file instead of running '
+				'them (with --no-scripts if there are Python '
+				'hook plugins)')
+
+		self.argp.add_argument('-j', '--jobs', type=int, default=1,
+			metavar='N',
+			help='Process up to N independent interfaces at once')
+
+		if command == 'ifup':
+			self.argp.add_argument('--compile-plan', type=str,
+				metavar='FILE',
+				help='Write a standalone boot plan shell script '
+					'instead of bringing interfaces up '
+					'(Python hook plugins and timeouts '
+					'cannot be compiled into a plan, so '
+					'use --no-scripts if there are any '
+					'plugins)')
+
 		## Add the interface list flags
 		self.argp.add_argument('iface', type=str, nargs='*',
 			help=argparse.SUPPRESS)
 
 		self.argp.add_argument('-a', '--all', action='store_true',
-			help='Process all interfaces marked "auto"')
+			help='Process all interfaces marked "auto" or '
+				'"allow-critical"')
 
 	def execute(self):
+		## Check for nonsensical option combinations
+		if not ARGS.all and not ARGS.iface:
+			self.argp.error('No interfaces specified')
+		if ARGS.all and ARGS.iface:
+			self.argp.error('Both --all and interfaces given')
+		compile_plan = getattr(ARGS, 'compile_plan', None)
+		if compile_plan is not None and not ARGS.all:
+			self.argp.error('--compile-plan requires --all')
+		if compile_plan is not None and (
+				ARGS.command_timeout is not None or
+				ARGS.phase_timeout is not None):
+			## The plan's shell commands are never given a limit
+			self.argp.error('--command-timeout and --phase-timeout '
+					'cannot be used with --compile-plan')
+		if ARGS.record is not None and ARGS.replay is not None:
+			self.argp.error('Both --record and --replay given')
+		if ARGS.record is not None or ARGS.replay is not None:
+			if ARGS.netlink:
+				self.argp.error('--record and --replay cannot '
+					'be used with --netlink')
+			if compile_plan is not None:
+				self.argp.error('--record and --replay cannot '
+					'be used with --compile-plan')
+		plugins.ENTRY_POINTS = ARGS.scripts and ARGS.entry_point_hooks
+		if ARGS.scripts and (compile_plan is not None or
+				ARGS.record is not None or
+				ARGS.replay is not None):
+			## Python hook plugins run inside this process, so a
+			## plan cannot run them and a trace cannot hold them
+			hooks = execute.list_mode_plugins('start'
+					if self.command == 'ifup' else 'stop')
+			if hooks and compile_plan is not None:
+				self.argp.error('Python hook plugins cannot '
+					'be compiled into a plan (use '
+					'--no-scripts to leave out all '
+					'hooks): %s' % ' '.join(
+						hook.description
+						for hook in hooks))
+			if hooks:
+				self.argp.error('Python hook plugins cannot '
+					'be recorded or replayed (use '
+					'--no-scripts to leave out all '
+					'hooks): %s' % ' '.join(
+						hook.description
+						for hook in hooks))
+
+		## Load the trace to replay before anything else is done
+		if ARGS.replay is not None:
+			try:
+				self.replayer = replay.Replayer(ARGS.replay)
+			except EnvironmentError as ex:
+				self.argp.error('%s: %s' % (ex.strerror,
+						ARGS.replay))
+			except ValueError as ex:
+				self.argp.error(str(ex))
+			if self.replayer.command != self.command:
+				self.argp.error('%s: Trace was recorded by %s'
+						% (ARGS.replay,
+						self.replayer.command))
+
+		## Each fork() from the helper is cheap because it is started
+		## before the parsed config fills up this process's memory.
+		if (ARGS.fork_server and ARGS.act and compile_plan is None
+				and self.replayer is None):
+			spawn.start_server()
+			try:
+				return self.trace_commands(compile_plan)
+			finally:
+				spawn.stop_server()
+		return self.trace_commands(compile_plan)
+
+	def trace_commands(self, compile_plan):
+		## The recorder (or replayer) stands in for whatever starts
+		## commands, including the mapping scripts run while the
+		## config is loaded.
+		if ARGS.record is not None:
+			try:
+				self.recorder = replay.Recorder(ARGS.record,
+						self.command)
+			except EnvironmentError as ex:
+				self.argp.error('%s: %s' % (ex.strerror,
+						ARGS.record))
+		tracer = self.recorder or self.replayer
+		if tracer is None:
+			return self.run_commands(compile_plan)
+		tracer.install()
+		try:
+			return self.run_commands(compile_plan)
+		finally:
+			tracer.close()
+
+	def run_commands(self, compile_plan):
+
 		## Load the configuration
 		sysconfig = parser.SystemConfig()
 		sysconfig.load_interfaces_file()
@@ -61,4 +220,218 @@ class IfUpDownCommandHandler(common.CommonCommandHandler):
 			self.logger.critical('Not safe to continue, exiting...')
 			sys.exit(255)
 
-		print "BLARG UPDOWN ME HARDER"
+		## Figure out which interfaces and stanzas to process
+		mode = 'start' if self.command == 'ifup' else 'stop'
+		targets = self.select_targets(sysconfig, ARGS.all)
+		seen = set()
+		targets = [target for target in targets if target[0] not in seen
+				and not seen.add(target[0])]
+		stanzas = sysconfig.configs_by_name(
+				(config_name for _, config_name in targets),
+				self.option_overrides())
+		critical = set()
+		if mode == 'start':
+			critical = self.critical_interfaces(sysconfig, targets,
+					stanzas)
+		targets = depends.order_targets(targets, stanzas, critical)
+		if mode == 'stop':
+			targets.reverse()
+		if compile_plan is not None:
+			return self.compile_plan(compile_plan, sysconfig, targets,
+					stanzas)
+
+		## Load the record of which interfaces are configured
+		statefile = state.StateFile()
+		try:
+			statefile.load()
+		except EnvironmentError as ex:
+			self.logger.warning('%s: %s' % (ex.strerror,
+					statefile.path))
+
+		## A replay processes the same interfaces as the recording,
+		## whatever state this system's interfaces are in.
+		deleted_links = set()
+		if self.replayer is not None:
+			if self.replayer.targets is not None:
+				replayed = set(self.replayer.targets)
+				targets = [target for target in targets
+						if target[0] in replayed]
+			deleted_links = self.replayer.deleted_links
+		elif not ARGS.force:
+			try:
+				links = netlink.snapshot()
+			except EnvironmentError as ex:
+				self.logger.warning('Unable to read interface '
+						'state: %s', ex.strerror)
+			else:
+				targets = self.skip_unchanged(mode, targets,
+						stanzas, statefile, links)
+				deleted_links = set(ifname
+						for ifname, _ in targets
+						if ifname not in links)
+		if self.recorder is not None:
+			self.recorder.add_targets([ifname
+					for ifname, _ in targets],
+					deleted_links)
+
+		backend = None
+		if ARGS.netlink and ARGS.act:
+			try:
+				backend = methods.NetlinkBackend()
+			except EnvironmentError as ex:
+				self.logger.warning('Unable to open rtnetlink, '
+					'falling back to ip(8): %s', ex.strerror)
+
+		executor = execute.Executor(mode, act=ARGS.act,
+				verbose=ARGS.verbose, scripts=ARGS.scripts,
+				backend=backend,
+				command_timeout=ARGS.command_timeout,
+				phase_timeout=ARGS.phase_timeout)
+		if mode == 'stop':
+			executor.deleted_links = deleted_links
+		tracer = self.recorder or self.replayer
+		if tracer is not None:
+			executor.link_waiter = tracer.link_waiter
+		config_names = dict(targets)
+		lock = threading.Lock()
+		def run_target(ifname):
+			configs = stanzas.get(config_names[ifname])
+			if not configs:
+				self.logger.error('Unknown interface: %s',
+						config_names[ifname])
+				return False
+			if not executor.run(ifname, configs):
+				self.logger.error('Failed to %s %s', self.command,
+						ifname)
+				return False
+			with lock:
+				if mode == 'start':
+					statefile.mark_up(ifname, configs)
+				else:
+					statefile.mark_down(ifname)
+			return True
+
+		## Dependencies are started first and stopped last
+		deps = depends.dependency_map(targets, stanzas)
+		if mode == 'stop':
+			deps = depends.reverse_map(deps)
+		on_ready = None
+		if mode == 'start' and ARGS.act:
+			on_ready = self.signal_ready
+		scheduler = schedule.Scheduler(run_target, jobs=ARGS.jobs,
+				on_ready=on_ready)
+		results = scheduler.run([ifname for ifname, _ in targets],
+				deps, critical)
+		result = 0 if all(results.itervalues()) else 1
+
+		## Nothing was changed by a replay, so the state is kept
+		if self.replayer is not None:
+			if self.replayer.unmatched:
+				self.logger.warning('%d commands were not in '
+					'the replayed trace',
+					self.replayer.unmatched)
+			return result
+
+		if ARGS.act:
+			try:
+				statefile.save()
+			except EnvironmentError as ex:
+				self.logger.error('%s: %s' % (ex.strerror,
+						statefile.path))
+				result = 1
+		return result
+
+	def critical_interfaces(self, sysconfig, targets, stanzas):
+		## Interfaces are critical if they are in "allow-critical" or
+		## have a "priority critical" option, and so are all of the
+		## interfaces which they depend on.
+		critical = set()
+		for ifname, config_name in targets:
+			if sysconfig.is_allowed(ifname, (
+					schedule.CRITICAL_GROUP,)):
+				critical.add(ifname)
+			for config in stanzas.get(config_name, ()):
+				if (config.options.get(schedule.PRIORITY_OPTION)
+						== schedule.CRITICAL_GROUP):
+					critical.add(ifname)
+		return depends.closure(critical,
+				depends.dependency_map(targets, stanzas))
+
+	def signal_ready(self):
+		self.logger.debug('Critical interfaces are done')
+		schedule.notify_ready()
+
+	def compile_plan(self, path, sysconfig, targets, stanzas):
+		## Record every step of a forced "ifup --all" into a plan
+		## which falls back to this same command when it is stale.
+		## The plan may be run from any directory.
+		fallback = ['ifup', '--all', '-i',
+				os.path.abspath(ARGS.interfaces)]
+		for group in ARGS.allow or ():
+			fallback += ['--allow', group]
+		for pattern in ARGS.exclude or ():
+			fallback += ['-X', pattern]
+		for override in ARGS.option or ():
+			fallback += ['-o', override]
+		if not ARGS.mappings:
+			fallback.append('--no-mappings')
+		if not ARGS.scripts:
+			fallback.append('--no-scripts')
+		elif ARGS.entry_point_hooks:
+			fallback.append('--entry-point-hooks')
+		if ARGS.netlink:
+			fallback.append('--netlink')
+		if ARGS.fork_server:
+			fallback.append('--fork-server')
+		if ARGS.jobs != 1:
+			fallback += ['--jobs', str(ARGS.jobs)]
+
+		bootplan = plan.PlanWriter(fallback)
+		executor = execute.Executor('start', scripts=ARGS.scripts,
+				plan=bootplan)
+		result = 0
+		for ifname, config_name in targets:
+			configs = stanzas.get(config_name)
+			if not configs:
+				self.logger.error('Unknown interface: %s',
+						config_name)
+				result = 1
+				continue
+			bootplan.begin(ifname)
+			if not executor.run(ifname, configs):
+				self.logger.error('Unable to compile a plan for '
+						'%s', ifname)
+				return 1
+			bootplan.end(state.InterfaceState.from_configs(ifname,
+					configs))
+
+		config_dirs = set(dirpath for dirpaths
+				in sysconfig.scanned_dirs.itervalues()
+				for dirpath in dirpaths)
+		try:
+			bootplan.write(path, sysconfig.file_fingerprints,
+					config_dirs)
+		except EnvironmentError as ex:
+			self.logger.error('%s: %s' % (ex.strerror, path))
+			return 1
+		return result
+
+	def skip_unchanged(self, mode, targets, stanzas, statefile, links):
+		## Drop any interfaces which are already up (or down) according
+		## to the state file and a single rtnetlink dump of all links
+		## and addresses (see execute.is_configured).
+		result = []
+		for ifname, config_name in targets:
+			ifstate = statefile.interfaces.get(ifname)
+			link = links.get(ifname)
+			if mode == 'start':
+				done = execute.is_configured(ifstate, link,
+						stanzas.get(config_name, ()))
+			else:
+				done = execute.is_deconfigured(ifstate, link)
+			if done:
+				self.logger.info('Skipping %s: already %s', ifname,
+						'up' if mode == 'start' else 'down')
+			else:
+				result.append((ifname, config_name))
+		return result
@@ -0,0 +1,154 @@
+"""
+ifupdown_ng.config.expand  -  Path expansion for "source" statements
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import re
+
+## Matches "$NAME" and "${NAME}" variable references
+_VARIABLE_RE = re.compile(r'\$(?:([A-Za-z_][A-Za-z0-9_]*)|'
+		r'\{([A-Za-z_][A-Za-z0-9_]*)\})')
+
+## Characters which make a path component a glob pattern
+_GLOB_CHARS_RE = re.compile(r'[*?[]')
+
+## The files included by "source-directory" are selected with the same
+## rules as run-parts(8)
+VALID_SOURCE_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+## Directory listings, indexed by path and stored as (stat key, names)
+_LISTING_CACHE = dict()
+
+
+def list_directory(dirpath):
+	"""Return the sorted names in a directory, or [] if it is unreadable
+
+	Listings are cached until the directory's modification time (or
+	the directory itself) changes.
+	"""
+	try:
+		stat = os.stat(dirpath)
+	except OSError:
+		return []
+	key = (stat.st_dev, stat.st_ino, stat.st_mtime)
+	cached = _LISTING_CACHE.get(dirpath)
+	if cached is not None and cached[0] == key:
+		return cached[1]
+
+	try:
+		names = sorted(os.listdir(dirpath))
+	except OSError:
+		return []
+	_LISTING_CACHE[dirpath] = (key, names)
+	return names
+
+def expand_variables(word, environ=None):
+	"""Expand a leading "~" or "~USER" and any variable references
+
+	As with the shell, undefined variables expand to nothing.
+	"""
+	if environ is None:
+		environ = os.environ
+	if word.startswith('~'):
+		word = os.path.expanduser(word)
+	return _VARIABLE_RE.sub(lambda match: environ.get(
+			match.group(1) or match.group(2), ''), word)
+
+def glob(pattern, scanned=None):
+	"""Return the sorted paths matching a glob pattern
+
+	Only the components containing glob characters are matched against
+	(cached) directory listings.  As with the shell, a "*" or "?" does
+	not match a leading "." in a name.  A pattern with no glob
+	characters is returned as-is even if it does not exist, so that the
+	caller can report the error.
+
+	If 'scanned' is given, each directory which was listed is appended
+	to it, since the result depends on the contents of all of them.
+	"""
+	## Imported here since most configs do not use any patterns
+	import fnmatch
+
+	if not _GLOB_CHARS_RE.search(pattern):
+		return [pattern]
+
+	absolute = pattern.startswith('/')
+	paths = ['/' if absolute else '']
+	for component in pattern.split('/'):
+		if not component:
+			continue
+		if not _GLOB_CHARS_RE.search(component):
+			paths = [os.path.join(path, component)
+					for path in paths]
+			continue
+		regex = re.compile(fnmatch.translate(component))
+		hidden_ok = component.startswith('.')
+		matches = []
+		for path in paths:
+			if scanned is not None:
+				scanned.append(path or '.')
+			for name in list_directory(path or '.'):
+				if name.startswith('.') and not hidden_ok:
+					continue
+				if regex.match(name):
+					matches.append(os.path.join(path, name))
+		paths = matches
+	return [path for path in paths if os.path.lexists(path)]
+
+def rebase(path, root):
+	"""Move an absolute path underneath 'root' (unless it is None)"""
+	if root is None or not os.path.isabs(path):
+		return path
+	return os.path.join(root, path.lstrip('/'))
+
+def expand_source(rest, base_dir, environ=None, root=None, scanned=None):
+	"""Expand the arguments of a "source" statement into paths
+
+	This is a small subset of wordexp(3): the arguments are split on
+	whitespace (quoting is not supported), tildes and variables are
+	expanded, then globs are matched.  No shell or other command is run.
+	Relative paths are taken relative to 'base_dir', absolute paths are
+	taken relative to 'root' (if given), and directories matched by a
+	pattern are left out.  Directories listed to match the patterns
+	are appended to 'scanned' (see glob).
+	"""
+	paths = []
+	for word in rest.split():
+		word = os.path.join(base_dir, rebase(
+				expand_variables(word, environ), root))
+		if _GLOB_CHARS_RE.search(word):
+			paths.extend(path for path in glob(word, scanned)
+					if not os.path.isdir(path))
+		else:
+			paths.append(word)
+	return paths
+
+def scan_directory(dirpath):
+	"""Return the sorted paths included by "source-directory"
+
+	These are the regular files (or links to them) in the directory
+	whose names are valid for run-parts(8).
+	"""
+	paths = []
+	for name in list_directory(dirpath):
+		path = os.path.join(dirpath, name)
+		if VALID_SOURCE_NAME_RE.match(name) and os.path.isfile(path):
+			paths.append(path)
+	return paths
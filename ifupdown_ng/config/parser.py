@@ -19,15 +19,18 @@ with this program; otherwise you can obtain it here:
 ## Futureproofing boilerplate
 from __future__ import absolute_import
 
-import fnmatch
+import collections
+import hashlib
 import logging
 import os
 import re
-import subprocess
 
+from ifupdown_ng import methods
+from ifupdown_ng import trace
 from ifupdown_ng import utils
 from ifupdown_ng.autogen.config import CONFIG_DIR
 from ifupdown_ng.commands import ARGS
+from ifupdown_ng.config import expand
 from ifupdown_ng.config import tokenizer
 
 
@@ -67,34 +70,37 @@ class Mapping(object):
 			ifile.error("No 'script' option was specified")
 
 	def should_map(self, config_name):
-		for pattern in self.matches:
-			if fnmatch.fnmatchcase(config_name, pattern):
-				return True
-		return False
+		return utils.interface_matches(config_name, self.matches)
 
 	def perform_mapping(self, ifname):
-		proc = subprocess.Popen((self.script, ifname),
-				stdin=subprocess.PIPE,
-				stdout=subprocess.PIPE)
-		output = proc.communicate(input=''.join(self.script_input))
+		## Imported here to keep startup fast when there are no
+		## mappings.  The script is started like any other command
+		## (see spawn.SERVER).
+		from ifupdown_ng import script
+		with trace.span('mapping %s' % ifname, 'mapping',
+				script=self.script) as span:
+			returncode, output = script.Environment().communicate(
+					[self.script, ifname],
+					''.join(self.script_input))
+			span.set(status=returncode)
 
 		## Ensure the mapping script completed successfully
-		if proc.returncode < 0:
+		if returncode < 0:
 			LOGGER.warning('Mapping script died with signal %d'
-					% -proc.returncode)
+					% -returncode)
 			return None
-		if proc.returncode > 0:
+		if returncode > 0:
 			LOGGER.debug('Mapping script exited with code %d'
-					% proc.returncode)
+					% returncode)
 			return None
-		if output[0] is None:
+		if not output:
 			LOGGER.warning('Mapping script succeeded with no output')
 			return None
 
 		## Check that it produced a valid interface config name
-		config_name = output[0].split('\n')[0]
+		config_name = output.split('\n')[0]
 		if utils.valid_interface_name(config_name):
-			return ifname
+			return config_name
 
 		LOGGER.error('Mapped %s to invalid interface config name: %s'
 				% (ifname, config_name))
@@ -105,7 +111,13 @@ class Mapping(object):
 ## InterfaceConfig()  -  Object representing an interface configuration
 ###
 ## Members:
-##   blah: blah
+##   name:           The logical interface config name
+##   address_family: The address family (EG: "inet", "inet6")
+##   method:         The configuration method (EG: "static", "dhcp")
+##   automatic:      ???
+##   options:        Dict mapping from an option name to its value (or to
+##                   a list of values for MULTIVALUE_OPTIONS)
+##   fingerprint:    SHA-1 hex digest of the stanza contents
 ###
 class InterfaceConfig(object):
 	## Certain options are multivalued, so we iterate over them specially
@@ -123,6 +135,7 @@ class InterfaceConfig(object):
 
 		self.automatic = True
 		self.options = dict()
+		self._fingerprint = None
 
 	def __hash__(self):
 		return hash((self.name, self.address_family, self.method))
@@ -149,8 +162,40 @@ class InterfaceConfig(object):
 		return self
 
 	def _close_parsing(self, ifile):
-		## FIXME: Add validation here
-		pass
+		## Check the options against the compiled schema for the
+		## method, which imports the method's module on first use
+		schema = methods.get_schema(self.address_family, self.method)
+		if schema is None:
+			ifile.warning('Unknown method for %s: %s %s' % (self.name,
+					self.address_family, self.method))
+		else:
+			for message in schema.validate(self.options):
+				ifile.error('%s: %s' % (self.name, message))
+			for message in schema.unsupported(self.options):
+				ifile.warning('%s: %s' % (self.name, message))
+		self._fingerprint = self._compute_fingerprint()
+
+	def _compute_fingerprint(self):
+		## Hash a canonical form of the stanza: the identifying triple
+		## followed by the options in sorted order, with multivalue
+		## options kept in the order they were specified.  Every field
+		## is NUL-terminated so that the encoding is unambiguous.
+		digest = hashlib.sha1()
+		digest.update('%s\0%s\0%s\0' % (self.name,
+				self.address_family, self.method))
+		for option in sorted(self.options):
+			value = self.options[option]
+			if option not in self.MULTIVALUE_OPTIONS:
+				value = (value,)
+			for item in value:
+				digest.update('%s\0%s\0' % (option, item))
+		return digest.hexdigest()
+
+	@property
+	def fingerprint(self):
+		if self._fingerprint is None:
+			self._fingerprint = self._compute_fingerprint()
+		return self._fingerprint
 
 	def __iter__(self):
 		return self.options.__iter__()
@@ -180,6 +225,280 @@ class InterfaceConfig(object):
 			self.options.setdefault(option, []).append(value)
 		elif option not in self.options or override_ok:
 			self.options[option] = value
+		self._fingerprint = None
+
+
+###
+## ConfigOverlay()  -  Read-only view of an InterfaceConfig with overrides
+###
+## The "-o OPTION=VALUE" overrides are layered over the parsed stanza when
+## each option is looked up, so the parsed InterfaceConfig itself is never
+## copied or changed.  An override replaces a single-valued option, and is
+## run after the stanza's own commands for a multivalued one.
+##
+## Members:
+##   config:    The underlying InterfaceConfig
+##   overrides: Dict mapping from an option name to its value (or to a
+##              list of values for MULTIVALUE_OPTIONS)
+##   options:   Mapping of the options with the overrides applied
+##   (and the name, address_family, method and fingerprint, as in
+##   InterfaceConfig)
+###
+class _LayeredOptions(collections.Mapping):
+	def __init__(self, options, overrides):
+		self._options = options
+		self._overrides = overrides
+
+	def __getitem__(self, option):
+		if option not in self._overrides:
+			return self._options[option]
+		value = self._overrides[option]
+		if option in InterfaceConfig.MULTIVALUE_OPTIONS:
+			return self._options.get(option, []) + value
+		return value
+
+	def __iter__(self):
+		for option in self._options:
+			yield option
+		for option in self._overrides:
+			if option not in self._options:
+				yield option
+
+	def __len__(self):
+		return len(self._options) + sum(1 for option in self._overrides
+				if option not in self._options)
+
+
+class ConfigOverlay(object):
+	MULTIVALUE_OPTIONS = InterfaceConfig.MULTIVALUE_OPTIONS
+
+	def __init__(self, config, overrides):
+		self.config = config
+		self.overrides = overrides
+		self.options = _LayeredOptions(config.options, overrides)
+		self._fingerprint = None
+
+	@property
+	def name(self):
+		return self.config.name
+
+	@property
+	def address_family(self):
+		return self.config.address_family
+
+	@property
+	def method(self):
+		return self.config.method
+
+	@property
+	def fingerprint(self):
+		## Cover both the stanza and the overrides, so that the state
+		## file records what was actually applied
+		if self._fingerprint is None:
+			digest = hashlib.sha1()
+			digest.update('%s\0' % self.config.fingerprint)
+			for option in sorted(self.overrides):
+				value = self.overrides[option]
+				if option not in self.MULTIVALUE_OPTIONS:
+					value = (value,)
+				for item in value:
+					digest.update('%s\0%s\0' % (option,
+							item))
+			self._fingerprint = digest.hexdigest()
+		return self._fingerprint
+
+	def __hash__(self):
+		return hash(self.config)
+
+	def __eq__(self, other):
+		return other == (self.name, self.address_family, self.method)
+
+	def __iter__(self):
+		return iter(self.options)
+
+	def iteritems(self):
+		return self.options.iteritems()
+
+	def __getitem__(self, option):
+		return self.options[option]
+
+
+###
+## NameRange()  -  A numbered range of interface names, EG: "vlan[100-4099]"
+###
+## Members:
+##   prefix: The part of each name before the number
+##   first:  The first number in the range
+##   last:   The last number in the range (inclusive)
+##   suffix: The part of each name after the number
+###
+class NameRange(object):
+	NAME_RANGE_RE = re.compile(r'^([A-Za-z0-9_-]*)\[([0-9]+)-([0-9]+)\]'
+			r'([A-Za-z0-9_:-]*)$')
+
+	def __init__(self, prefix, first, last, suffix):
+		self.prefix = prefix
+		self.first = first
+		self.last = last
+		self.suffix = suffix
+
+	@staticmethod
+	def is_range(pattern):
+		return '[' in pattern
+
+	@classmethod
+	def parse(cls, ifile, pattern):
+		## Report an error and return None if the range is not valid
+		match = cls.NAME_RANGE_RE.match(pattern)
+		if not match:
+			ifile.error('Invalid interface name range: %s'
+					% pattern)
+			return None
+		prefix, first, last, suffix = match.groups()
+		name_range = cls(prefix, int(first), int(last), suffix)
+		if name_range.first > name_range.last:
+			ifile.error('Empty interface name range: %s' % pattern)
+			return None
+		if not (ifile.validate_interface_name(name_range.name(
+					name_range.first)) and
+				ifile.validate_interface_name(name_range.name(
+					name_range.last))):
+			return None
+		return name_range
+
+	def __str__(self):
+		return '%s[%d-%d]%s' % (self.prefix, self.first, self.last,
+				self.suffix)
+
+	def __len__(self):
+		return self.last - self.first + 1
+
+	def __iter__(self):
+		for number in xrange(self.first, self.last + 1):
+			yield self.name(number)
+
+	def __contains__(self, ifname):
+		return self.number(ifname) is not None
+
+	def name(self, number):
+		return '%s%d%s' % (self.prefix, number, self.suffix)
+
+	def number(self, ifname):
+		## Return the number of a name in this range, or None
+		if not (ifname.startswith(self.prefix) and
+				ifname.endswith(self.suffix)):
+			return None
+		digits = ifname[len(self.prefix):len(ifname) - len(self.suffix)]
+		if not digits.isdigit() or digits != str(int(digits)):
+			return None
+		number = int(digits)
+		if not self.first <= number <= self.last:
+			return None
+		return number
+
+
+###
+## InterfaceTemplate()  -  One "iface" stanza for a range of config names
+###
+## An "iface vlan[100-4099] inet static" stanza is kept as a single object
+## however large the range is.  The InterfaceConfig for one config name in
+## the range is only built when it is looked up, with every "{N}" in the
+## option values replaced by that name's number.
+##
+## Members:
+##   names:          The NameRange of config names
+##   address_family: The address family (EG: "inet", "inet6")
+##   method:         The configuration method (EG: "static", "dhcp")
+##   options:        The options, as in InterfaceConfig, before
+##                   substitution
+##   pos:            A copy of the FilePosition of the "iface" line,
+##                   where validation errors are reported, or None to
+##                   report them wherever parsing of the stanza ends
+###
+class InterfaceTemplate(object):
+	INSTANCE_VAR = '{N}'
+
+	def __init__(self, names, address_family, method, pos=None):
+		self.names = names
+		self.address_family = address_family
+		self.method = method
+		self.pos = pos
+		self._prototype = InterfaceConfig(str(names), address_family,
+				method)
+
+	@property
+	def options(self):
+		return self._prototype.options
+
+	def _option_parse(self, ifile, first, rest):
+		self._prototype._option_parse(ifile, first, rest)
+		return self
+
+	def _close_parsing(self, ifile):
+		## Validate the first and last instances, so that the cost of
+		## checking does not depend on the size of the range.  A
+		## substituted number only gets too large or too long for an
+		## option (EG: "address 10.0.{N}.1") as it goes up, so any
+		## instance which would fail makes the last one fail too.
+		pos = self.pos if self.pos is not None else ifile
+		schema = methods.get_schema(self.address_family, self.method)
+		if schema is None:
+			pos.warning('Unknown method for %s: %s %s' % (
+					self.names, self.address_family,
+					self.method))
+			return
+		reported = set()
+		for number in (self.names.first, self.names.last):
+			config = self.instance(number)
+			for message in schema.validate(config.options):
+				if message not in reported:
+					reported.add(message)
+					pos.error('%s: %s' % (self.names,
+							message))
+		for message in schema.unsupported(self.options):
+			pos.warning('%s: %s' % (self.names, message))
+
+	def instance(self, number):
+		## Build the InterfaceConfig for one number in the range
+		value = str(number)
+		config = InterfaceConfig(self.names.name(number),
+				self.address_family, self.method)
+		for option, item in self.options.iteritems():
+			if isinstance(item, list):
+				config.options[option] = [
+					line.replace(self.INSTANCE_VAR, value)
+					for line in item]
+			else:
+				config.options[option] = item.replace(
+						self.INSTANCE_VAR, value)
+		return config
+
+	def lookup(self, config_name):
+		## Return the instance for a config name, or None
+		number = self.names.number(config_name)
+		if number is None:
+			return None
+		return self.instance(number)
+
+	def instances(self):
+		## Generate every instance, one at a time
+		for number in xrange(self.names.first, self.names.last + 1):
+			yield self.instance(number)
+
+
+###
+## SkippedStanza()  -  Takes the options of a stanza which was rejected
+###
+## Nothing can be checked without the stanza itself (EG: the options of an
+## "iface" stanza with an invalid name range would need the range for
+## "{N}"), so its options are dropped without any further errors.
+###
+class SkippedStanza(object):
+	def _option_parse(self, _ifile, _first, _rest):
+		return self
+
+	def _close_parsing(self, ifile):
+		pass
 
 
 ###
@@ -187,29 +506,85 @@ class InterfaceConfig(object):
 ###
 ## Members:
 ##   allowed: Dict mapping from an allow-group name to a set of interfaces
+##   allowed_ranges: Dict mapping from an allow-group name to a list of
+##       NameRange objects, for groups listing a range of interfaces
 ##   configs: Dict mapping from a named interface config to its data
+##   templates: List of InterfaceTemplate objects, in file order, used
+##       for config names which do not have their own "iface" stanzas
 ##   mappings: ???
+##   file_fingerprints: List of (filename, SHA-1 digest) for each file
+##       loaded, in the order in which parsing of each one completed
+##   file_ids: Dict mapping from each loaded filename to its (device,
+##       inode), or to None if it could not be determined
+##   includes: Dict mapping from each loaded filename to the list of
+##       files its "source" statements resolved to, in order (including
+##       any which were skipped as duplicates)
+##   scanned_dirs: Dict mapping from each loaded filename to the list of
+##       directories which its "source" patterns and "source-directory"
+##       statements listed, whose contents decide what was included
+##
+##   stanzas_by_name: Index from a config name to its "iface" stanzas,
+##       sorted by address family and method
+##   groups_by_ifname: Index from an interface to the set of names of the
+##       allow-groups which list it (not including name ranges)
+##   mappings_by_ifname: Index from an interface to the indexes in
+##       'mappings' of the mappings with a plain (non-glob) pattern for it
+##   glob_mappings: The indexes in 'mappings' of the mappings with any
+##       glob patterns, which must still be matched one by one
+##   (The indexes are rebuilt whenever a file finishes loading)
+##
+##   root: A directory which absolute "source" and "source-directory"
+##       paths are relative to (EG: a router's tree in a CI checkout), or
+##       None for the running system
+##   log_handler: The logging.Handler given to each file which is opened,
+##       or None for the FileParser default (stderr)
 ##
 ##   ifile_stack: The current stack of interfaces(5) files being parsed
+##   ifile_parents: Dict mapping from each file on the stack to the file
+##       which sourced it (None for the top-level file)
 ##   total_nr_errors: The total number of errors from all loaded files
 ##   total_nr_warnings: The total number of warnings from all loaded files
 ###
 class SystemConfig(object):
 	ALLOWED_GROUP_NAME_RE = re.compile(r'^[a-z]+$')
 
-	def __init__(self):
+	def __init__(self, root=None, log_handler=None):
+		self.root = root
+		self.log_handler = log_handler
 		self.allowed = dict()
+		self.allowed_ranges = dict()
 		self.configs = dict()
+		self.templates = []
 		self.mappings = []
+		self.file_fingerprints = []
+		self.file_ids = dict()
+		self.includes = dict()
+		self.scanned_dirs = dict()
+		self.stanzas_by_name = dict()
+		self.groups_by_ifname = dict()
+		self.mappings_by_ifname = dict()
+		self.glob_mappings = []
 		self.ifile_stack = []
+		self.ifile_parents = dict()
 		self.total_nr_errors = 0
 		self.total_nr_warnings = 0
 
 	def clear(self):
 		self.allowed.clear()
+		self.allowed_ranges.clear()
 		self.configs.clear()
+		del self.templates[:]
 		del self.mappings[:]
+		del self.file_fingerprints[:]
+		self.file_ids.clear()
+		self.includes.clear()
+		self.scanned_dirs.clear()
+		self.stanzas_by_name.clear()
+		self.groups_by_ifname.clear()
+		self.mappings_by_ifname.clear()
+		del self.glob_mappings[:]
 		del self.ifile_stack[:]
+		self.ifile_parents.clear()
 		self.total_nr_errors = 0
 		self.total_nr_warnings = 0
 
@@ -226,6 +601,91 @@ class SystemConfig(object):
 		else:
 			return None
 
+	@property
+	def fingerprint(self):
+		## The whole-config fingerprint covers the name and contents
+		## of every file that was loaded, in order.
+		digest = hashlib.sha1()
+		for filename, file_digest in self.file_fingerprints:
+			digest.update('%s\0%s\0' % (filename, file_digest))
+		return digest.hexdigest()
+
+	def allowed_interfaces(self, groups):
+		## Return the sorted union of the members of several groups
+		result = set()
+		for group in groups:
+			result.update(self.allowed.get(group, ()))
+			for name_range in self.allowed_ranges.get(group, ()):
+				result.update(name_range)
+		return sorted(result)
+
+	def is_allowed(self, ifname, groups):
+		allowed = self.groups_by_ifname.get(ifname, ())
+		for group in groups:
+			if group in allowed:
+				return True
+			for name_range in self.allowed_ranges.get(group, ()):
+				if ifname in name_range:
+					return True
+		return False
+
+	def mapping_candidates(self, ifname):
+		## Return the mappings which apply to an interface, in order
+		indexes = [index for index in self.glob_mappings
+				if self.mappings[index].should_map(ifname)]
+		indexes.extend(self.mappings_by_ifname.get(ifname, ()))
+		return [self.mappings[index] for index in sorted(set(indexes))]
+
+	def map_interface(self, ifname):
+		## Run the mapping scripts for an interface in order, returning
+		## the first config name produced (or the ifname if none are).
+		for mapping in self.mapping_candidates(ifname):
+			config_name = mapping.perform_mapping(ifname)
+			if config_name is not None:
+				return config_name
+		return ifname
+
+	def configs_for_name(self, config_name, overrides=None):
+		## Look up the stanzas for one config name, sorted by address
+		## family and method.  With overrides, each stanza is returned
+		## as a ConfigOverlay.
+		configs = self.stanzas_by_name.get(config_name)
+		if configs:
+			configs = list(configs)
+		else:
+			configs = self.template_configs(config_name)
+		if overrides:
+			configs = [ConfigOverlay(config, overrides)
+					for config in configs]
+		return configs
+
+	def template_configs(self, config_name):
+		## Build the stanzas for a config name from the templates.  An
+		## "iface" stanza for a config name overrides all templates,
+		## so this is only used for names without one; the first
+		## matching template for each address family and method wins.
+		result = []
+		seen = set()
+		for template in self.templates:
+			key = (template.address_family, template.method)
+			if key in seen:
+				continue
+			config = template.lookup(config_name)
+			if config is not None:
+				seen.add(key)
+				result.append(config)
+		result.sort(key=lambda c: (c.address_family, c.method))
+		return result
+
+	def configs_by_name(self, config_names, overrides=None):
+		## Look up the stanzas for many config names at once
+		result = dict()
+		for config_name in frozenset(config_names):
+			configs = self.configs_for_name(config_name, overrides)
+			if configs:
+				result[config_name] = configs
+		return result
+
 	def load_interfaces_file(self, ifile=None):
 		assert not self.ifile_stack
 
@@ -234,34 +694,84 @@ class SystemConfig(object):
 			ifile = ARGS.interfaces
 		if not isinstance(ifile, tokenizer.InterfacesFile):
 			try:
-				ifile = tokenizer.InterfacesFile(ifile)
+				ifile = self._open_file(ifile)
 			except EnvironmentError as ex:
 				LOGGER.error('%s: %s' % (ex.strerror, ifile))
 				self.total_nr_errors += 1
 				return self
 
+		self._add_file(ifile, None)
 		self.ifile_stack.append(ifile)
-		self._process_interfaces_files()
+		with trace.span('load config', 'config',
+				file=ifile.filename) as span:
+			self._process_interfaces_files()
+			self._build_indexes()
+			span.set(files=len(self.file_fingerprints),
+					stanzas=len(self.configs),
+					errors=self.total_nr_errors,
+					warnings=self.total_nr_warnings)
 		return self
 
+	def _build_indexes(self):
+		## Index the parsed config so that looking up one interface
+		## does not depend on the size of the config.
+		self.stanzas_by_name.clear()
+		for config in self.configs:
+			self.stanzas_by_name.setdefault(config.name,
+					[]).append(config)
+		for configs in self.stanzas_by_name.itervalues():
+			configs.sort(key=lambda c: (c.address_family, c.method))
+
+		self.groups_by_ifname.clear()
+		for group_name, ifnames in self.allowed.iteritems():
+			for ifname in ifnames:
+				self.groups_by_ifname.setdefault(ifname,
+						set()).add(group_name)
+
+		self.mappings_by_ifname.clear()
+		del self.glob_mappings[:]
+		for index, mapping in enumerate(self.mappings):
+			if any(utils.is_interface_pattern(pattern)
+					for pattern in mapping.matches):
+				self.glob_mappings.append(index)
+				continue
+			for pattern in mapping.matches:
+				self.mappings_by_ifname.setdefault(pattern,
+						[]).append(index)
+
 	def _process_interfaces_files(self):
+		## Since sourced files are parsed as a stack, their spans are
+		## started when first read and nest properly inside each other.
+		file_spans = dict()
+
 		stanza = self
 		while self.ifile_stack:
 			ifile = self.ifile_stack[-1]
+			if ifile not in file_spans:
+				file_spans[ifile] = trace.span(
+						'parse %s' % ifile.filename,
+						'config', file=ifile.filename)
 			try:
 				first, rest = next(ifile)
 			except StopIteration:
+				## Close the last stanza first so that its
+				## validation errors are included in the totals
+				stanza._close_parsing(ifile)
+				stanza = self
 				self.ifile_stack.pop()
+				del self.ifile_parents[ifile]
+				file_spans.pop(ifile).end()
+				self.file_fingerprints.append((ifile.filename,
+						ifile.fingerprint))
 				self.total_nr_errors += ifile.nr_errors
 				self.total_nr_warnings += ifile.nr_warnings
-				stanza._close_parsing(ifile)
-				stanza = self
 				continue
 
 			if first.startswith('allow-'):
 				parse_funcname = '_parse_auto'
 			else:
-				parse_funcname = '_parse_%s' % first
+				parse_funcname = '_parse_%s' % first.replace(
+						'-', '_')
 
 			if hasattr(self, parse_funcname):
 				stanza._close_parsing(ifile)
@@ -283,14 +793,89 @@ class SystemConfig(object):
 	def _close_parsing(self, ifile):
 		pass
 
+	def _open_file(self, filename):
+		if self.log_handler is None:
+			return tokenizer.InterfacesFile(filename)
+		return tokenizer.InterfacesFile(filename,
+				handler=self.log_handler)
+
+	@staticmethod
+	def _file_id(filename):
+		## Files are identified by (device, inode), so that the same
+		## file is recognized whatever path it was reached by.
+		try:
+			stat = os.stat(filename)
+		except EnvironmentError:
+			return None
+		return (stat.st_dev, stat.st_ino)
+
+	def _add_file(self, ifile, parent):
+		self.file_ids[ifile.filename] = self._file_id(ifile.filename)
+		self.includes.setdefault(ifile.filename, [])
+		self.scanned_dirs.setdefault(ifile.filename, [])
+		self.ifile_parents[ifile] = parent
+
+	def _include_chain(self, ifile, file_id):
+		## Return the chain of sourcing files from the one with the
+		## given (device, inode) down to 'ifile', or None if it is not
+		## one of the files currently being parsed.
+		chain = []
+		while ifile is not None:
+			chain.append(ifile.filename)
+			if self.file_ids.get(ifile.filename) == file_id:
+				return list(reversed(chain))
+			ifile = self.ifile_parents.get(ifile)
+		return None
+
 	def _parse_source(self, ifile, _first, rest):
+		base_dir = os.path.dirname(ifile.filename)
+		return self._include_files(ifile,
+				expand.expand_source(rest, base_dir,
+						root=self.root,
+						scanned=self.scanned_dirs[
+							ifile.filename]))
+
+	def _parse_source_directory(self, ifile, first, rest):
+		words = rest.split()
+		if len(words) != 1:
+			ifile.error('Wrong number of parameters to "%s"'
+					% first)
+			return self
+		dirpath = os.path.join(os.path.dirname(ifile.filename),
+				expand.rebase(expand.expand_variables(words[0]),
+						self.root))
+		if not os.path.isdir(dirpath):
+			ifile.error('Not a directory: %s' % dirpath)
+			return self
+		self.scanned_dirs[ifile.filename].append(dirpath)
+		return self._include_files(ifile,
+				expand.scan_directory(dirpath))
+
+	def _include_files(self, ifile, paths):
 		included_ifiles = []
-		for path in libc.wordexp(rest, libc.WRDE_NOCMD):
+		seen_ids = set(file_id for file_id in self.file_ids.itervalues()
+				if file_id is not None)
+		for path in paths:
+			self.includes[ifile.filename].append(path)
+			file_id = self._file_id(path)
+			if file_id is not None and file_id in seen_ids:
+				chain = self._include_chain(ifile, file_id)
+				if chain is not None:
+					ifile.error('Include cycle: %s' % ' -> '
+							.join(chain + [path]))
+				else:
+					ifile.warning('Skipping duplicate '
+							'include: %s' % path)
+				continue
 			try:
-				new_ifile = tokenizer.InterfacesFile(path)
-				included_ifiles.append(new_ifile)
+				new_ifile = self._open_file(path)
 			except EnvironmentError as ex:
 				ifile.error('%s: %s' % (ex.strerror, path))
+				continue
+			included_ifiles.append(new_ifile)
+			self._add_file(new_ifile, ifile)
+			if file_id is not None:
+				seen_ids.add(file_id)
 
 		## Since this is a stack, put them in reverse order
 		self.ifile_stack.extend(reversed(included_ifiles))
@@ -312,7 +897,13 @@ class SystemConfig(object):
 
 		group = self.allowed.setdefault(group_name, set())
 		for ifname in interfaces:
-			if ifile.validate_interface_name(ifname):
+			if NameRange.is_range(ifname):
+				name_range = NameRange.parse(ifile, ifname)
+				if name_range is not None:
+					self.allowed_ranges.setdefault(
+						group_name, []).append(
+						name_range)
+			elif ifile.validate_interface_name(ifname):
 				group.add(ifname)
 		return self
 
@@ -339,6 +930,10 @@ class SystemConfig(object):
 		address_family = params.pop(0) if params else ''
 		method         = params.pop(0) if params else ''
 
+		if NameRange.is_range(config_name):
+			return self._parse_template(ifile, config_name,
+					address_family, method, valid)
+
 		if not ifile.validate_interface_name(config_name):
 			valid = False
 
@@ -352,6 +947,20 @@ class SystemConfig(object):
 
 		return stanza
 
+	def _parse_template(self, ifile, pattern, address_family, method,
+			valid):
+		names = NameRange.parse(ifile, pattern)
+		if names is None:
+			return SkippedStanza()
+
+		## Overlapping ranges are allowed, since the first template
+		## which matches a config name is the one used (see above)
+		stanza = InterfaceTemplate(names, address_family, method,
+				pos=ifile.pos.copy())
+		if valid:
+			self.templates.append(stanza)
+		return stanza
+
 	def _option_parse(self, ifile, first, _rest):
 		ifile.error("Option not in a valid stanza: %s" % first)
 		return self
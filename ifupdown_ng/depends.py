@@ -0,0 +1,136 @@
+"""
+ifupdown_ng.depends  -  Ordering of interfaces by their dependencies
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import logging
+
+from ifupdown_ng import utils
+
+LOGGER = logging.getLogger(__name__)
+
+## Options naming the lower interfaces which must be up first
+LOWER_DEVICE_OPTIONS = ('vlan-raw-device',)
+LOWER_LIST_OPTIONS = ('bridge-ports', 'bond-slaves')
+
+
+def dependencies(ifname, configs):
+	"""Return the set of interface names which 'ifname' depends on
+
+	An alias (EG: "eth0:1") depends on its physical device, a VLAN
+	depends on its "vlan-raw-device", and bridges and bonds depend on
+	their ports and slaves.
+	"""
+	deps = set([utils.interface_device(ifname)])
+
+	for config in configs:
+		options = config.options
+		for option in LOWER_DEVICE_OPTIONS:
+			if option in options:
+				deps.add(options[option])
+		for option in LOWER_LIST_OPTIONS:
+			if option in options:
+				deps.update(name for name in options[option].split()
+						if name not in ('none', 'all'))
+	deps.discard(ifname)
+	return deps
+
+
+def dependency_map(targets, stanzas):
+	"""Return the dependencies of each target on the other targets
+
+	Arguments:
+		targets: List of (ifname, config_name)
+		stanzas: Dict mapping from a config name to its stanzas
+	Returns:
+		A dict mapping from each ifname to a set of ifnames
+	"""
+	names = set(ifname for ifname, _ in targets)
+	return dict((ifname, dependencies(ifname,
+			stanzas.get(config_name, ())) & names)
+			for ifname, config_name in targets)
+
+
+def closure(ifnames, deps):
+	"""Return 'ifnames' together with everything they depend on"""
+	result = set()
+	stack = list(ifnames)
+	while stack:
+		ifname = stack.pop()
+		if ifname not in result:
+			result.add(ifname)
+			stack.extend(deps.get(ifname, ()))
+	return result
+
+
+def reverse_map(deps):
+	"""Invert a dependency map, giving the dependents of each ifname"""
+	result = dict((ifname, set()) for ifname in deps)
+	for ifname, lower in deps.iteritems():
+		for dep in lower:
+			result.setdefault(dep, set()).add(ifname)
+	return result
+
+
+def order_targets(targets, stanzas, first=()):
+	"""Sort targets so that each one comes after its dependencies
+
+	Only dependencies on other targets are considered, and otherwise
+	the original order is kept, except that the targets in 'first' (and
+	their dependencies) are moved ahead of all of the others.
+	Interfaces in a dependency cycle are left at the end in their
+	original order.
+
+	Arguments:
+		targets: List of (ifname, config_name)
+		stanzas: Dict mapping from a config name to its stanzas
+		first: Collection of ifnames to put first
+	Returns:
+		The reordered list of (ifname, config_name)
+	"""
+	deps = dependency_map(targets, stanzas)
+	first = closure(first, deps)
+	done = set()
+	return (_toposort([target for target in targets
+				if target[0] in first], deps, done) +
+		_toposort([target for target in targets
+				if target[0] not in first], deps, done))
+
+
+def _toposort(targets, deps, done):
+	## Repeatedly take every target whose dependencies are all done,
+	## which keeps the original order as far as possible
+	ordered = []
+	remaining = list(targets)
+	while remaining:
+		deferred = []
+		for target in remaining:
+			if deps[target[0]] <= done:
+				ordered.append(target)
+				done.add(target[0])
+			else:
+				deferred.append(target)
+		if len(deferred) == len(remaining):
+			LOGGER.warning('Dependency cycle between interfaces: %s',
+					' '.join(ifname for ifname, _ in deferred))
+			ordered.extend(deferred)
+			done.update(ifname for ifname, _ in deferred)
+			break
+		remaining = deferred
+	return ordered
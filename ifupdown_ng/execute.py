@@ -0,0 +1,451 @@
+"""
+ifupdown_ng.execute  -  Run the phases which bring interfaces up and down
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from ifupdown_ng import linkwait
+from ifupdown_ng import logfilter
+from ifupdown_ng import methods
+from ifupdown_ng import plugins
+from ifupdown_ng import script
+from ifupdown_ng import trace
+from ifupdown_ng.config import parser
+
+LOGGER = logging.getLogger(__name__)
+
+## The phases run for each mode, in order.  The address-family method is
+## applied between the first and second phase of each mode.
+PHASES = {
+	'start': ('pre-up', 'up'),
+	'stop':  ('down', 'post-down'),
+}
+
+## The hook-script directory name for each phase (see parser.hook_dir)
+HOOK_DIRS = {
+	'pre-up':    'if-pre-up',
+	'up':        'if-up',
+	'down':      'if-down',
+	'post-down': 'if-post-down',
+}
+
+## Hook scripts are selected with the same rules as run-parts(8)
+VALID_HOOK_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+SHELL = '/bin/sh'
+
+
+def list_hooks(phase):
+	"""Return the sorted paths of the executable hooks for a phase"""
+	dirpath = parser.hook_dir(HOOK_DIRS[phase])
+	try:
+		names = sorted(os.listdir(dirpath))
+	except OSError:
+		return []
+
+	hooks = []
+	for name in names:
+		path = os.path.join(dirpath, name)
+		if (VALID_HOOK_NAME_RE.match(name) and os.path.isfile(path)
+				and os.access(path, os.X_OK)):
+			hooks.append(path)
+	return hooks
+
+def list_mode_plugins(mode):
+	"""Return the plugins.PluginHooks for every phase of a mode"""
+	return [hook for phase in PHASES[mode]
+		for hook in plugins.list_plugins(
+			parser.hook_dir(HOOK_DIRS[phase]), phase)]
+
+
+def is_configured(ifstate, link, configs):
+	"""Return True if 'configs' are already applied to an interface
+
+	The state file must show that exactly these stanzas were applied,
+	and the method of every stanza must confirm it from the kernel's
+	state of the link.  Methods without an is_configured() predicate
+	(EG: "dhcp", "manual") are never taken to be configured, since the
+	state of the link cannot show whether they are still running.
+
+	Arguments:
+		ifstate: The state.InterfaceState for the interface, or None
+		link: The sysfs.LinkState for the interface, or None
+		configs: Sequence of InterfaceConfig objects
+	"""
+	if ifstate is None or not ifstate.matches(configs):
+		return False
+	if link is None or not link.is_up:
+		return False
+	for config in configs:
+		method = methods.get_method(config.address_family,
+				config.method)
+		predicate = getattr(method, 'is_configured', None)
+		if predicate is None or not predicate(config, link):
+			return False
+	return True
+
+def is_deconfigured(ifstate, link):
+	"""Return True if an interface has nothing left to deconfigure
+
+	That is, the state file has no record of it and the link is either
+	missing or administratively down.  A link which is recorded as up
+	is always stopped, even if it has since been deleted, so that its
+	"down" hooks run and its state is removed.
+	"""
+	return ifstate is None and (link is None or not link.is_up)
+
+
+class Executor(object):
+	"""Runs the phases, hooks, and commands for interfaces
+
+	Attributes:
+		mode: Either "start" (for ifup) or "stop" (for ifdown)
+		act: If False, print the commands instead of running them
+		verbose: If True, print the commands before running them
+		scripts: If False, skip the hooks in the if-*.d directories
+		output: File to which commands are printed
+		backend: A methods.NetlinkBackend which applies the built-in
+			methods in-process, or None to run ip(8) commands
+		plan: A plan.PlanWriter which records the commands instead of
+			running them, or None
+		command_timeout: Default seconds after which a single command
+			or hook is killed, or None for no limit
+		phase_timeout: Default seconds allowed for all of the commands
+			and hooks of one phase, or None for no limit
+		link_waiter: The shared linkwait.LinkWaiter, once needed
+		deleted_links: Set of the interfaces which no longer exist,
+			for which "stop" runs the hooks but not the method
+	"""
+	def __init__(self, mode, act=True, verbose=False, scripts=True,
+			output=None, backend=None, plan=None,
+			command_timeout=None, phase_timeout=None):
+		self.mode = mode
+		self.act = act
+		self.verbose = verbose
+		self.scripts = scripts
+		self.output = output if output is not None else sys.stdout
+		self.backend = backend
+		self.plan = plan
+		self.command_timeout = command_timeout
+		self.phase_timeout = phase_timeout
+		self._hooks = dict()
+		self._lock = threading.Lock()
+		self.link_waiter = None
+		self.deleted_links = set()
+
+	def hooks(self, phase):
+		"""Return the (cached) list of hooks for a phase
+
+		The external hooks (as paths) and the in-process plugins (as
+		plugins.PluginHook objects) are sorted together by name.
+		"""
+		if not self.scripts:
+			return []
+		if phase not in self._hooks:
+			dirpath = parser.hook_dir(HOOK_DIRS[phase])
+			hooks = [(os.path.basename(path), path)
+					for path in list_hooks(phase)]
+			hooks += [(hook.name, hook)
+					for hook in plugins.list_plugins(dirpath,
+						phase)]
+			hooks.sort(key=lambda item: item[0])
+			self._hooks[phase] = [hook for _, hook in hooks]
+			if self.plan is not None:
+				self.plan.add_hook_dir(dirpath)
+		return self._hooks[phase]
+
+	def run(self, ifname, configs):
+		"""Run every phase for each stanza of an interface
+
+		Stanzas are started in order and stopped in reverse order.
+
+		Returns:
+			True if every step succeeded, otherwise False
+		"""
+		with trace.span('%s %s' % (self.mode, ifname), 'iface',
+				iface=ifname) as span:
+			success = self._run_configs(ifname, configs)
+			if not success:
+				span.set(failed=True)
+		return success
+
+	def _run_configs(self, ifname, configs):
+		if self.mode == 'stop':
+			configs = reversed(configs)
+
+		logger = logfilter.ContextAdapter(LOGGER, ifname)
+		first_phase, second_phase = PHASES[self.mode]
+		for config in configs:
+			if not self.run_phase(first_phase, ifname, config):
+				return False
+			if not self.run_method(ifname, config, logger):
+				return False
+			self.wait_for_link(ifname, config, logger)
+			if not self.run_phase(second_phase, ifname, config):
+				return False
+		return True
+
+	def run_method(self, ifname, config, logger):
+		"""Apply the stanza's address-family method to an interface
+
+		The method's operations are printed as the equivalent ip(8)
+		commands whichever backend is used, so the output of "-n" and
+		"-v" does not depend on the backend.
+		"""
+		method = methods.get_method(config.address_family, config.method)
+		if method is None:
+			logger.debug('No implementation of method %s %s for %s',
+					config.address_family, config.method, ifname)
+			return True
+		if self.mode == 'stop' and ifname in self.deleted_links:
+			logger.debug('%s no longer exists, so there is nothing '
+					'to remove for %s %s', ifname,
+					config.address_family, config.method)
+			return True
+		try:
+			operations = method.operations(self.mode, ifname, config)
+		except ValueError as ex:
+			logger.error('%s %s: %s', config.address_family,
+					config.method, ex)
+			return False
+
+		env = self.environment(PHASES[self.mode][0], ifname, config)
+		timeout = self.timeout_option(config, 'command-timeout',
+				self.command_timeout, logger)
+		if self.backend is None or not self.act or self.plan is not None:
+			for operation in operations:
+				argv = operation.argv()
+				if not self.run_step(env, argv, ' '.join(argv),
+						logger, timeout):
+					return False
+			return True
+
+		## Consecutive rtnetlink operations are applied as one batch,
+		## with any external commands run in between
+		batch = []
+		for operation in operations + [None]:
+			if operation is not None and operation.NETLINK:
+				batch.append(operation)
+				continue
+			if batch and not self.apply_batch(ifname, batch, logger):
+				return False
+			batch = []
+			if operation is None:
+				break
+			argv = operation.argv()
+			if not self.run_step(env, argv, ' '.join(argv), logger,
+					timeout):
+				return False
+		return True
+
+	def apply_batch(self, ifname, operations, logger):
+		"""Apply rtnetlink operations to an interface with the backend"""
+		if self.verbose:
+			for operation in operations:
+				self.output.write('%s\n' % ' '.join(operation.argv()))
+		with trace.span('netlink %s' % ifname, 'exec', iface=ifname):
+			try:
+				errors = self.backend.apply(ifname, operations)
+			except EnvironmentError as ex:
+				logger.error('%s: %s', ex.strerror, ifname)
+				return False
+		for operation, error in zip(operations, errors):
+			if error:
+				logger.error('%s: %s', ' '.join(operation.argv()),
+						os.strerror(error))
+				return False
+		return True
+
+	def wait_for_link(self, ifname, config, logger):
+		## The "link-wait SECONDS" option delays the second phase until
+		## the link has a carrier; a timeout is only a warning.
+		timeout = config.options.get('link-wait')
+		if timeout is None or self.mode != 'start':
+			return
+		if not self.act and self.plan is None:
+			return
+		try:
+			timeout = float(timeout)
+		except ValueError:
+			logger.error('Invalid link-wait timeout: %s', timeout)
+			return
+		if self.plan is not None:
+			self.plan.add_wait(ifname, timeout)
+			return
+
+		with self._lock:
+			if self.link_waiter is None:
+				self.link_waiter = linkwait.LinkWaiter()
+		with trace.span('link-wait %s' % ifname, 'wait',
+				iface=ifname) as span:
+			carrier = self.link_waiter.wait(ifname, timeout)
+			span.set(carrier=carrier)
+		if not carrier:
+			logger.warning('No carrier on %s after %g seconds',
+					ifname, timeout)
+
+	def environment(self, phase, ifname, config):
+		"""Return the script.Environment for a stanza's commands
+
+		A plan must not depend on the terminal or directory from which
+		it was compiled, so those are left out of its environments.
+		"""
+		context = script.ConfigContext(phase, ifname, config)
+		if self.plan is not None:
+			return script.Environment(context, cwd='/', term_env={})
+		return script.Environment(context)
+
+	def timeout_option(self, config, option, default, logger):
+		"""Return a timeout from a stanza option, or the default
+
+		A timeout of zero (or less) means that there is no limit.
+		"""
+		value = config.options.get(option)
+		if value is None:
+			return default
+		try:
+			value = float(value)
+		except ValueError:
+			logger.error('Invalid %s: %s', option, value)
+			return default
+		return value if value > 0 else None
+
+	def run_phase(self, phase, ifname, config):
+		"""Run the stanza's commands and then the hooks for a phase"""
+		logger = logfilter.ContextAdapter(LOGGER, ifname, phase)
+		env = self.environment(phase, ifname, config)
+		command_timeout = self.timeout_option(config, 'command-timeout',
+				self.command_timeout, logger)
+		phase_timeout = self.timeout_option(config, 'phase-timeout',
+				self.phase_timeout, logger)
+		deadline = None
+		if phase_timeout is not None:
+			deadline = time.time() + phase_timeout
+
+		steps = [((SHELL, '-c', command), command)
+				for command in config.options.get(phase, ())]
+		for hook in self.hooks(phase):
+			if isinstance(hook, plugins.PluginHook):
+				steps.append((hook, hook.description))
+			else:
+				steps.append(((hook,), hook))
+		with trace.span('%s %s' % (phase, ifname), 'phase',
+				iface=ifname, phase=phase) as span:
+			for argv, description in steps:
+				## Each step gets whatever is left of the phase
+				timeout = command_timeout
+				if deadline is not None:
+					remaining = max(0.001, deadline - time.time())
+					if timeout is None or remaining < timeout:
+						timeout = remaining
+				if isinstance(argv, plugins.PluginHook):
+					## A plugin cannot be interrupted, so
+					## none is started once the phase is
+					## out of time
+					success = ((deadline is None or
+						time.time() < deadline) and
+						self.run_plugin(argv, phase,
+							ifname, config, env,
+							logger, timeout))
+				else:
+					success = self.run_step(env, argv,
+							description, logger, timeout)
+				if not success:
+					if (deadline is not None and
+							time.time() >= deadline):
+						logger.error('Phase timed out after '
+							'%g seconds', phase_timeout)
+						span.set(timeout=phase_timeout)
+					span.set(failed=True)
+					return False
+		return True
+
+	def run_plugin(self, hook, phase, ifname, config, env, logger,
+			timeout=None):
+		"""Run (or just print) an in-process hook plugin
+
+		A plugin cannot be killed like a command, so it is given its
+		deadline in the HookContext.  If it is still running when the
+		timeout expires then it fails once it returns, which also
+		stops the phase.
+		"""
+		if self.plan is not None:
+			logger.error('%s: Python hook plugins cannot be compiled '
+					'into a plan', hook.description)
+			return False
+		if not self.act or self.verbose:
+			self.output.write('%s\n' % hook.description)
+		if not self.act:
+			return True
+
+		deadline = None
+		if timeout is not None:
+			deadline = time.time() + timeout
+		context = plugins.HookContext(ifname, phase, self.mode, config,
+				dict(env.context.iteritems()), logger, deadline)
+		with trace.span(hook.name, 'hook', iface=ifname,
+				phase=phase) as span:
+			try:
+				success = hook(context)
+			except Exception: # pylint: disable=W0703
+				logger.exception('%s: hook failed',
+						hook.description)
+				span.set(failed=True)
+				return False
+			if deadline is not None and time.time() > deadline:
+				logger.error('%s: Timed out after %.3g seconds',
+						hook.description, timeout)
+				span.set(failed=True, timeout=timeout)
+				return False
+			if success:
+				return True
+			span.set(failed=True)
+		logger.error('%s: hook failed', hook.description)
+		return False
+
+	def run_step(self, env, argv, description, logger, timeout=None):
+		"""Run (or just print) a single command or hook"""
+		if self.plan is not None:
+			self.plan.add_step(dict(env.iteritems()), argv)
+			return True
+		if not self.act or self.verbose:
+			self.output.write('%s\n' % description)
+		if not self.act:
+			return True
+
+		try:
+			status = env.call(argv, timeout=timeout)
+		except EnvironmentError as ex:
+			logger.error('%s: %s', description, ex.strerror)
+			return False
+		if status < 0:
+			logger.error('%s: killed by signal %d', description,
+					-status)
+			return False
+		if status > 0:
+			logger.error('%s: exited with status %d', description,
+					status)
+			return False
+		return True
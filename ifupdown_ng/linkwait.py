@@ -0,0 +1,204 @@
+"""
+ifupdown_ng.linkwait  -  Event-driven waiting for link carrier
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import fcntl
+import os
+import select
+import socket
+import threading
+import time
+
+from ifupdown_ng import netlink
+
+
+class LinkWaiter(object):
+	"""Shared waiter for carrier changes on any number of interfaces
+
+	A single rtnetlink socket subscribed to RTNLGRP_LINK delivers every
+	link change.  Waiters (in any number of threads) each have their own
+	deadline; whichever thread is waiting at the time polls the socket
+	on behalf of all of them, with a timeout of the earliest deadline,
+	and wakes the others as soon as any link state changes.  A waiter
+	with an earlier deadline than the poll in progress interrupts it
+	through a pipe, so that the timeout is recomputed.
+
+	Carrier is taken from the IFF_LOWER_UP flag, which is set only when
+	the link is both administratively up and has a physical carrier.
+
+	Attributes:
+		conn: The netlink.RouteNetlink connection
+		carrier: Dict mapping from an ifname to its carrier state
+	"""
+	def __init__(self, transport=None, prime=True):
+		"""Subscribe to link notifications
+
+		Arguments:
+			transport: The netlink transport to use, which must
+				already be subscribed to link notifications.  If
+				unspecified a new socket is created.
+			prime: If True, dump the current state of all links
+				before waiting for any changes.
+		"""
+		if transport is None:
+			transport = netlink.NetlinkSocket(
+					groups=netlink.RTMGRP_LINK)
+		self.conn = netlink.RouteNetlink(transport)
+		self.carrier = dict()
+		self._cond = threading.Condition()
+		self._deadlines = []
+		self._pumping = False
+		self._pump_deadline = None
+		self._wake_r, self._wake_w = os.pipe()
+		for fdesc in (self._wake_r, self._wake_w):
+			flags = fcntl.fcntl(fdesc, fcntl.F_GETFD)
+			fcntl.fcntl(fdesc, fcntl.F_SETFD,
+					flags | fcntl.FD_CLOEXEC)
+			fcntl.fcntl(fdesc, fcntl.F_SETFL, os.O_NONBLOCK)
+		self._poller = select.poll()
+		self._poller.register(transport.fileno(), select.POLLIN)
+		self._poller.register(self._wake_r, select.POLLIN)
+
+		if prime:
+			self._prime()
+
+	def close(self):
+		self.conn.close()
+		os.close(self._wake_r)
+		os.close(self._wake_w)
+
+	def _prime(self):
+		## The dump is requested on the subscribed socket, so that any
+		## notifications are processed in order with the dump replies.
+		request = netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+		seq = self.conn.send(netlink.RTM_GETLINK, netlink.NLM_F_DUMP,
+				request)
+		while not self._receive(done_seq=seq):
+			pass
+
+	def _receive(self, done_seq=None):
+		"""Read and apply one datagram of link messages
+
+		Returns:
+			True if the datagram ended the dump 'done_seq'
+		"""
+		buf = self.conn.buf
+		length = self.conn.transport.recv_into(buf)
+		done = False
+		for msg_type, _, seq, offset, end in netlink.iter_messages(
+				buf, length):
+			if msg_type in (netlink.RTM_NEWLINK,
+					netlink.RTM_DELLINK):
+				link = netlink.parse_link(buf, offset, end)
+				self.carrier[link.name] = (
+					msg_type == netlink.RTM_NEWLINK and
+					bool(link.flags & netlink.IFF_LOWER_UP))
+			elif msg_type == netlink.NLMSG_ERROR and seq == done_seq:
+				error = -netlink.NLMSGERR.unpack_from(buf,
+						offset)[0]
+				raise netlink.NetlinkError(error,
+						'Link dump failed')
+			elif msg_type == netlink.NLMSG_DONE and seq == done_seq:
+				done = True
+		return done
+
+	def _pump(self):
+		## Called with the lock held; polls without it
+		self._pumping = True
+		self._pump_deadline = min(self._deadlines)
+		timeout = max(0.0, self._pump_deadline - time.time())
+		self._cond.release()
+		try:
+			try:
+				ready = self._poller.poll(int(timeout * 1000))
+			except select.error as ex:
+				if ex.args[0] != errno.EINTR:
+					raise
+				ready = ()
+		finally:
+			self._cond.acquire()
+
+		try:
+			for fdesc, _ in ready:
+				if fdesc == self._wake_r:
+					os.read(self._wake_r, 4096)
+				else:
+					self._receive()
+		finally:
+			self._pumping = False
+			self._cond.notify_all()
+
+	def wait_all(self, timeouts):
+		"""Wait for carrier on several interfaces at once
+
+		Arguments:
+			timeouts: Dict mapping from an ifname to the maximum
+				number of seconds to wait for it
+		Returns:
+			A dict mapping from each ifname to True if it has a
+			carrier, or False if its deadline passed first
+		"""
+		now = time.time()
+		deadlines = dict((ifname, now + timeout)
+				for ifname, timeout in timeouts.iteritems())
+		results = dict()
+
+		with self._cond:
+			self._deadlines.extend(deadlines.itervalues())
+			if (self._pumping and deadlines and
+					min(deadlines.itervalues()) <
+						self._pump_deadline):
+				try:
+					os.write(self._wake_w, '\0')
+				except OSError as ex:
+					## A full pipe will wake it anyway
+					if ex.errno != errno.EAGAIN:
+						raise
+			try:
+				while deadlines:
+					now = time.time()
+					for ifname, deadline in deadlines.items():
+						if self.carrier.get(ifname):
+							results[ifname] = True
+						elif now >= deadline:
+							results[ifname] = False
+						else:
+							continue
+						del deadlines[ifname]
+						self._deadlines.remove(deadline)
+					if not deadlines:
+						break
+					if self._pumping:
+						self._cond.wait()
+					else:
+						self._pump()
+			finally:
+				for deadline in deadlines.itervalues():
+					self._deadlines.remove(deadline)
+		return results
+
+	def wait(self, ifname, timeout):
+		"""Wait for carrier on one interface (safe to call in threads)
+
+		Returns:
+			True if the interface has carrier, or False on timeout
+		"""
+		return self.wait_all({ifname: timeout})[ifname]
@@ -21,33 +21,108 @@ from __future__ import absolute_import
 
 import logging
 
+## The standard log levels are multiples of 10 from NOTSET to CRITICAL, so
+## each can be counted in a fixed slot of a list instead of in a dict.
+_NR_LEVEL_SLOTS = logging.CRITICAL // 10 + 1
+_LEVEL_SLOTS = dict((slot * 10, slot) for slot in range(_NR_LEVEL_SLOTS))
+
 class LogCount(logging.Filter):
 	"""Logging Filter for counting messages of each log-level
 
 	This filter objet keeps track of how many messages of each log-level
 	have been processed by its attached logger object.
 
+	Messages at the standard levels are counted in fixed slots, so both
+	counting and threshold queries take constant time.
+
 	Attributes:
-		_nr_logs: Dict of message counts, indexed by level-nr
+		_nr_logs: List of message counts, indexed by level-nr / 10
+		_nr_other_logs: Dict of counts for any nonstandard levels
 	"""
 	def __init__(self):
 		super(LogCount, self).__init__()
-		self._nr_logs = dict()
+		self._nr_logs = [0] * _NR_LEVEL_SLOTS
+		self._nr_other_logs = dict()
 
 	def clear_nr_logs(self):
-		self._nr_logs.clear()
+		self._nr_logs[:] = [0] * _NR_LEVEL_SLOTS
+		self._nr_other_logs.clear()
 
 	def nr_logs(self, log_level_nr):
-		return self._nr_logs.get(log_level_nr, 0)
+		slot = _LEVEL_SLOTS.get(log_level_nr)
+		if slot is not None:
+			return self._nr_logs[slot]
+		return self._nr_other_logs.get(log_level_nr, 0)
 
 	def nr_logs_above(self, log_level_nr):
-		total = 0
-		for lvl, nr_logs in self._nr_logs.iteritems():
-			if lvl >= log_level_nr:
-				total += nr_logs
+		## Round up to the first standard level at or above the limit
+		first_slot = max(0, -(-log_level_nr // 10))
+		total = sum(self._nr_logs[first_slot:])
+		if self._nr_other_logs:
+			for lvl, nr_logs in self._nr_other_logs.iteritems():
+				if lvl >= log_level_nr:
+					total += nr_logs
 		return total
 
 	def filter(self, record):
-		self._nr_logs.setdefault(record.levelno, 0)
-		self._nr_logs[record.levelno] += 1
+		slot = _LEVEL_SLOTS.get(record.levelno)
+		if slot is not None:
+			self._nr_logs[slot] += 1
+		else:
+			other = self._nr_other_logs
+			other[record.levelno] = other.get(record.levelno, 0) + 1
 		return True
+
+
+class ContextAdapter(logging.LoggerAdapter):
+	"""LoggerAdapter for tagging messages with an interface and phase
+
+	The tags are attached to each record as the "interface" and "phase"
+	attributes, where they are picked up by the JSONFormatter.
+	"""
+	def __init__(self, logger, interface=None, phase=None):
+		super(ContextAdapter, self).__init__(logger, {
+			'interface': interface,
+			'phase': phase,
+		})
+
+	def process(self, msg, kwargs):
+		kwargs['extra'] = self.extra
+		return msg, kwargs
+
+
+class JSONFormatter(logging.Formatter):
+	"""Logging Formatter which produces one JSON object per line
+
+	Each object contains the time, level, logger name, and message of
+	the record, plus any of the structured fields in FIELDS which were
+	attached to it (EG: by ContextAdapter or parser.FilePosition).
+
+	Like any other Formatter this is only invoked when a record is
+	actually emitted, so callers which pass their message arguments
+	separately (instead of pre-formatting with "%") pay nothing for
+	messages which are filtered out.
+	"""
+	FIELDS = (
+		('interface', 'interface'),
+		('phase', 'phase'),
+		('file', 'parser_file_name'),
+		('line', 'parser_file_line'),
+	)
+
+	def format(self, record):
+		import json
+		data = {
+			'time': record.created,
+			'level': record.levelname,
+			'logger': record.name,
+			'message': record.getMessage(),
+		}
+		for field, attr in self.FIELDS:
+			value = getattr(record, attr, None)
+			if value is not None:
+				data[field] = value
+		if record.exc_info:
+			data['exception'] = self.formatException(
+					record.exc_info)
+		return json.dumps(data, sort_keys=True)
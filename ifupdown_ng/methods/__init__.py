@@ -0,0 +1,393 @@
+"""
+ifupdown_ng.methods  -  Built-in address-family method implementations
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import importlib
+import re
+import socket
+import threading
+
+from ifupdown_ng import netlink
+
+## The module implementing each built-in (address family, method), which
+## is only imported when a stanza actually uses it.  Each module provides:
+##
+##   OPTIONS:  Dict mapping from each option the method understands to the
+##             name of its value type (see VALUE_TYPES)
+##   REQUIRED: Sequence of the options which must be present
+##   operations(mode, ifname, config): The operations to apply
+##
+## A module may also provide:
+##
+##   is_configured(config, link): True if the kernel state of the (up)
+##             link shows the stanza is still applied, which lets ifup
+##             skip it (see execute.is_configured)
+##   IGNORED:  Sequence of the OPTIONS which are accepted (as with other
+##             ifupdown implementations) but have no effect, so that a
+##             warning is given for each one which is used
+METHOD_MODULES = {
+	('inet', 'static'):    'ifupdown_ng.methods.static',
+	('inet6', 'static'):   'ifupdown_ng.methods.static',
+	('inet', 'dhcp'):      'ifupdown_ng.methods.dhcp',
+	('inet6', 'auto'):     'ifupdown_ng.methods.auto',
+	('inet', 'manual'):    'ifupdown_ng.methods.manual',
+	('inet6', 'manual'):   'ifupdown_ng.methods.manual',
+	('inet', 'loopback'):  'ifupdown_ng.methods.loopback',
+	('inet6', 'loopback'): 'ifupdown_ng.methods.loopback',
+}
+
+## The socket address family for each ifupdown address family
+ADDRESS_FAMILIES = {
+	'inet':  socket.AF_INET,
+	'inet6': socket.AF_INET6,
+}
+
+
+def get_method(address_family, method):
+	"""Return the module implementing a method, or None if unknown"""
+	module_name = METHOD_MODULES.get((address_family, method))
+	if module_name is None:
+		return None
+	return importlib.import_module(module_name)
+
+
+_INT_RE = re.compile(r'^[0-9]+$')
+_HWADDRESS_RE = re.compile(
+		r'^(ether\s+)?([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
+_HOSTNAME_RE = re.compile(r'^[A-Za-z0-9]([A-Za-z0-9.-]*[A-Za-z0-9])?$')
+
+def _address_validator(address_family):
+	family = ADDRESS_FAMILIES[address_family]
+	def valid_address(value):
+		try:
+			socket.inet_pton(family, value)
+		except (socket.error, ValueError):
+			return False
+		return True
+	return valid_address
+
+def _cidr_validator(address_family):
+	valid_address = _address_validator(address_family)
+	def valid_cidr(value):
+		address, slash, prefixlen = value.partition('/')
+		return valid_address(address) and (not slash or
+				bool(_INT_RE.match(prefixlen)))
+	return valid_cidr
+
+def _netmask_validator(address_family):
+	valid_address = _address_validator(address_family)
+	def valid_netmask(value):
+		return bool(_INT_RE.match(value)) or (
+				address_family == 'inet' and valid_address(value))
+	return valid_netmask
+
+def _broadcast_validator(address_family):
+	valid_address = _address_validator(address_family)
+	def valid_broadcast(value):
+		return value in ('+', '-') or valid_address(value)
+	return valid_broadcast
+
+## Factories for the validator of each option value type, which are called
+## with the address family when a method's schema is compiled
+VALUE_TYPES = {
+	'string':    lambda _family: bool,
+	'int':       lambda _family: _INT_RE.match,
+	'hwaddress': lambda _family: _HWADDRESS_RE.match,
+	'hostname':  lambda _family: _HOSTNAME_RE.match,
+	'address':   _address_validator,
+	'cidr':      _cidr_validator,
+	'netmask':   _netmask_validator,
+	'broadcast': _broadcast_validator,
+}
+
+
+class MethodSchema(object):
+	"""The compiled option schema of a single method
+
+	Attributes:
+		address_family: The address family (EG: "inet")
+		method: The method name (EG: "static")
+		validators: Dict mapping from an option to its validator
+		required: Tuple of the options which must be present
+		ignored: Tuple of the options which have no effect
+	"""
+	def __init__(self, address_family, method, options, required=(),
+			ignored=()):
+		self.address_family = address_family
+		self.method = method
+		self.validators = dict((option, VALUE_TYPES[value_type](
+				address_family))
+				for option, value_type in options.iteritems())
+		self.required = tuple(required)
+		self.ignored = tuple(ignored)
+
+	def validate(self, options):
+		"""Check a dict of stanza options against the schema
+
+		Options which are not part of the schema are ignored, since
+		they may be used by hook scripts (EG: "bridge-ports").
+
+		Returns:
+			A list of error messages, which is empty if valid
+		"""
+		errors = ['Missing required option: %s' % option
+				for option in self.required
+				if option not in options]
+		for option, value in options.iteritems():
+			validator = self.validators.get(option)
+			if validator is not None and not validator(value):
+				errors.append('Invalid value for option %s: %s' % (
+						option, value))
+		return errors
+
+	def unsupported(self, options):
+		"""Return a warning for each option which has no effect"""
+		return ['Option %s is ignored by the %s %s method' % (option,
+				self.address_family, self.method)
+			for option in self.ignored if option in options]
+
+## Compiled schemas indexed by (address family, method)
+_SCHEMAS = dict()
+
+def get_schema(address_family, method):
+	"""Return the (cached) MethodSchema for a method, or None"""
+	key = (address_family, method)
+	schema = _SCHEMAS.get(key)
+	if schema is None:
+		module = get_method(address_family, method)
+		if module is None:
+			return None
+		schema = MethodSchema(address_family, method,
+				module.OPTIONS, module.REQUIRED,
+				getattr(module, 'IGNORED', ()))
+		_SCHEMAS[key] = schema
+	return schema
+
+
+class Command(object):
+	"""Run an external command which has no rtnetlink equivalent
+
+	Attributes:
+		args: The command and its arguments
+	"""
+	__slots__ = ('args',)
+	NETLINK = False
+
+	def __init__(self, args):
+		self.args = list(args)
+
+	def argv(self):
+		"""Return the command to run"""
+		return list(self.args)
+
+
+class LinkChange(object):
+	"""Set a link administratively up or down
+
+	Attributes:
+		ifname: The interface to change
+		up: True to bring the link up, False to take it down
+		mtu: The MTU to set as an integer, or None
+	"""
+	__slots__ = ('ifname', 'up', 'mtu')
+	NETLINK = True
+
+	def __init__(self, ifname, up, mtu=None):
+		self.ifname = ifname
+		self.up = up
+		self.mtu = mtu
+
+	def inverse(self):
+		"""Return the operation which undoes this one"""
+		return LinkChange(self.ifname, not self.up)
+
+	def argv(self):
+		"""Return the equivalent ip(8) command"""
+		argv = ['ip', 'link', 'set', 'dev', self.ifname,
+				'up' if self.up else 'down']
+		if self.mtu is not None:
+			argv += ['mtu', str(self.mtu)]
+		return argv
+
+	def request(self, ifindex):
+		"""Return the equivalent (msg_type, flags, payload) request"""
+		payload = netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 0, ifindex,
+				netlink.IFF_UP if self.up else 0, netlink.IFF_UP)
+		if self.mtu is not None:
+			payload += netlink.pack_attr(netlink.IFLA_MTU,
+					netlink.U32.pack(self.mtu))
+		return (netlink.RTM_NEWLINK, 0, payload)
+
+
+class AddressChange(object):
+	"""Add or remove a single address on a link
+
+	Attributes:
+		ifname: The interface to change
+		add: True to add the address, False to remove it
+		address_family: Either "inet" or "inet6"
+		address: The local address, without a prefix length
+		prefixlen: The prefix length as an integer
+		broadcast: The broadcast address, or None
+		peer: The point-to-point peer address, or None
+	"""
+	__slots__ = ('ifname', 'add', 'address_family', 'address',
+			'prefixlen', 'broadcast', 'peer')
+	NETLINK = True
+
+	def __init__(self, ifname, add, address_family, address, prefixlen,
+			broadcast=None, peer=None):
+		self.ifname = ifname
+		self.add = add
+		self.address_family = address_family
+		self.address = address
+		self.prefixlen = prefixlen
+		self.broadcast = broadcast
+		self.peer = peer
+
+	def inverse(self):
+		"""Return the operation which undoes this one"""
+		return AddressChange(self.ifname, not self.add,
+				self.address_family, self.address,
+				self.prefixlen, self.broadcast, self.peer)
+
+	def argv(self):
+		"""Return the equivalent ip(8) command"""
+		argv = ['ip', 'addr', 'add' if self.add else 'del',
+				'%s/%d' % (self.address, self.prefixlen)]
+		if self.broadcast is not None:
+			argv += ['broadcast', self.broadcast]
+		if self.peer is not None:
+			argv += ['peer', self.peer]
+		return argv + ['dev', self.ifname]
+
+	def request(self, ifindex):
+		"""Return the equivalent (msg_type, flags, payload) request"""
+		family = ADDRESS_FAMILIES[self.address_family]
+		local = socket.inet_pton(family, self.address)
+		peer = local
+		if self.peer is not None:
+			peer = socket.inet_pton(family, self.peer)
+
+		payload = (netlink.IFADDRMSG.pack(family, self.prefixlen, 0,
+				netlink.RT_SCOPE_UNIVERSE, ifindex) +
+				netlink.pack_attr(netlink.IFA_LOCAL, local) +
+				netlink.pack_attr(netlink.IFA_ADDRESS, peer))
+		if self.broadcast is not None:
+			payload += netlink.pack_attr(netlink.IFA_BROADCAST,
+					socket.inet_pton(family, self.broadcast))
+		if self.add:
+			return (netlink.RTM_NEWADDR,
+				netlink.NLM_F_CREATE | netlink.NLM_F_EXCL, payload)
+		return (netlink.RTM_DELADDR, 0, payload)
+
+
+class RouteChange(object):
+	"""Add or remove the default route through a gateway
+
+	Attributes:
+		ifname: The interface the route goes out of
+		add: True to add the route, False to remove it
+		address_family: Either "inet" or "inet6"
+		gateway: The address of the gateway
+		metric: The route metric as an integer, or None
+	"""
+	__slots__ = ('ifname', 'add', 'address_family', 'gateway', 'metric')
+	NETLINK = True
+
+	def __init__(self, ifname, add, address_family, gateway, metric=None):
+		self.ifname = ifname
+		self.add = add
+		self.address_family = address_family
+		self.gateway = gateway
+		self.metric = metric
+
+	def inverse(self):
+		"""Return the operation which undoes this one"""
+		return RouteChange(self.ifname, not self.add,
+				self.address_family, self.gateway, self.metric)
+
+	def argv(self):
+		"""Return the equivalent ip(8) command"""
+		argv = ['ip', 'route', 'add' if self.add else 'del', 'default',
+				'via', self.gateway]
+		if self.metric is not None:
+			argv += ['metric', str(self.metric)]
+		return argv + ['dev', self.ifname]
+
+	def request(self, ifindex):
+		"""Return the equivalent (msg_type, flags, payload) request"""
+		family = ADDRESS_FAMILIES[self.address_family]
+		## Like ip(8), a deletion matches a route of any protocol,
+		## scope and type
+		if self.add:
+			header = netlink.RTMSG.pack(family, 0, 0, 0,
+					netlink.RT_TABLE_MAIN, netlink.RTPROT_BOOT,
+					netlink.RT_SCOPE_UNIVERSE,
+					netlink.RTN_UNICAST, 0)
+		else:
+			header = netlink.RTMSG.pack(family, 0, 0, 0,
+					netlink.RT_TABLE_MAIN, 0,
+					netlink.RT_SCOPE_NOWHERE, 0, 0)
+
+		payload = (header + netlink.pack_attr(netlink.RTA_GATEWAY,
+				socket.inet_pton(family, self.gateway)) +
+				netlink.pack_attr(netlink.RTA_OIF,
+				netlink.U32.pack(ifindex)))
+		if self.metric is not None:
+			payload += netlink.pack_attr(netlink.RTA_PRIORITY,
+					netlink.U32.pack(self.metric))
+		if self.add:
+			return (netlink.RTM_NEWROUTE,
+				netlink.NLM_F_CREATE | netlink.NLM_F_EXCL, payload)
+		return (netlink.RTM_DELROUTE, 0, payload)
+
+
+class NetlinkBackend(object):
+	"""Applies method operations directly over an rtnetlink socket
+
+	All of the operations for one interface are sent as a single batch
+	and the kernel's ACKs are collected afterwards, so applying a
+	stanza costs one round-trip instead of one ip(8) process for each
+	operation.
+
+	Attributes:
+		rtnl: The netlink.RouteNetlink connection
+	"""
+	def __init__(self, transport=None):
+		self.rtnl = netlink.RouteNetlink(transport)
+		self._lock = threading.Lock()
+
+	def close(self):
+		self.rtnl.close()
+
+	def apply(self, ifname, operations):
+		"""Apply a sequence of operations to a single interface
+
+		Returns:
+			A list of the errno for each operation (0 on success)
+		Raises:
+			NetlinkError: If the interface does not exist
+		"""
+		## The connection is shared by all scheduler threads
+		with self._lock:
+			ifindex = self.rtnl.get_link_index(ifname)
+			return self.rtnl.transact([operation.request(ifindex)
+					for operation in operations])
@@ -0,0 +1,67 @@
+"""
+ifupdown_ng.methods.auto  -  The "inet6 auto" method (stateless autoconfig)
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+from ifupdown_ng import methods
+from ifupdown_ng.methods import dhcp
+
+OPTIONS = {
+	'privext':   'int',
+	'accept_ra': 'int',
+	'dhcp':      'int',
+}
+REQUIRED = ()
+
+SYSCTL = 'sysctl'
+
+
+def _sysctl(ifname, key, value):
+	## Dots in interface names (EG: VLANs) are written as slashes
+	return methods.Command([SYSCTL, '-q', '-e', '-w',
+			'net.ipv6.conf.%s.%s=%s' % (ifname.replace('.', '/'),
+			key, value)])
+
+
+def operations(mode, ifname, config):
+	"""Return the operations which start (or stop) autoconfiguration
+
+	Router advertisements and address autoconfiguration are enabled
+	before the link is brought up.  If the "dhcp" option is "1" then a
+	stateless DHCPv6 client is also run for the other parameters.
+	"""
+	options = config.options
+	use_dhcp = options.get('dhcp') == '1'
+	files = dhcp.dhclient_files(ifname, '-6')
+	if mode == 'stop':
+		ops = []
+		if use_dhcp:
+			ops.append(methods.Command([dhcp.DHCLIENT, '-6', '-r'] +
+					files + [ifname]))
+		return ops + [methods.LinkChange(ifname, False)]
+
+	ops = [_sysctl(ifname, 'accept_ra', options.get('accept_ra', '2')),
+		_sysctl(ifname, 'autoconf', '1')]
+	if 'privext' in options:
+		ops.append(_sysctl(ifname, 'use_tempaddr', options['privext']))
+	ops.append(methods.LinkChange(ifname, True))
+	if use_dhcp:
+		ops.append(methods.Command([dhcp.DHCLIENT, '-1', '-6', '-S'] +
+				files + [ifname]))
+	return ops
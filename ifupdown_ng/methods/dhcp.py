@@ -0,0 +1,68 @@
+"""
+ifupdown_ng.methods.dhcp  -  The "inet dhcp" method
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+
+from ifupdown_ng import methods
+from ifupdown_ng.autogen.config import RUN_DIR
+
+OPTIONS = {
+	'hostname':  'hostname',
+	'metric':    'int',
+	'leasetime': 'int',
+	'vendor':    'string',
+	'client':    'string',
+}
+REQUIRED = ()
+
+## These are only used by the other DHCP clients which ifupdown supports,
+## and dhclient(8) has no command-line equivalent for them
+IGNORED = ('hostname', 'leasetime', 'vendor', 'client')
+
+DHCLIENT = 'dhclient'
+
+
+def dhclient_files(ifname, family_flag):
+	"""Return the dhclient(8) pid and lease file arguments for a link"""
+	suffix = '6' if family_flag == '-6' else ''
+	return ['-pf', os.path.join(RUN_DIR, 'dhclient%s.%s.pid' % (
+				suffix, ifname)),
+		'-lf', os.path.join(RUN_DIR, 'dhclient%s.%s.leases' % (
+				suffix, ifname))]
+
+
+def operations(mode, ifname, config):
+	"""Return the operations which start (or stop) a DHCP client
+
+	The link is brought up before dhclient(8) is started, and taken down
+	after the lease has been released.
+	"""
+	files = dhclient_files(ifname, '-4')
+	if mode == 'stop':
+		return [methods.Command([DHCLIENT, '-4', '-r'] + files +
+				[ifname]),
+			methods.LinkChange(ifname, False)]
+
+	argv = [DHCLIENT, '-1', '-4'] + files
+	if 'metric' in config.options:
+		argv += ['-e', 'IF_METRIC=%s' % config.options['metric']]
+	return [methods.LinkChange(ifname, True),
+		methods.Command(argv + [ifname])]
@@ -0,0 +1,33 @@
+"""
+ifupdown_ng.methods.loopback  -  The "loopback" method for any address family
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+from ifupdown_ng import methods
+
+OPTIONS = {}
+REQUIRED = ()
+
+
+def operations(mode, ifname, _config):
+	"""Return the operations which bring the loopback up (or down)
+
+	The kernel assigns the loopback addresses itself.
+	"""
+	return [methods.LinkChange(ifname, mode != 'stop')]
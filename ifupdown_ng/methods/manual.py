@@ -0,0 +1,40 @@
+"""
+ifupdown_ng.methods.manual  -  The "manual" method for any address family
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+from ifupdown_ng import methods
+
+OPTIONS = {
+	'mtu': 'int',
+}
+REQUIRED = ()
+
+
+def operations(mode, ifname, config):
+	"""Return the operations which bring the link up (or down)
+
+	No addresses are configured; that is left to the stanza's own
+	commands and to the hook scripts.
+	"""
+	if mode == 'stop':
+		return [methods.LinkChange(ifname, False)]
+	mtu = config.options.get('mtu')
+	return [methods.LinkChange(ifname, True,
+			int(mtu) if mtu is not None else None)]
@@ -0,0 +1,172 @@
+"""
+ifupdown_ng.methods.static  -  The "inet static" and "inet6 static" methods
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import socket
+import struct
+
+from ifupdown_ng import methods
+
+OPTIONS = {
+	'address':     'cidr',
+	'netmask':     'netmask',
+	'broadcast':   'broadcast',
+	'pointopoint': 'address',
+	'gateway':     'address',
+	'metric':      'int',
+	'mtu':         'int',
+}
+REQUIRED = ('address',)
+
+_MAX_PREFIXLEN = {
+	'inet':  32,
+	'inet6': 128,
+}
+
+
+def _check_address(address_family, address):
+	try:
+		socket.inet_pton(methods.ADDRESS_FAMILIES[address_family],
+				address)
+	except (socket.error, ValueError):
+		raise ValueError('Invalid %s address: %s' % (address_family,
+				address))
+	return address
+
+def _parse_int(name, value):
+	if not value.isdigit():
+		raise ValueError('Invalid %s: %s' % (name, value))
+	return int(value)
+
+def _parse_netmask(address_family, netmask):
+	"""Convert a prefix length or dotted-quad netmask to a prefix length"""
+	max_prefixlen = _MAX_PREFIXLEN[address_family]
+	if netmask.isdigit():
+		prefixlen = int(netmask)
+	elif address_family == 'inet':
+		mask = struct.unpack('!I', socket.inet_aton(
+				_check_address('inet', netmask)))[0]
+		prefixlen = bin(mask).count('1')
+		if mask != (0xffffffff << (32 - prefixlen)) & 0xffffffff:
+			raise ValueError('Invalid netmask: %s' % netmask)
+	else:
+		prefixlen = -1
+	if not 0 <= prefixlen <= max_prefixlen:
+		raise ValueError('Invalid netmask: %s' % netmask)
+	return prefixlen
+
+def _broadcast(address, prefixlen):
+	"""Compute the default IPv4 broadcast address for a subnet"""
+	if prefixlen >= 31:
+		return None
+	host = 0xffffffff >> prefixlen
+	value = struct.unpack('!I', socket.inet_aton(address))[0] | host
+	return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def _address_key(family, address, prefixlen):
+	return (socket.inet_ntop(family, socket.inet_pton(family, address)),
+			int(prefixlen))
+
+def is_configured(config, link):
+	"""Return True if a link already carries a static stanza's address
+
+	Arguments:
+		config: The InterfaceConfig of the stanza
+		link: The sysfs.LinkState of the interface, which is up
+	"""
+	family = config.address_family
+	options = config.options
+	mtu = options.get('mtu')
+	try:
+		if mtu is not None and link.mtu != _parse_int('mtu', mtu):
+			return False
+		address, _, prefixlen = options['address'].partition('/')
+		if not prefixlen:
+			prefixlen = options.get('netmask',
+					str(_MAX_PREFIXLEN[family]))
+		wanted = _address_key(methods.ADDRESS_FAMILIES[family],
+				address, _parse_netmask(family, prefixlen))
+	except (KeyError, ValueError, socket.error):
+		return False
+
+	for present in link.addresses:
+		present, _, prefixlen = present.partition('/')
+		try:
+			if _address_key(methods.ADDRESS_FAMILIES[family],
+					present, prefixlen) == wanted:
+				return True
+		except (ValueError, socket.error):
+			## EG: An address of the other family
+			continue
+	return False
+
+
+def operations(mode, ifname, config):
+	"""Return the operations which apply (or remove) a static stanza
+
+	For "start" the link is brought up (setting its MTU), then the
+	address is added, then the default route.  For "stop" the same
+	operations are undone in the reverse order.
+
+	Raises:
+		ValueError: If an option has an invalid value
+	"""
+	family = config.address_family
+	options = config.options
+	mtu = options.get('mtu')
+	ops = [methods.LinkChange(ifname, True,
+			_parse_int('mtu', mtu) if mtu is not None else None)]
+
+	address = options.get('address')
+	if address is not None:
+		address, _, prefixlen = address.partition('/')
+		_check_address(family, address)
+		if not prefixlen:
+			prefixlen = options.get('netmask',
+					str(_MAX_PREFIXLEN[family]))
+		prefixlen = _parse_netmask(family, prefixlen)
+
+		peer = options.get('pointopoint')
+		if peer is not None:
+			_check_address(family, peer)
+		broadcast = None
+		if family == 'inet' and peer is None:
+			broadcast = options.get('broadcast', '+')
+			if broadcast == '+':
+				broadcast = _broadcast(address, prefixlen)
+			elif broadcast == '-':
+				broadcast = None
+			else:
+				_check_address(family, broadcast)
+		ops.append(methods.AddressChange(ifname, True, family,
+				address, prefixlen, broadcast, peer))
+
+	gateway = options.get('gateway')
+	if gateway is not None:
+		metric = options.get('metric')
+		ops.append(methods.RouteChange(ifname, True, family,
+				_check_address(family, gateway),
+				_parse_int('metric', metric)
+					if metric is not None else None))
+
+	if mode == 'stop':
+		ops = [op.inverse() for op in reversed(ops)]
+	return ops
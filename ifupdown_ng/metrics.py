@@ -0,0 +1,272 @@
+"""
+ifupdown_ng.metrics  -  Prometheus metrics for each command run
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import collections
+import logging
+import os
+import threading
+import time
+
+from ifupdown_ng import trace
+
+## The help text for each metric, in the order they are written.  Every
+## value describes the most recent run of a command (which is the
+## "command" label), so they are all gauges.
+METRICS = (
+	('ifupdown_last_run_timestamp_seconds',
+		'When the command last finished'),
+	('ifupdown_run_duration_seconds',
+		'How long the command ran'),
+	('ifupdown_run_exit_status',
+		'The exit status of the command'),
+	('ifupdown_log_messages',
+		'Messages logged by the command at each level'),
+	('ifupdown_config_parse_seconds',
+		'Time spent loading the interfaces(5) config'),
+	('ifupdown_config_files',
+		'Config files loaded (including sourced files)'),
+	('ifupdown_config_stanzas',
+		'"iface" stanzas loaded'),
+	('ifupdown_config_errors',
+		'Errors found in the config'),
+	('ifupdown_config_warnings',
+		'Warnings about the config'),
+	('ifupdown_mapping_runs',
+		'Mapping scripts run'),
+	('ifupdown_mapping_failures',
+		'Mapping scripts which failed'),
+	('ifupdown_mapping_seconds',
+		'Time spent running mapping scripts'),
+	('ifupdown_interface_duration_seconds',
+		'Time spent configuring each interface'),
+	('ifupdown_interface_failed',
+		'Whether each interface failed'),
+	('ifupdown_phase_duration_seconds',
+		'Time spent in each phase of each interface'),
+	('ifupdown_phase_failed',
+		'Whether each phase of each interface failed'),
+	('ifupdown_commands',
+		'Commands and hooks run, by program'),
+	('ifupdown_command_failures',
+		'Commands and hooks which failed, by program'),
+	('ifupdown_command_seconds',
+		'Time spent running commands and hooks, by program'),
+	('ifupdown_plugin_hooks',
+		'Python hook plugins run'),
+	('ifupdown_plugin_hook_failures',
+		'Python hook plugins which failed'),
+	('ifupdown_link_waits',
+		'Interfaces waited on for a carrier'),
+	('ifupdown_link_wait_timeouts',
+		'Interfaces with no carrier before link-wait expired'),
+	('ifupdown_link_wait_seconds',
+		'Time spent waiting for carriers'),
+)
+
+_LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def _escape(value):
+	return (unicode(value).replace('\\', '\\\\').replace('"', '\\"')
+			.replace('\n', '\\n'))
+
+def _format_value(value):
+	if isinstance(value, bool):
+		value = int(value)
+	if isinstance(value, float):
+		return repr(value)
+	return str(value)
+
+
+class _Totals(object):
+	"""The number of runs, failures, and time spent for some spans"""
+	__slots__ = ('runs', 'failures', 'seconds')
+
+	def __init__(self):
+		self.runs = 0
+		self.failures = 0
+		self.seconds = 0.0
+
+	def add(self, seconds, failed):
+		self.runs += 1
+		self.failures += int(bool(failed))
+		self.seconds += seconds
+
+
+class MetricsCollector(object):
+	"""Trace sink which totals up the spans of a command into metrics
+
+	A MetricsCollector is installed as the global tracer (see
+	trace.enable), so everything which is already traced is measured
+	without any further instrumentation.  Completed spans are passed on
+	to another Tracer when "--trace" is also used.
+
+	Attributes:
+		command: The command being measured (EG: "ifup")
+		tracer: A trace.Tracer which also gets each span, or None
+		values: Dict mapping from (metric name, labels) to each value,
+			where the labels are a tuple of (name, value) pairs
+	"""
+	def __init__(self, command, tracer=None):
+		self.command = command
+		self.tracer = tracer
+		self.values = dict()
+		self._execs = collections.defaultdict(_Totals)
+		self._plugins = _Totals()
+		self._mappings = _Totals()
+		self._waits = _Totals()
+		self._lock = threading.Lock()
+
+	def span(self, name, category, **args):
+		"""Start a new span"""
+		return trace.Span(self, name, category, args)
+
+	def record(self, span, end):
+		"""Add a completed span to the totals"""
+		if self.tracer is not None:
+			self.tracer.record(span, end)
+		seconds = end - span.start
+		args = span.args
+		failed = 'exception' in args or args.get('failed', False)
+		with self._lock:
+			if span.category == 'exec':
+				## ip(8), "up" commands, hooks, and netlink
+				failed = (failed or bool(args.get('status')) or
+						'killed' in args)
+				program = span.name.split(' ', 1)[0]
+				self._execs[program].add(seconds, failed)
+			elif span.category == 'iface':
+				labels = (('interface', args['iface']),)
+				self.set('ifupdown_interface_duration_seconds',
+						seconds, labels)
+				self.set('ifupdown_interface_failed', failed,
+						labels)
+			elif span.category == 'phase':
+				labels = (('interface', args['iface']),
+						('phase', args['phase']))
+				self.set('ifupdown_phase_duration_seconds',
+						seconds, labels)
+				self.set('ifupdown_phase_failed', failed,
+						labels)
+			elif span.category == 'hook':
+				self._plugins.add(seconds, failed)
+			elif span.category == 'mapping':
+				failed = failed or bool(args.get('status'))
+				self._mappings.add(seconds, failed)
+			elif span.category == 'wait':
+				self._waits.add(seconds,
+						not args.get('carrier', True))
+			elif span.name == 'load config':
+				self._record_config(seconds, args)
+			elif span.category == 'command':
+				self.set('ifupdown_run_duration_seconds',
+						seconds)
+
+	def _record_config(self, seconds, args):
+		## The counts are attached to the span by SystemConfig
+		self.set('ifupdown_config_parse_seconds', seconds)
+		for key in ('files', 'stanzas', 'errors', 'warnings'):
+			if key in args:
+				self.set('ifupdown_config_' + key, args[key])
+
+	def set(self, metric, value, labels=()):
+		"""Set the value of a metric (with any extra labels)"""
+		self.values[(metric, labels)] = value
+
+	def finish(self, status, log_total):
+		"""Fill in the results of the whole run
+
+		Arguments:
+			status: The exit status of the command
+			log_total: The logfilter.LogCount for all messages
+		"""
+		self.set('ifupdown_last_run_timestamp_seconds', time.time())
+		self.set('ifupdown_run_exit_status', status)
+		for level in _LOG_LEVELS:
+			self.set('ifupdown_log_messages', log_total.nr_logs(
+					getattr(logging, level)),
+					(('level', level.lower()),))
+		for program, totals in self._execs.iteritems():
+			labels = (('program', program),)
+			self.set('ifupdown_commands', totals.runs, labels)
+			self.set('ifupdown_command_failures', totals.failures,
+					labels)
+			self.set('ifupdown_command_seconds', totals.seconds,
+					labels)
+		for metric, totals in (('ifupdown_plugin_hooks', self._plugins),
+				('ifupdown_mapping_runs', self._mappings),
+				('ifupdown_link_waits', self._waits)):
+			self.set(metric, totals.runs)
+		self.set('ifupdown_plugin_hook_failures',
+				self._plugins.failures)
+		self.set('ifupdown_mapping_failures', self._mappings.failures)
+		self.set('ifupdown_mapping_seconds', self._mappings.seconds)
+		self.set('ifupdown_link_wait_timeouts', self._waits.failures)
+		self.set('ifupdown_link_wait_seconds', self._waits.seconds)
+
+	def format(self):
+		"""Return the metrics in the Prometheus text format"""
+		by_metric = collections.defaultdict(list)
+		for (metric, labels), value in self.values.iteritems():
+			by_metric[metric].append((labels, value))
+
+		lines = []
+		command_label = 'command="%s"' % _escape(self.command)
+		for metric, description in METRICS:
+			samples = by_metric.get(metric)
+			if not samples:
+				continue
+			lines.append('# HELP %s %s' % (metric, description))
+			lines.append('# TYPE %s gauge' % metric)
+			for labels, value in sorted(samples):
+				label_text = ''.join(',%s="%s"' % (name,
+						_escape(label))
+						for name, label in labels)
+				lines.append('%s{%s%s} %s' % (metric,
+						command_label, label_text,
+						_format_value(value)))
+		return u'\n'.join(lines).encode('utf-8') + '\n'
+
+	def write_textfile(self, directory):
+		"""Atomically replace this command's file in 'directory'
+
+		The file is named "ifupdown-ng-COMMAND.prom", as read by the
+		node_exporter textfile collector.  It is written to a hidden
+		temporary name first (which the collector ignores) and then
+		renamed, so a partial file is never seen.
+
+		Raises:
+			OSError, IOError: If the file cannot be written
+		"""
+		path = os.path.join(directory,
+				'ifupdown-ng-%s.prom' % self.command)
+		tmp_path = os.path.join(directory, '.ifupdown-ng-%s.prom.%d'
+				% (self.command, os.getpid()))
+		try:
+			with open(tmp_path, 'w') as mfile:
+				mfile.write(self.format())
+			os.chmod(tmp_path, 0644)
+			os.rename(tmp_path, path)
+		except EnvironmentError:
+			if os.path.exists(tmp_path):
+				os.unlink(tmp_path)
+			raise
+		return path
@@ -0,0 +1,488 @@
+"""
+ifupdown_ng.netlink  -  Minimal in-process rtnetlink client
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import socket
+import struct
+
+from ifupdown_ng import sysfs
+
+###
+## Protocol constants from <linux/netlink.h> and <linux/rtnetlink.h>
+###
+NETLINK_ROUTE = 0
+
+NLMSG_NOOP  = 1
+NLMSG_ERROR = 2
+NLMSG_DONE  = 3
+
+NLM_F_REQUEST = 0x001
+NLM_F_MULTI   = 0x002
+NLM_F_ACK     = 0x004
+NLM_F_ROOT    = 0x100
+NLM_F_MATCH   = 0x200
+NLM_F_DUMP    = NLM_F_ROOT | NLM_F_MATCH
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL    = 0x200
+NLM_F_CREATE  = 0x400
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+
+IFLA_ADDRESS   = 1
+IFLA_IFNAME    = 3
+IFLA_MTU       = 4
+IFLA_MASTER    = 10
+IFLA_OPERSTATE = 16
+IFLA_CARRIER   = 33
+
+IFA_ADDRESS   = 1
+IFA_LOCAL     = 2
+IFA_BROADCAST = 4
+
+RTA_DST      = 1
+RTA_OIF      = 4
+RTA_GATEWAY  = 5
+RTA_PRIORITY = 6
+
+RT_TABLE_MAIN     = 254
+RTPROT_BOOT       = 3
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_NOWHERE  = 255
+RTN_UNICAST       = 1
+
+IFF_UP       = 0x1
+IFF_LOWER_UP = 0x10000
+
+## Multicast group bitmasks for NetlinkSocket(groups=...)
+RTMGRP_LINK = 0x1
+
+## Names for IFLA_OPERSTATE values, matching /sys/class/net/*/operstate
+OPERSTATES = ('unknown', 'notpresent', 'down', 'lowerlayerdown',
+		'testing', 'dormant', 'up')
+
+###
+## Wire formats (all in native byte order)
+###
+NLMSGHDR  = struct.Struct('=IHHII')  # len, type, flags, seq, pid
+NLMSGERR  = struct.Struct('=i')      # error (followed by original hdr)
+IFINFOMSG = struct.Struct('=BxHiII') # family, type, index, flags, change
+IFADDRMSG = struct.Struct('=BBBBI')  # family, prefixlen, flags, scope, idx
+RTMSG     = struct.Struct('=BBBBBBBBI') # family, dst_len, src_len, tos,
+                                       # table, protocol, scope, type, flags
+RTATTR    = struct.Struct('=HH')     # len, type
+U32       = struct.Struct('=I')
+
+RECV_BUFFER_SIZE = 65536
+
+def align(length):
+	"""Round a length up to the 4-byte netlink alignment"""
+	return (length + 3) & ~3
+
+def pack_attr(attr_type, data):
+	"""Encode a single (padded) rtattr"""
+	attr = RTATTR.pack(RTATTR.size + len(data), attr_type) + data
+	return attr + '\0' * (align(len(attr)) - len(attr))
+
+
+class NetlinkError(EnvironmentError):
+	"""An error response (NLMSG_ERROR) from the kernel"""
+	pass
+
+
+###
+## Transports
+###
+## A transport moves raw datagrams to and from the kernel.  It must provide
+## fileno(), send(data), recv_into(buf) and close(); the socket-based one
+## below is used by default, and tests may substitute RecordedNetlink.
+###
+class NetlinkSocket(object):
+	"""Transport over a real AF_NETLINK socket
+
+	Arguments:
+		groups: Bitmask of multicast groups to subscribe to
+	"""
+	def __init__(self, groups=0):
+		self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+				NETLINK_ROUTE)
+		self.sock.bind((0, groups))
+
+	def fileno(self):
+		return self.sock.fileno()
+
+	def send(self, data):
+		return self.sock.send(data)
+
+	def recv_into(self, buf):
+		return self.sock.recv_into(buf)
+
+	def close(self):
+		self.sock.close()
+
+
+class RecordedNetlink(object):
+	"""Transport which replays previously recorded kernel responses
+
+	Each call to recv_into() returns the next recorded datagram, and
+	every request which is sent is saved for later inspection.  The
+	datagrams are queued on a socketpair so that fileno() may be used
+	with poll() exactly like a real netlink socket.
+
+	Attributes:
+		sent: List of all request datagrams sent so far
+	"""
+	def __init__(self, datagrams=()):
+		self.sent = []
+		self._reader, self._writer = socket.socketpair(
+				socket.AF_UNIX, socket.SOCK_DGRAM)
+		self._reader.setblocking(False)
+		for datagram in datagrams:
+			self.feed(datagram)
+
+	def feed(self, datagram):
+		"""Queue another datagram to be received"""
+		self._writer.send(datagram)
+
+	def fileno(self):
+		return self._reader.fileno()
+
+	def send(self, data):
+		self.sent.append(bytes(data))
+		return len(data)
+
+	def recv_into(self, buf):
+		try:
+			return self._reader.recv_into(buf)
+		except socket.error as ex:
+			if ex.errno != errno.EAGAIN:
+				raise
+			raise EnvironmentError(errno.EIO,
+					'No more recorded netlink responses')
+
+	def close(self):
+		self._reader.close()
+		self._writer.close()
+
+
+###
+## Message parsing
+###
+## Received datagrams are parsed in place with struct.unpack_from(); the
+## functions below take the shared receive buffer plus offsets rather than
+## slicing out copies of each message.
+###
+def iter_messages(buf, length):
+	"""Yield (msg_type, flags, seq, offset, end) for each message
+
+	The offset and end bound the message payload after the header.
+	"""
+	offset = 0
+	while offset + NLMSGHDR.size <= length:
+		msg_len, msg_type, flags, seq, _ = NLMSGHDR.unpack_from(buf,
+				offset)
+		if msg_len < NLMSGHDR.size or offset + msg_len > length:
+			break
+		yield (msg_type, flags, seq, offset + NLMSGHDR.size,
+				offset + msg_len)
+		offset += align(msg_len)
+
+def iter_attrs(buf, offset, end):
+	"""Yield (attr_type, offset, end) for each rtattr in a region"""
+	while offset + RTATTR.size <= end:
+		attr_len, attr_type = RTATTR.unpack_from(buf, offset)
+		if attr_len < RTATTR.size or offset + attr_len > end:
+			break
+		yield (attr_type, offset + RTATTR.size, offset + attr_len)
+		offset += align(attr_len)
+
+def _attr_string(buf, offset, end):
+	return bytes(buf[offset:end]).split('\0', 1)[0]
+
+def _attr_u32(buf, offset, _end):
+	return U32.unpack_from(buf, offset)[0]
+
+def _attr_u8(buf, offset, _end):
+	return buf[offset]
+
+
+###
+## RouteNetlink()  -  A request/response rtnetlink connection
+###
+class RouteNetlink(object):
+	"""A connection for making rtnetlink requests
+
+	Attributes:
+		transport: The underlying transport (EG: a NetlinkSocket)
+		seq: The sequence number of the most recent request
+		buf: The shared receive buffer
+	"""
+	def __init__(self, transport=None):
+		self.transport = transport if transport else NetlinkSocket()
+		self.seq = 0
+		self.buf = bytearray(RECV_BUFFER_SIZE)
+
+	def close(self):
+		self.transport.close()
+
+	def _pack(self, msg_type, flags, payload):
+		self.seq += 1
+		return NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type,
+				flags | NLM_F_REQUEST, self.seq, 0) + payload
+
+	def send(self, msg_type, flags, payload):
+		"""Send a single request and return its sequence number"""
+		self.transport.send(self._pack(msg_type, flags, payload))
+		return self.seq
+
+	def transact(self, requests):
+		"""Send a batch of requests and collect all of their ACKs
+
+		All of the requests are sent in a single datagram, and the
+		kernel processes each of them independently.  The replies
+		are then read back until every request is acknowledged.
+
+		Arguments:
+			requests: Sequence of (msg_type, flags, payload)
+		Returns:
+			A list of the errno for each request (0 on success),
+			in the same order as the requests.
+		"""
+		first_seq = self.seq + 1
+		datagram = ''.join(self._pack(msg_type, flags | NLM_F_ACK,
+				payload) for msg_type, flags, payload in requests)
+		results = [None] * len(requests)
+		if not requests:
+			return results
+
+		self.transport.send(datagram)
+		pending = len(requests)
+		while pending:
+			length = self.transport.recv_into(self.buf)
+			for rtype, _, rseq, offset, _ in iter_messages(
+					self.buf, length):
+				index = rseq - first_seq
+				if rtype != NLMSG_ERROR or not (
+						0 <= index < len(results)):
+					continue
+				if results[index] is None:
+					pending -= 1
+				results[index] = -NLMSGERR.unpack_from(
+						self.buf, offset)[0]
+		return results
+
+	def get_link_index(self, ifname):
+		"""Look up the ifindex of a single link by name
+
+		Raises:
+			NetlinkError: If the link does not exist
+		"""
+		seq = self.send(RTM_GETLINK, 0,
+				IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) +
+				pack_attr(IFLA_IFNAME, ifname + '\0'))
+		while True:
+			length = self.transport.recv_into(self.buf)
+			for rtype, _, rseq, offset, _ in iter_messages(
+					self.buf, length):
+				if rseq != seq:
+					continue
+				if rtype == NLMSG_ERROR:
+					error = -NLMSGERR.unpack_from(
+							self.buf, offset)[0]
+					raise NetlinkError(error,
+							os.strerror(error))
+				if rtype == RTM_NEWLINK:
+					return IFINFOMSG.unpack_from(self.buf,
+							offset)[2]
+
+	def dump(self, msg_type, payload):
+		"""Request a dump and yield each (msg_type, offset, end)
+
+		All messages refer to the shared receive buffer (self.buf),
+		so they must be fully parsed before the next one is read.
+
+		Raises:
+			NetlinkError: If the kernel returns an error
+		"""
+		seq = self.send(msg_type, NLM_F_DUMP, payload)
+		while True:
+			length = self.transport.recv_into(self.buf)
+			for rtype, _, rseq, offset, end in iter_messages(
+					self.buf, length):
+				if rseq != seq or rtype == NLMSG_NOOP:
+					continue
+				if rtype == NLMSG_DONE:
+					return
+				if rtype == NLMSG_ERROR:
+					error = -NLMSGERR.unpack_from(
+							self.buf, offset)[0]
+					raise NetlinkError(error,
+							os.strerror(error))
+				yield (rtype, offset, end)
+
+	def get_links(self):
+		"""Dump all links and return a dict of ifindex -> LinkState"""
+		links = collections.OrderedDict()
+		request = IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+		for msg_type, offset, end in self.dump(RTM_GETLINK, request):
+			if msg_type != RTM_NEWLINK:
+				continue
+			link = parse_link(self.buf, offset, end)
+			links[link.index] = link
+		return links
+
+	def get_addresses(self, links):
+		"""Dump all addresses and add them to the dict from get_links"""
+		request = IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+		for msg_type, offset, end in self.dump(RTM_GETADDR, request):
+			if msg_type != RTM_NEWADDR:
+				continue
+			index, address = parse_address(self.buf, offset, end)
+			if index in links and address is not None:
+				links[index].addresses.append(address)
+		return links
+
+	def snapshot(self):
+		"""Return a dict mapping from ifname to a complete LinkState"""
+		links = self.get_addresses(self.get_links())
+		for link in links.itervalues():
+			master = links.get(link.master)
+			link.master = master.name if master else None
+		return dict((link.name, link) for link in links.itervalues())
+
+
+def parse_link(buf, offset, end):
+	"""Parse an RTM_NEWLINK message payload into a LinkState
+
+	The "master" attribute is left as an ifindex (or None), since the
+	name may not be known until the rest of the dump has been read.
+	"""
+	_, _, index, flags, _ = IFINFOMSG.unpack_from(buf, offset)
+	link = sysfs.LinkState(None)
+	link.index = index
+	link.flags = flags
+	for attr, aoff, aend in iter_attrs(buf, offset + IFINFOMSG.size, end):
+		if attr == IFLA_IFNAME:
+			link.name = _attr_string(buf, aoff, aend)
+		elif attr == IFLA_MTU:
+			link.mtu = _attr_u32(buf, aoff, aend)
+		elif attr == IFLA_MASTER:
+			link.master = _attr_u32(buf, aoff, aend)
+		elif attr == IFLA_OPERSTATE:
+			state = _attr_u8(buf, aoff, aend)
+			link.operstate = (OPERSTATES[state]
+					if state < len(OPERSTATES) else None)
+		elif attr == IFLA_CARRIER:
+			link.carrier = bool(_attr_u8(buf, aoff, aend))
+		elif attr == IFLA_ADDRESS:
+			link.hwaddress = ':'.join('%02x' % octet
+					for octet in buf[aoff:aend])
+	return link
+
+def parse_address(buf, offset, end):
+	"""Parse an RTM_NEWADDR message payload
+
+	Returns:
+		A tuple of (ifindex, "ADDRESS/PREFIXLEN"), where the address
+		may be None if the message contained no usable address.
+	"""
+	family, prefixlen, _, _, index = IFADDRMSG.unpack_from(buf, offset)
+	local = address = None
+	for attr, aoff, aend in iter_attrs(buf, offset + IFADDRMSG.size, end):
+		if attr == IFA_LOCAL:
+			local = bytes(buf[aoff:aend])
+		elif attr == IFA_ADDRESS:
+			address = bytes(buf[aoff:aend])
+
+	## For point-to-point links IFA_ADDRESS is the peer address
+	address = local if local is not None else address
+	if address is None:
+		return (index, None)
+	return (index, '%s/%d' % (socket.inet_ntop(family, address), prefixlen))
+
+
+class FakeNetlinkPeer(RecordedNetlink):
+	"""Transport which acknowledges requests instead of the kernel
+
+	Every request is recorded (as with RecordedNetlink).  Requests with
+	NLM_F_ACK are acknowledged with the errno from 'errors' for their
+	message type (default 0), and single-link RTM_GETLINK lookups are
+	answered from the 'links' dict.
+
+	Attributes:
+		links: Dict mapping from an ifname to its ifindex
+		errors: Dict mapping from a message type to an errno
+	"""
+	def __init__(self, links=None, errors=None):
+		super(FakeNetlinkPeer, self).__init__()
+		self.links = dict(links or ())
+		self.errors = dict(errors or ())
+
+	def send(self, data):
+		super(FakeNetlinkPeer, self).send(data)
+		data = bytearray(data)
+		for msg_type, flags, seq, offset, end in iter_messages(data,
+				len(data)):
+			header = bytes(data[offset - NLMSGHDR.size:offset])
+			error = self.errors.get(msg_type, 0)
+			if msg_type == RTM_GETLINK and not flags & NLM_F_DUMP:
+				error = self._reply_link(data, offset, end, seq)
+				if not error and not flags & NLM_F_ACK:
+					continue
+			elif not flags & NLM_F_ACK:
+				continue
+			payload = NLMSGERR.pack(-error) + header
+			self.feed(NLMSGHDR.pack(NLMSGHDR.size + len(payload),
+					NLMSG_ERROR, 0, seq, 0) + payload)
+		return len(data)
+
+	def _reply_link(self, data, offset, end, seq):
+		for attr, aoff, aend in iter_attrs(data, offset +
+				IFINFOMSG.size, end):
+			if attr != IFLA_IFNAME:
+				continue
+			ifname = _attr_string(data, aoff, aend)
+			if ifname not in self.links:
+				return errno.ENODEV
+			payload = (IFINFOMSG.pack(socket.AF_UNSPEC, 0,
+					self.links[ifname], 0, 0) +
+					pack_attr(IFLA_IFNAME, ifname + '\0'))
+			self.feed(NLMSGHDR.pack(NLMSGHDR.size + len(payload),
+					RTM_NEWLINK, 0, seq, 0) + payload)
+			return 0
+		return errno.EINVAL
+
+
+def snapshot(transport=None):
+	"""Dump every link and address with a single rtnetlink connection"""
+	conn = RouteNetlink(transport)
+	try:
+		return conn.snapshot()
+	finally:
+		conn.close()
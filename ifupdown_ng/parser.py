@@ -19,6 +19,7 @@ with this program; otherwise you can obtain it here:
 ## Futureproofing boilerplate
 from __future__ import absolute_import
 
+import hashlib
 import logging
 
 from ifupdown_ng import logfilter
@@ -38,6 +39,10 @@ DEFAULT_FORMATTER = logging.Formatter(fmt=DEFAULT_FORMAT_STRING)
 DEFAULT_HANDLER = logging.StreamHandler()
 DEFAULT_HANDLER.setFormatter(DEFAULT_FORMATTER)
 
+## Additional handlers (EG: structured log sinks) for every FileParser object.
+## FileParser loggers do not propagate, so these must be attached directly.
+GLOBAL_HANDLERS = []
+
 
 class FilePosition(logging.LoggerAdapter):
 	"""LoggerAdapter for injecting file-position data during file parsing
@@ -87,6 +92,7 @@ class FileParser(object):
 		lines: Iterator yielding a sequence of lines
 		autoclose: Automatically call 'lines.close()' when exhausted?
 		_log_total: The LogCountFilter for this file's Logger
+		_digest: Running SHA-1 hash of all of the lines read so far
 		logger: The Logger object for the parsing of this file
 		pos: The FilePosition object tracking the current line
 	"""
@@ -122,7 +128,13 @@ class FileParser(object):
 		self = super(FileParser, cls).__new__(cls)
 		self.logger = self._new_logger()
 		self.logger.addHandler(handler)
+		for global_handler in GLOBAL_HANDLERS:
+			self.logger.addHandler(global_handler)
 		self.logger.propagate = False
+
+		## Parse errors and warnings are always counted, whatever the
+		## global log-level; the handlers decide what gets shown.
+		self.logger.setLevel(logging.WARNING)
 		# pylint: enable=W0212
 
 		## Set up variables first so __del__ can run even if an
@@ -131,6 +143,7 @@ class FileParser(object):
 		self.lines = lines
 		self.autoclose = autoclose
 		self.pos = FilePosition(self)
+		self._digest = hashlib.sha1()
 		return self
 
 	def __init__(self, *_unused_args, **_unused_kwargs):
@@ -161,9 +174,19 @@ class FileParser(object):
 
 	def _next_line(self):
 		result = next(self.lines)
+		self._digest.update(result)
 		self.pos.next_line()
 		return result
 
+	@property
+	def fingerprint(self):
+		"""SHA-1 hex digest of the lines read from this file so far
+
+		Once the file has been completely parsed this matches the
+		output of sha1sum(1) for any file with UNIX line endings.
+		"""
+		return self._digest.hexdigest()
+
 	def reset_error_counters(self):
 		self._log_total.clear_nr_logs()
 
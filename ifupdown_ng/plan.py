@@ -0,0 +1,169 @@
+"""
+ifupdown_ng.plan  -  Ahead-of-time compiled boot plans
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import math
+import os
+
+from ifupdown_ng import state
+
+## The header of every plan, which defines the helper functions it uses
+_PROLOGUE = '''\
+#!/bin/sh
+## Boot plan compiled by "ifup --compile-plan"; DO NOT EDIT.
+##
+## If any of the configuration files, the directories they were included
+## from, or the hook directories have changed since the plan was compiled,
+## or if any interface is already up, the regular ifup is run instead.
+
+fallback() {
+	exec %(fallback)s
+}
+
+check_file() {
+	[ "$(sha1sum < "$1" 2>/dev/null)" = "$2  -" ] || fallback
+}
+
+check_dir() {
+	[ "$(LC_ALL=C ls -a "$1" 2>/dev/null | tr '\\n' ' ')" = "$2" ] ||
+		fallback
+}
+
+wait_carrier() {
+	i=0
+	while [ "$(cat "/sys/class/net/$1/carrier" 2>/dev/null)" != 1 ]; do
+		if [ "$i" -ge "$2" ]; then
+			echo "No carrier on $1" >&2
+			return 0
+		fi
+		sleep 0.1
+		i=$((i + 1))
+	done
+}
+
+'''
+
+
+class PlanWriter(object):
+	"""Records the steps of an "ifup" run as a standalone shell script
+
+	An Executor with a PlanWriter records each command (together with
+	its complete environment) instead of running it.  The resulting
+	script needs neither Python nor the interfaces(5) parser, and only
+	checks that the config files still have the SHA-1 digests which
+	they had when the plan was compiled (and that no file has been
+	added to or removed from the directories they were found in).
+
+	Note that mapping scripts are run when the plan is compiled, so
+	their results are fixed in the plan.  Python hook plugins run
+	inside ifup, so they cannot be part of a plan at all.
+
+	Attributes:
+		fallback: The command (as a list) to run if the plan is stale
+		state_file: The state file which the plan writes
+		interfaces: List of (ifname, steps, InterfaceState)
+		hook_dirs: Set of the hook directories the plan depends on
+	"""
+	def __init__(self, fallback, state_file=None):
+		self.fallback = list(fallback)
+		self.state_file = (state_file if state_file is not None
+				else state.STATE_FILE)
+		self.interfaces = []
+		self.hook_dirs = set()
+		self._steps = None
+
+	def begin(self, ifname):
+		"""Start recording the steps for an interface"""
+		self._steps = []
+
+	def add_step(self, env, argv):
+		"""Record a command to be run with exactly 'env'"""
+		self._steps.append(['env', '-i'] + ['%s=%s' % item
+				for item in sorted(env.iteritems())] + list(argv))
+
+	def add_wait(self, ifname, timeout):
+		"""Record a wait of up to 'timeout' seconds for a carrier"""
+		self._steps.append(['wait_carrier', ifname,
+				str(int(math.ceil(timeout * 10)))])
+
+	def add_hook_dir(self, dirpath):
+		"""Record that the plan depends on the contents of a directory"""
+		self.hook_dirs.add(dirpath)
+
+	def end(self, ifstate):
+		"""Finish the steps for the interface with its InterfaceState"""
+		self.interfaces.append((ifstate.ifname, self._steps, ifstate))
+		self._steps = None
+
+	def write(self, path, file_fingerprints, config_dirs=()):
+		"""Write the plan as an executable shell script
+
+		Arguments:
+			path: The file to write
+			file_fingerprints: List of (filename, SHA-1 digest)
+				for each loaded config file
+			config_dirs: The directories scanned by "source" and
+				"source-directory", whose contents decide
+				which config files were loaded
+		Raises:
+			EnvironmentError: If the file cannot be written
+		"""
+		## The pipes module is only needed when compiling a plan
+		import pipes
+		quote = pipes.quote
+		join = lambda argv: ' '.join(quote(arg) for arg in argv)
+
+		lines = [_PROLOGUE % dict(fallback=join(self.fallback))]
+		for filename, digest in file_fingerprints:
+			lines.append('check_file %s %s\n' % (quote(filename),
+					digest))
+		for dirpath in sorted(self.hook_dirs.union(config_dirs)):
+			## A missing directory is listed as empty
+			try:
+				names = sorted(os.listdir(dirpath) + ['.', '..'])
+			except OSError:
+				names = []
+			lines.append('check_dir %s %s\n' % (quote(dirpath),
+					quote(''.join(name + ' ' for name in names))))
+
+		state_dir = os.path.dirname(self.state_file)
+		lines.append('[ -s %s ] && fallback\n\n' %
+				quote(self.state_file))
+		lines.append('mkdir -p %s\n' % quote(state_dir))
+		lines.append('state=%s.$$.tmp\n' % quote(self.state_file))
+		lines.append(': > "$state"\nstatus=0\n')
+
+		for i, (ifname, steps, ifstate) in enumerate(self.interfaces):
+			lines.append('\niface_%d() {\n' % i)
+			for argv in steps:
+				lines.append('\t%s || return 1\n' % join(argv))
+			lines.append('\t:\n}\nif iface_%d; then\n' % i)
+			for line in ifstate.lines():
+				lines.append('\tprintf %%s %s >> "$state"\n' %
+						quote(line))
+			lines.append('else\n\techo %s >&2\n\tstatus=1\nfi\n' %
+					quote('Failed to ifup %s' % ifname))
+
+		lines.append('\nmv "$state" %s\nexit $status\n' %
+				quote(self.state_file))
+
+		with open(path, 'w') as pfile:
+			pfile.writelines(lines)
+		os.chmod(path, 0o755)
@@ -0,0 +1,189 @@
+"""
+ifupdown_ng.plugins  -  In-process Python hook plugins
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import imp
+import logging
+import os
+import re
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+## Installed packages may provide hooks through this entry point group,
+## where each entry point's name is used to order it among the others
+ENTRY_POINT_GROUP = 'ifupdown_ng.hooks'
+
+## Whether to look for hooks in ENTRY_POINT_GROUP at all (set by the
+## "--entry-point-hooks" option).  Finding them means importing
+## pkg_resources, which scans every installed package and takes longer
+## than the rest of a typical ifup.
+ENTRY_POINTS = False
+
+## Plugin files live in the if-*.d directories next to the external hooks,
+## which run-parts(8) (and execute.list_hooks) ignore because of the dot
+VALID_PLUGIN_NAME_RE = re.compile(r'^([A-Za-z0-9_-]+)\.py$')
+
+
+class HookContext(object):
+	"""The data passed to an in-process hook
+
+	Attributes:
+		ifname: The physical interface name
+		phase: The phase being run (EG: "pre-up")
+		mode: Either "start" or "stop"
+		config: The InterfaceConfig being applied
+		env: Dict of the variables an external hook would get from
+			script.ConfigContext (EG: IFACE, IF_ADDRESS, PHASE)
+		logger: A logger which tags messages with the interface
+		deadline: The time.time() by which the hook must return, or
+			None for no limit.  A hook cannot be interrupted, but
+			one which returns after its deadline fails.
+	"""
+	def __init__(self, ifname, phase, mode, config, env, logger,
+			deadline=None):
+		self.ifname = ifname
+		self.phase = phase
+		self.mode = mode
+		self.config = config
+		self.env = env
+		self.logger = logger
+		self.deadline = deadline
+
+	def remaining(self):
+		"""Return the seconds left before the deadline, or None"""
+		if self.deadline is None:
+			return None
+		return max(0.0, self.deadline - time.time())
+
+
+class PluginHook(object):
+	"""A single in-process hook function for one phase
+
+	Each plugin provides one function per phase that it handles, named
+	after the phase with "-" replaced by "_" (EG: "pre_up").  The
+	function is called with a HookContext and fails the phase if it
+	returns False or raises an exception.
+
+	Attributes:
+		name: The name by which the hook is ordered
+		description: A description for logs (EG: the plugin path)
+		func: The hook function
+	"""
+	__slots__ = ('name', 'description', 'func')
+
+	def __init__(self, name, description, func):
+		self.name = name
+		self.description = description
+		self.func = func
+
+	def __call__(self, context):
+		return self.func(context) is not False
+
+
+def phase_function_name(phase):
+	"""Return the name of the plugin function for a phase"""
+	return phase.replace('-', '_')
+
+
+## Loaded plugin modules indexed by path, so that each file is only run
+## once even if several threads list the hooks at the same time
+_MODULES = dict()
+_MODULES_LOCK = threading.Lock()
+
+def _load_module(path):
+	## The source is compiled by hand so that no .pyc files are written
+	## into the hook directories
+	with _MODULES_LOCK:
+		if path in _MODULES:
+			return _MODULES[path]
+		module = imp.new_module('ifupdown_ng.plugins.%s' % re.sub(
+				r'\W', '_', path))
+		module.__file__ = path
+		try:
+			with open(path) as pfile:
+				code = compile(pfile.read(), path, 'exec')
+			exec code in module.__dict__ # pylint: disable=W0122
+		except Exception: # pylint: disable=W0703
+			LOGGER.exception('Unable to load hook plugin: %s', path)
+			module = None
+		_MODULES[path] = module
+		return module
+
+def directory_plugins(dirpath, phase):
+	"""Return the PluginHooks for a phase from *.py files in a directory"""
+	try:
+		names = sorted(os.listdir(dirpath))
+	except OSError:
+		return []
+
+	hooks = []
+	for filename in names:
+		match = VALID_PLUGIN_NAME_RE.match(filename)
+		path = os.path.join(dirpath, filename)
+		if not match or not os.path.isfile(path):
+			continue
+		module = _load_module(path)
+		func = getattr(module, phase_function_name(phase), None)
+		if func is not None:
+			hooks.append(PluginHook(match.group(1), path, func))
+	return hooks
+
+
+_ENTRY_POINTS = None
+
+def entry_point_plugins(phase):
+	"""Return the PluginHooks for a phase from installed entry points
+
+	Nothing is returned unless ENTRY_POINTS is set, or if pkg_resources
+	(setuptools) is unavailable.
+	"""
+	global _ENTRY_POINTS # pylint: disable=W0603
+	if not ENTRY_POINTS:
+		return []
+	with _MODULES_LOCK:
+		if _ENTRY_POINTS is None:
+			_ENTRY_POINTS = []
+			## pkg_resources is slow to import, so only load it here
+			try:
+				import pkg_resources
+			except ImportError:
+				pkg_resources = None
+			if pkg_resources is not None:
+				for entry in pkg_resources.iter_entry_points(
+						ENTRY_POINT_GROUP):
+					try:
+						_ENTRY_POINTS.append((entry.name,
+							str(entry), entry.load()))
+					except Exception: # pylint: disable=W0703
+						LOGGER.exception('Unable to load '
+							'hook plugin: %s', entry)
+
+	hooks = []
+	for name, description, plugin in _ENTRY_POINTS:
+		func = getattr(plugin, phase_function_name(phase), None)
+		if func is not None:
+			hooks.append(PluginHook(name, description, func))
+	return hooks
+
+def list_plugins(dirpath, phase):
+	"""Return every PluginHook for a phase"""
+	return directory_plugins(dirpath, phase) + entry_point_plugins(phase)
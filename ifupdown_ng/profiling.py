@@ -0,0 +1,96 @@
+"""
+ifupdown_ng.profiling  -  Built-in profiling of command execution
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import sys
+
+## The profiler began by start_startup(), if any.  The profiling modules
+## are only imported once profiling is actually requested.
+_STARTUP_PROFILER = None
+
+FORMATS = ('text', 'pstats')
+SORT_KEYS = ('calls', 'cumulative', 'file', 'name', 'nfl', 'time')
+
+
+def start_startup():
+	"""Begin profiling module imports and startup
+
+	This must be called by the top-level script before it imports any
+	of the command modules, or there will be nothing to measure.
+	"""
+	global _STARTUP_PROFILER # pylint: disable=W0603
+	_STARTUP_PROFILER = new_profiler()
+	_STARTUP_PROFILER.enable()
+
+def stop_startup():
+	"""Finish profiling startup and return the profiler (or None)"""
+	global _STARTUP_PROFILER # pylint: disable=W0603
+	profiler, _STARTUP_PROFILER = _STARTUP_PROFILER, None
+	if profiler is not None:
+		profiler.disable()
+	return profiler
+
+def new_profiler():
+	"""Create a new (not yet enabled) profiler object"""
+	import cProfile
+	return cProfile.Profile()
+
+def write_stats(path, sections, fmt='text', sort='cumulative'):
+	"""Save the results of one or more profilers
+
+	In "text" format each section is printed under its own heading,
+	sorted by the specified key.  In "pstats" format the last (main)
+	section is dumped to 'path' and each earlier one to 'path.NAME' so
+	that they may be loaded separately with the pstats module.
+
+	A path of "-" writes text-format output to stderr; there is no
+	way to write "pstats" format there.
+
+	Arguments:
+		path: The output file
+		sections: Sequence of (name, profiler) tuples; any which
+			have a profiler of None are skipped.
+		fmt: One of FORMATS
+		sort: One of SORT_KEYS
+
+	Raises:
+		IOError: If an output file cannot be written
+		ValueError: If "pstats" output is requested for "-"
+	"""
+	sections = [(name, prof) for name, prof in sections if prof]
+	if fmt == 'pstats':
+		if path == '-':
+			raise ValueError('pstats output needs a file name')
+		for name, profiler in sections[:-1]:
+			profiler.dump_stats('%s.%s' % (path, name))
+		if sections:
+			sections[-1][1].dump_stats(path)
+		return
+
+	import pstats
+	ofile = sys.stderr if path == '-' else open(path, 'w')
+	try:
+		for name, profiler in sections:
+			ofile.write('==== %s ====\n' % name)
+			stats = pstats.Stats(profiler, stream=ofile)
+			stats.sort_stats(sort).print_stats()
+	finally:
+		if ofile is not sys.stderr:
+			ofile.close()
@@ -0,0 +1,334 @@
+"""
+ifupdown_ng.replay  -  Record and replay the commands run by ifup/ifdown
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import collections
+import errno
+import fcntl
+import os
+import threading
+import time
+
+from ifupdown_ng import simulate
+from ifupdown_ng import spawn
+
+## Incremented whenever the meaning of a trace file changes
+TRACE_VERSION = 1
+
+
+## The json and gzip modules are only needed when a trace is used, so they
+## are imported by the functions below rather than at startup.
+def _open_trace(path, mode):
+	## Traces whose names end in ".gz" are compressed
+	if path.endswith('.gz'):
+		import gzip
+		return gzip.open(path, mode)
+	return open(path, mode)
+
+def _exec_key(argv, env):
+	## Commands are matched by their arguments and interface, since
+	## interfaces may be processed in a different order on replay.
+	return (tuple(argv), env.get('IFACE'), env.get('PHASE'))
+
+
+class RecordedProcess(object):
+	"""A running command whose result is added to a Recorder's trace
+
+	This provides the same parts of the subprocess.Popen interface as
+	spawn.Process, and records the command once it has exited.
+
+	Attributes:
+		pid: The process ID of the command
+		output: The captured standard output, once it has exited
+	"""
+	def __init__(self, recorder, proc, event, data):
+		self.pid = proc.pid
+		self.output = None
+		self._recorder = recorder
+		self._proc = proc
+		self._event = event
+		self._data = data
+		self._start = time.time()
+
+	@property
+	def returncode(self):
+		return self.poll()
+
+	def _exited(self, status):
+		if status is not None and self._event is not None:
+			event, self._event = self._event, None
+			event['time'] = round(time.time() - self._start, 6)
+			event['status'] = status
+			if self.output is not None:
+				event['output'] = self.output
+			self._recorder.add(event)
+		return status
+
+	def poll(self):
+		return self._exited(self._proc.poll())
+
+	def wait(self, timeout=None):
+		if timeout is not None:
+			return self._exited(spawn.wait_process(self._proc,
+					timeout))
+		return self._exited(self._proc.wait())
+
+	def communicate(self):
+		## Only a subprocess.Popen still needs the standard input;
+		## anything else (EG: a spawn.Process) was given it by spawn()
+		import subprocess
+		if isinstance(self._proc, subprocess.Popen):
+			self.output = self._proc.communicate(self._data)[0]
+		else:
+			self.output = self._proc.communicate()[0]
+		self._exited(self._proc.returncode)
+		return (self.output, None)
+
+
+class RecordingLinkWaiter(object):
+	"""Adds the result of each link-wait to a Recorder's trace"""
+	def __init__(self, recorder):
+		self._recorder = recorder
+		self._waiter = None
+		self._lock = threading.Lock()
+
+	def wait(self, ifname, timeout):
+		## The real waiter is only opened once it is needed
+		from ifupdown_ng import linkwait
+		with self._lock:
+			if self._waiter is None:
+				self._waiter = linkwait.LinkWaiter()
+		start = time.time()
+		carrier = self._waiter.wait(ifname, timeout)
+		self._recorder.add(dict(event='wait', iface=ifname,
+				start=self._recorder.offset(start),
+				time=round(time.time() - start, 6),
+				carrier=carrier))
+		return carrier
+
+
+class Recorder(object):
+	"""Runs commands for script.Environment and records each of them
+
+	A Recorder is installed as spawn.SERVER, and passes the commands on
+	to whatever was there before (EG: the fork-server), or runs them
+	with subprocess.  Every command, hook and mapping script is written
+	to the trace as one JSON object per line, with its environment,
+	start time, duration, exit status, and any input and output.
+	Python hook plugins never start a command, so they cannot be
+	recorded (or replayed) at all.
+
+	Attributes:
+		path: The trace file being written
+		link_waiter: A RecordingLinkWaiter for execute.Executor
+	"""
+	def __init__(self, path, command):
+		self.path = path
+		self.link_waiter = RecordingLinkWaiter(self)
+		self._file = _open_trace(path, 'wb')
+		flags = fcntl.fcntl(self._file.fileno(), fcntl.F_GETFD)
+		fcntl.fcntl(self._file.fileno(), fcntl.F_SETFD,
+				flags | fcntl.FD_CLOEXEC)
+		self._lock = threading.Lock()
+		self._start = time.time()
+		self._spawner = None
+		self.add(dict(event='start', version=TRACE_VERSION,
+				command=command))
+
+	def offset(self, when):
+		"""Return the seconds from the start of the trace to 'when'"""
+		return round(when - self._start, 6)
+
+	def add(self, event):
+		"""Append a single event to the trace"""
+		import json
+		line = json.dumps(event, sort_keys=True, separators=(',', ':'))
+		with self._lock:
+			self._file.write(line + '\n')
+
+	def add_targets(self, ifnames, deleted_links=()):
+		"""Record which interfaces were selected to be processed
+
+		Arguments:
+			ifnames: The selected interfaces, in order
+			deleted_links: Those which no longer existed
+		"""
+		self.add(dict(event='targets', ifaces=list(ifnames),
+				deleted=sorted(deleted_links)))
+
+	def install(self):
+		"""Make this the object which starts all commands"""
+		self._spawner = spawn.SERVER
+		spawn.SERVER = self
+		return self
+
+	def close(self):
+		"""Restore the previous spawn.SERVER and finish the trace"""
+		spawn.SERVER, self._spawner = self._spawner, None
+		with self._lock:
+			self._file.close()
+
+	def spawn(self, argv, env, cwd=None, new_group=False, capture=False,
+			data=None):
+		"""Start and record a command, like SpawnClient.spawn
+
+		Raises:
+			OSError: If the command could not be started
+		"""
+		import subprocess
+		event = dict(event='exec', argv=list(argv), env=dict(env),
+				cwd=cwd, start=self.offset(time.time()))
+		if data is not None:
+			event['input'] = data
+		try:
+			if self._spawner is not None:
+				proc = self._spawner.spawn(argv, env, cwd=cwd,
+						new_group=new_group,
+						capture=capture, data=data)
+			else:
+				pipe = subprocess.PIPE
+				if new_group:
+					argv = [spawn.SETSID] + list(argv)
+				proc = subprocess.Popen(argv, env=env, cwd=cwd,
+					stdin=pipe if data is not None else None,
+					stdout=pipe if capture else None)
+		except OSError as ex:
+			event['errno'] = ex.errno
+			self.add(event)
+			raise
+		return RecordedProcess(self, proc, event, data)
+
+
+class ReplayLinkWaiter(object):
+	"""Answers each link-wait from a Replayer's trace"""
+	def __init__(self, replayer):
+		self._replayer = replayer
+
+	def wait(self, ifname, timeout):
+		event = self._replayer.next_event(('wait', ifname))
+		if event is None:
+			time.sleep(timeout)
+			return False
+		time.sleep(event['time'])
+		return event['carrier']
+
+
+class Replayer(object):
+	"""Answers commands for script.Environment from a recorded trace
+
+	A Replayer is installed as spawn.SERVER in place of running any
+	commands.  Each command is matched against the recorded commands
+	with the same arguments, interface and phase (in the order they
+	were recorded), and takes as long to "run" as it did originally,
+	with the same exit status and output.
+
+	Attributes:
+		command: The command ("ifup" or "ifdown") which was recorded
+		targets: The interfaces which were processed, or None if the
+			recording did not select any
+		deleted_links: Set of the targets which no longer existed
+		link_waiter: A ReplayLinkWaiter for execute.Executor
+		unmatched: The number of commands not found in the trace
+
+	Raises:
+		IOError: If the trace cannot be read
+		ValueError: If the trace is not valid
+	"""
+	def __init__(self, path):
+		import json
+		self.command = None
+		self.targets = None
+		self.deleted_links = set()
+		self.link_waiter = ReplayLinkWaiter(self)
+		self.unmatched = 0
+		self._events = collections.defaultdict(collections.deque)
+		self._lock = threading.Lock()
+		self._next_pid = simulate.FIRST_PID
+		self._spawner = None
+
+		with _open_trace(path, 'rb') as tfile:
+			for line in tfile:
+				event = json.loads(line)
+				self._load_event(event)
+		if self.command is None:
+			raise ValueError('Not a trace file: %s' % path)
+
+	def _load_event(self, event):
+		kind = event.get('event')
+		if kind == 'start':
+			if event.get('version') != TRACE_VERSION:
+				raise ValueError('Unsupported trace version: '
+						'%s' % event.get('version'))
+			self.command = event['command']
+		elif kind == 'targets':
+			self.targets = event['ifaces']
+			self.deleted_links = set(event.get('deleted', ()))
+		elif kind == 'wait':
+			self._events[('wait', event['iface'])].append(event)
+		elif kind == 'exec':
+			key = _exec_key(event['argv'], event['env'])
+			self._events[key].append(event)
+
+	def next_event(self, key):
+		"""Remove and return the next recorded event for 'key'"""
+		with self._lock:
+			events = self._events.get(key)
+			if not events:
+				return None
+			return events.popleft()
+
+	def install(self):
+		"""Make this the object which starts all commands"""
+		self._spawner = spawn.SERVER
+		spawn.SERVER = self
+		return self
+
+	def close(self):
+		"""Restore the previous spawn.SERVER"""
+		spawn.SERVER, self._spawner = self._spawner, None
+
+	def spawn(self, argv, env, cwd=None, new_group=False, capture=False,
+			data=None):
+		"""Replay a command, with the interface of SpawnClient.spawn
+
+		Raises:
+			OSError: If the command is not in the trace, or could
+				not be started when it was recorded
+		"""
+		## The remaining arguments do not affect the replayed result
+		del cwd, new_group, data
+
+		event = self.next_event(_exec_key(argv, env))
+		if event is None:
+			with self._lock:
+				self.unmatched += 1
+			raise OSError(errno.ENOENT,
+					'Not in the replayed trace')
+		if 'errno' in event:
+			raise OSError(event['errno'],
+					os.strerror(event['errno']))
+		with self._lock:
+			self._next_pid += 1
+			pid = self._next_pid
+		output = None
+		if capture:
+			output = event.get('output', u'').encode('utf-8')
+		return simulate.SimulatedProcess(pid, event['time'],
+				event['status'], output)
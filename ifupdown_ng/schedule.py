@@ -0,0 +1,222 @@
+"""
+ifupdown_ng.schedule  -  Priority-aware scheduling of interface tasks
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import logging
+import os
+import socket
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+## Interfaces in this allow-group, or with this option set to its name,
+## are brought up before all of the others
+CRITICAL_GROUP = 'critical'
+PRIORITY_OPTION = 'priority'
+
+
+def notify_ready(status=None):
+	"""Tell the service manager (EG: systemd) that startup is complete
+
+	This sends "READY=1" to $NOTIFY_SOCKET, as with sd_notify(3).
+
+	Returns:
+		True if the notification was sent, otherwise False
+	"""
+	path = os.environ.get('NOTIFY_SOCKET')
+	if not path:
+		return False
+	if path.startswith('@'):
+		path = '\0' + path[1:]
+
+	message = 'READY=1\n'
+	if status is not None:
+		message += 'STATUS=%s\n' % status
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+	try:
+		sock.sendto(message, path)
+	except socket.error as ex:
+		LOGGER.warning('%s: %s', ex.strerror, path)
+		return False
+	finally:
+		sock.close()
+	return True
+
+
+class Scheduler(object):
+	"""Runs one task per interface in dependency and priority order
+
+	A task only starts once all of its dependencies have succeeded, and
+	is skipped (counting as a failure) if any of them failed.  No other
+	task starts until every critical task has finished, at which point
+	'on_ready' is called; the remaining tasks then continue.  If there
+	are no critical tasks then 'on_ready' is called once everything is
+	done.  Since 'on_ready' may block (EG: on a socket), it is called
+	without holding the scheduler's lock.
+
+	Attributes:
+		func: Called with each key to run its task, returning True if
+			the task succeeded
+		jobs: The maximum number of tasks to run at once
+		on_ready: Called (with no arguments) once the critical tasks
+			have finished, or None
+	"""
+	def __init__(self, func, jobs=1, on_ready=None):
+		self.func = func
+		self.jobs = max(1, jobs)
+		self.on_ready = on_ready
+		self._cond = threading.Condition()
+		self._pending = []
+		self._deps = dict()
+		self._critical = set()
+		self._results = dict()
+		self._running = 0
+		self._ready = False
+		self._ready_due = False
+		self._gated = False
+
+	def run(self, keys, deps, critical=()):
+		"""Run the task for every key
+
+		Arguments:
+			keys: The unique task keys, in the order to prefer
+			deps: Dict mapping from a key to the set of keys which
+				it depends on
+			critical: The keys of the critical tasks, which must
+				include all of their own dependencies
+		Returns:
+			A dict mapping from each key to True if its task
+			succeeded, otherwise False
+		"""
+		self._pending = list(keys)
+		self._deps = deps
+		self._critical = set(critical) & set(keys)
+		self._results = dict()
+		self._running = 0
+		self._ready = False
+		self._ready_due = False
+		self._gated = bool(self._critical)
+
+		if self.jobs == 1:
+			self._worker()
+		else:
+			workers = [threading.Thread(target=self._worker)
+					for _ in xrange(min(self.jobs,
+						len(self._pending)))]
+			for worker in workers:
+				worker.daemon = True
+				worker.start()
+			for worker in workers:
+				worker.join()
+
+		if not self._ready:
+			self._ready = True
+			self._signal_ready()
+		return self._results
+
+	def _signal_ready(self):
+		## Called without the lock held; the other tasks may only
+		## start once on_ready has returned
+		if self.on_ready is not None:
+			self.on_ready()
+		with self._cond:
+			self._gated = False
+			self._cond.notify_all()
+
+	def _take_ready(self):
+		## Called with the lock held; returns True (only once) when the
+		## caller should call _signal_ready after releasing the lock
+		if not self._ready_due or self._ready:
+			return False
+		self._ready = True
+		return True
+
+	def _finish(self, key, result):
+		## Called with the lock held
+		self._results[key] = result
+		if key in self._critical:
+			self._critical.discard(key)
+			if not self._critical:
+				self._ready_due = True
+		self._cond.notify_all()
+
+	def _next_task(self):
+		## Called with the lock held; returns the next runnable key,
+		## or None if nothing may start until a running task is done
+		for key in list(self._pending):
+			if self._gated and key not in self._critical:
+				continue
+			deps = self._deps.get(key, ())
+			failed = [dep for dep in deps
+					if self._results.get(dep) is False]
+			if failed:
+				LOGGER.error('Skipping %s: %s failed', key,
+						' '.join(sorted(failed)))
+				self._pending.remove(key)
+				self._finish(key, False)
+			elif all(dep in self._results for dep in deps):
+				self._pending.remove(key)
+				return key
+
+		## If nothing is running then the remaining tasks are waiting
+		## on each other, so break the cycle in the preferred order
+		if not self._running:
+			for key in self._pending:
+				if not self._gated or key in self._critical:
+					self._pending.remove(key)
+					return key
+		return None
+
+	def _wait_for_task(self):
+		## Called with the lock held; returns the next key to run, or
+		## None once nothing is left or on_ready must be called first
+		while self._pending:
+			key = self._next_task()
+			if key is not None:
+				self._running += 1
+				return key
+			if self._ready_due and not self._ready:
+				return None
+			if self._pending:
+				self._cond.wait()
+		return None
+
+	def _worker(self):
+		while True:
+			with self._cond:
+				key = self._wait_for_task()
+				ready = self._take_ready()
+			if ready:
+				self._signal_ready()
+			if key is None:
+				if ready:
+					continue
+				return
+
+			result = False
+			try:
+				result = bool(self.func(key))
+			finally:
+				with self._cond:
+					self._running -= 1
+					self._finish(key, result)
+					ready = self._take_ready()
+				if ready:
+					self._signal_ready()
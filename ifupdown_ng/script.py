@@ -19,12 +19,14 @@ with this program; otherwise you can obtain it here:
 ## Futureproofing boilerplate
 from __future__ import absolute_import
 
-import functools
+import errno
 import os
-import pwd
 import re
-import subprocess
+import signal
+import time
 
+from ifupdown_ng import spawn
+from ifupdown_ng import trace
 from ifupdown_ng.autogen.config import DEFAULT_PATH
 from ifupdown_ng.commands import ARGS
 
@@ -58,8 +60,42 @@ _TERM_VARS = frozenset((
 	'TERMCAP',
 ))
 
+## Seconds between SIGTERM and SIGKILL when a command times out
+KILL_GRACE = 2.0
+
+
+class TimeoutExpired(EnvironmentError):
+	"""A command was killed for running longer than its timeout"""
+	def __init__(self, cmd, timeout):
+		super(TimeoutExpired, self).__init__(errno.ETIMEDOUT,
+				'Timed out after %.3g seconds' % timeout)
+		self.cmd = cmd
+		self.timeout = timeout
+
+
+def _wait_until(proc, deadline):
+	## Block until the command exits, or return None at the deadline
+	return spawn.wait_process(proc, max(0.0, deadline - time.time()))
+
+def _kill_group(proc):
+	## Ask the whole process group to exit, then make sure of it.  The
+	## group is killed even if the leader exits so that none of its
+	## children are left behind.
+	signum = signal.SIGTERM
+	try:
+		os.killpg(proc.pid, signal.SIGTERM)
+		if _wait_until(proc, time.time() + KILL_GRACE) is None:
+			signum = signal.SIGKILL
+		os.killpg(proc.pid, signal.SIGKILL)
+	except OSError as ex:
+		if ex.errno != errno.ESRCH:
+			raise
+	proc.wait()
+	return signum
+
 def _getpwuid_safe():
 	"""Try to compute user information without throwing any exceptions."""
+	import pwd
 	uid = os.getuid()
 	try:
 		return pwd.getpwuid(uid)
@@ -123,9 +159,10 @@ class Environment(object):
 	@property
 	def term_env(self):
 		result = {}
-		for key, value in self._env:
+		for key, value in self._env.iteritems():
 			if key in _TERM_VARS:
 				result[key] = value
+		return result
 
 	@term_env.setter
 	def term_env(self, env):
@@ -133,7 +170,7 @@ class Environment(object):
 			env = os.environ
 
 		## First clear out any existing terminal/locale variables
-		for old_key in self._env:
+		for old_key in self._env.keys():
 			if old_key in _TERM_VARS:
 				del self._env[old_key]
 
@@ -143,7 +180,7 @@ class Environment(object):
 				self._env[key] = value
 
 		## Finally, apply the overrides
-		for key, value in _TERM_OVERRIDE:
+		for key, value in _TERM_OVERRIDE.iteritems():
 			if value is not None:
 				self._env[key] = value
 
@@ -171,19 +208,102 @@ class Environment(object):
 				if key not in self._env:
 					yield (key, value)
 
-	def _wrap_subprocess_func(func):
-		"""Wrap various methods in 'subprocess' for convenience."""
-		@functools.wraps(func)
-		def method(self, *args, **kwargs):
-			kwargs['cwd'] = self._cwd
-			kwargs['env'] = self
-			func(*args, **kwargs)
-		return method
-	call         = _wrap_subprocess_func(subprocess.call)
-	check_call   = _wrap_subprocess_func(subprocess.check_call)
-	check_output = _wrap_subprocess_func(subprocess.check_output)
-	Popen        = _wrap_subprocess_func(subprocess.Popen)
-	del _wrap_subprocess_func
+	def _trace_span(self, args):
+		## Label each command with the interface and phase it ran for
+		argv0 = args if isinstance(args, basestring) else args[0]
+		span_args = dict(argv=args)
+		if self.context:
+			for key in ('IFACE', 'PHASE'):
+				if key in self.context:
+					span_args[key.lower()] = self.context[key]
+		return trace.span(os.path.basename(argv0), 'exec', **span_args)
+
+	## The subprocess module is fairly expensive to load, so it is only
+	## imported by the methods below which actually need it.
+	def Popen(self, args, new_group=False,
+			**kwargs): # pylint: disable=C0103
+		import subprocess
+		kwargs['cwd'] = self._cwd
+		kwargs['env'] = dict(self.iteritems())
+		if spawn.SERVER is not None and self._can_spawn(args, kwargs):
+			return spawn.SERVER.spawn(args, kwargs['env'],
+				cwd=kwargs['cwd'], new_group=new_group,
+				capture=kwargs.get('stdout') is not None)
+		if new_group:
+			args = [spawn.SETSID] + list(args)
+		return subprocess.Popen(args, **kwargs)
+
+	@staticmethod
+	def _can_spawn(args, kwargs):
+		## The spawn server only supports what Environment itself uses:
+		## an argv list and capturing stdout.
+		import subprocess
+		if isinstance(args, basestring):
+			return False
+		for key, value in kwargs.iteritems():
+			if key in ('cwd', 'env'):
+				continue
+			if key == 'stdout' and value is subprocess.PIPE:
+				continue
+			return False
+		return True
+
+	def call(self, args, timeout=None, **kwargs):
+		## With a timeout the command runs in its own process group,
+		## which is killed if the command takes too long.
+		if timeout is None:
+			with self._trace_span(args) as span:
+				proc = self.Popen(args, **kwargs)
+				span.set(pid=proc.pid)
+				status = proc.wait()
+				span.set(status=status)
+			return status
+
+		with self._trace_span(args) as span:
+			proc = self.Popen(args, new_group=True, **kwargs)
+			span.set(pid=proc.pid, timeout=timeout)
+			status = _wait_until(proc, time.time() + timeout)
+			if status is None:
+				span.set(killed=_kill_group(proc))
+				raise TimeoutExpired(args, timeout)
+			span.set(status=status)
+		return status
+
+	def check_call(self, args, **kwargs):
+		import subprocess
+		status = self.call(args, **kwargs)
+		if status:
+			raise subprocess.CalledProcessError(status, args)
+		return 0
+
+	def communicate(self, args, data=None):
+		## Run a command with 'data' (if any) on its standard input,
+		## returning its exit status and standard output.
+		import subprocess
+		with self._trace_span(args) as span:
+			if spawn.SERVER is not None:
+				proc = spawn.SERVER.spawn(args,
+						dict(self.iteritems()),
+						cwd=self._cwd, capture=True,
+						data=data)
+				span.set(pid=proc.pid)
+				output = proc.communicate()[0]
+			else:
+				proc = self.Popen(args, stdout=subprocess.PIPE,
+					stdin=None if data is None
+						else subprocess.PIPE)
+				span.set(pid=proc.pid)
+				output = proc.communicate(data)[0]
+			span.set(status=proc.returncode)
+		return proc.returncode, output
+
+	def check_output(self, args, data=None):
+		import subprocess
+		status, output = self.communicate(args, data)
+		if status:
+			raise subprocess.CalledProcessError(status, args,
+					output=output)
+		return output
 
 
 class Context(object):
@@ -268,25 +388,32 @@ class ConfigContext(Context):
 			option = self.env_to_option(env)
 		except KeyError:
 			return False
-		return option in self._config.options
+		return isinstance(self._config.options.get(option), basestring)
 
 	def __getitem__(self, env):
 		try:
 			return super(ConfigContext, self).__getitem__(env)
 		except KeyError:
 			option = self.env_to_option(env)
-			return self._config.options[option]
+			value = self._config.options[option]
+			if not isinstance(value, basestring):
+				raise KeyError(env)
+			return value
 
 	def __iter__(self):
 		for env in super(ConfigContext, self).__iter__():
 			yield env
 
-		for option in self._config.options:
-			yield self.option_to_env(option)
+		## Multivalue options (the commands for each phase) are not
+		## exported into the environment.
+		for option, value in self._config.options.iteritems():
+			if isinstance(value, basestring):
+				yield self.option_to_env(option)
 
 	def iteritems(self):
 		for env, value in super(ConfigContext, self).iteritems():
 			yield (env, value)
 
 		for option, value in self._config.options.iteritems():
-			yield (self.option_to_env(option), value)
+			if isinstance(value, basestring):
+				yield (self.option_to_env(option), value)
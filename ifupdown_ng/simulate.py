@@ -0,0 +1,249 @@
+"""
+ifupdown_ng.simulate  -  A simulated system for running ifup/ifdown at scale
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import socket
+import threading
+import time
+
+from ifupdown_ng import netlink
+from ifupdown_ng import spawn
+from ifupdown_ng import sysfs
+
+## Fake process IDs start above the largest possible kernel PID, so that
+## signals sent to them (see script._kill_group) fail with ESRCH.
+FIRST_PID = 1 << 23
+
+
+class SimulatedProcess(object):
+	"""A command "run" by a SimulatedSystem
+
+	The command has already had its effect when it is started, but it
+	does not exit until its latency has passed.  This provides the same
+	parts of the subprocess.Popen interface as spawn.Process.
+
+	Attributes:
+		pid: The fake process ID of the command
+		returncode: The exit status, or None while still "running"
+		output: The standard output, if it was captured
+	"""
+	def __init__(self, pid, latency, status, output):
+		self.pid = pid
+		self.returncode = None
+		self.output = output
+		self._status = status
+		self._exit_time = time.time() + latency
+
+	def poll(self):
+		if self.returncode is None and time.time() >= self._exit_time:
+			self.returncode = self._status
+		return self.returncode
+
+	def wait(self, timeout=None):
+		"""Wait for the command, returning None if 'timeout' passes"""
+		remaining = self._exit_time - time.time()
+		if timeout is not None and timeout < remaining:
+			time.sleep(max(0.0, timeout))
+			return self.poll()
+		if remaining > 0:
+			time.sleep(remaining)
+		self.returncode = self._status
+		return self.returncode
+
+	def communicate(self):
+		self.wait()
+		return (self.output, None)
+
+
+class SimulatedSystem(object):
+	"""A fake link table and command runner
+
+	Once installed as spawn.SERVER, every command which would be run
+	by script.Environment (ip(8) commands, hooks, "up" commands, and
+	mapping scripts) is simulated instead.  The "ip link" and "ip addr"
+	commands update the link table, "ip route" commands are accepted
+	for any known link, mapping scripts are answered from 'mappings',
+	and everything else just succeeds.  Each command takes the latency
+	configured for its program name, so that throughput and parallel
+	speedup can be measured without root or real network devices.
+
+	Attributes:
+		links: Dict mapping from an ifname to its sysfs.LinkState
+		latencies: Dict mapping from a program name (EG: "ip") to
+			the seconds each run takes; the None key gives the
+			latency of all other programs
+		mappings: Dict mapping from a mapping script path to a
+			function(ifname, data) returning its output
+		spawns: collections.Counter of commands run by program name
+	"""
+	def __init__(self, latencies=None, mappings=None):
+		self.links = dict()
+		self.latencies = dict(latencies or ())
+		self.mappings = dict(mappings or ())
+		self.spawns = collections.Counter()
+		self._lock = threading.Lock()
+		self._next_pid = FIRST_PID
+		self._previous = None
+
+	def add_link(self, ifname, mtu=1500, carrier=True):
+		"""Add a link (initially down) to the link table"""
+		with self._lock:
+			link = sysfs.LinkState(ifname)
+			link.index = len(self.links) + 1
+			link.flags = 0
+			link.operstate = 'down'
+			link.carrier = carrier
+			link.mtu = mtu
+			link.hwaddress = '02:00:%02x:%02x:%02x:%02x' % tuple(
+					(link.index >> shift) & 0xff
+					for shift in (24, 16, 8, 0))
+			self.links[ifname] = link
+			return link
+
+	def install(self):
+		"""Make this the object which starts all commands"""
+		self._previous = spawn.SERVER
+		spawn.SERVER = self
+		return self
+
+	def uninstall(self):
+		"""Restore whatever started commands before install()"""
+		spawn.SERVER, self._previous = self._previous, None
+
+	def netlink_peer(self):
+		"""Return a transport for methods.NetlinkBackend
+
+		The transport resolves the names in the link table, although
+		the requests sent to it do not change the table.
+		"""
+		return netlink.FakeNetlinkPeer(dict((name, link.index)
+				for name, link in self.links.iteritems()))
+
+	def spawn(self, argv, env, cwd=None, new_group=False, capture=False,
+			data=None):
+		"""Simulate a command, with the interface of SpawnClient.spawn
+
+		Raises:
+			OSError: If a mapping script is not in 'mappings'
+		"""
+		## The remaining arguments only matter to real processes
+		del env, cwd, new_group
+
+		program = os.path.basename(argv[0])
+		mapping = self.mappings.get(argv[0])
+		with self._lock:
+			self.spawns[program] += 1
+			self._next_pid += 1
+			pid = self._next_pid
+			if mapping is not None:
+				output = mapping(argv[1], data or '')
+				status = 0
+			elif data is not None:
+				raise OSError(errno.ENOENT,
+						os.strerror(errno.ENOENT))
+			elif program == 'ip':
+				status, output = self._run_ip(argv[1:]), ''
+			else:
+				status, output = 0, ''
+		latency = self.latencies.get(program,
+				self.latencies.get(None, 0))
+		return SimulatedProcess(pid, latency, status,
+				output if capture else None)
+
+	def _run_ip(self, args):
+		## Only the forms generated by the methods are understood
+		if 'dev' not in args[:-1]:
+			return 1
+		link = self.links.get(args[args.index('dev') + 1])
+		if link is None:
+			return 1
+
+		if args[0:2] == ['link', 'set']:
+			if 'up' in args:
+				link.flags |= sysfs.LinkState.IFF_UP
+				link.operstate = 'down'
+				if link.carrier:
+					link.operstate = 'up'
+			elif 'down' in args:
+				link.flags &= ~sysfs.LinkState.IFF_UP
+				link.operstate = 'down'
+			if 'mtu' in args[:-1]:
+				link.mtu = int(args[args.index('mtu') + 1])
+		elif args[0] == 'addr' and args[1] == 'add':
+			if args[2] in link.addresses:
+				return 2
+			link.addresses.append(args[2])
+		elif args[0] == 'addr' and args[1] == 'del':
+			if args[2] not in link.addresses:
+				return 2
+			link.addresses.remove(args[2])
+		elif args[0] != 'route':
+			return 1
+		return 0
+
+	def write_tree(self, root):
+		"""Write the link table as a fake /sys and /proc under 'root'
+
+		The result can be read back with sysfs.read_snapshot(root)
+		(EG: by "ifquery --state --state-root ROOT").
+		"""
+		net_dir = os.path.join(root, 'sys/class/net')
+		inet6 = []
+		for name, link in sorted(self.links.iteritems()):
+			link_dir = os.path.join(net_dir, name)
+			if not os.path.isdir(link_dir):
+				os.makedirs(link_dir)
+			attrs = {
+				'ifindex': str(link.index),
+				'flags': '0x%x' % link.flags,
+				'operstate': link.operstate,
+				'carrier': '1' if link.carrier else '0',
+				'mtu': str(link.mtu),
+				'address': link.hwaddress,
+			}
+			for attr, value in attrs.iteritems():
+				path = os.path.join(link_dir, attr)
+				with open(path, 'w') as afile:
+					afile.write(value + '\n')
+			for address in link.addresses:
+				inet6.append((link, address))
+
+		proc_dir = os.path.join(root, 'proc/net')
+		if not os.path.isdir(proc_dir):
+			os.makedirs(proc_dir)
+		with open(os.path.join(proc_dir, 'if_inet6'), 'w') as pfile:
+			for link, address in inet6:
+				line = _inet6_line(link, address)
+				if line is not None:
+					pfile.write(line)
+
+
+def _inet6_line(link, address):
+	## Format one /proc/net/if_inet6 line, skipping IPv4 addresses
+	address, _, prefixlen = address.partition('/')
+	try:
+		packed = socket.inet_pton(socket.AF_INET6, address)
+	except (socket.error, ValueError):
+		return None
+	return '%s %02x %02x 00 80 %8s\n' % (packed.encode('hex'),
+			link.index, int(prefixlen or 128), link.name)
@@ -0,0 +1,493 @@
+"""
+ifupdown_ng.spawn  -  A small fork-server for running commands
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import fcntl
+import marshal
+import os
+import select
+import signal
+import socket
+import struct
+import threading
+import time
+
+## The object which starts commands for script.Environment: the running
+## SpawnClient, a simulate.SimulatedSystem, or None when commands are run
+## directly with subprocess.
+SERVER = None
+
+## Without a SERVER, commands which need a new process group are run
+## through setsid(1), since a subprocess preexec_fn is not safe while
+## other threads are running (EG: with "-j").  The child of a fork() is
+## never a group leader, so setsid(1) execs the command in place.
+SETSID = 'setsid'
+
+## Each message is a 32-bit length followed by a marshalled tuple
+_LENGTH = struct.Struct('=I')
+
+## The pidfd_open(2) system call number, which is the same on every
+## architecture but Alpha, and whether the kernel supports it (None until
+## it is first tried)
+_NR_PIDFD_OPEN = 434
+_PIDFD_SUPPORTED = None
+
+
+def _set_cloexec(fdesc):
+	flags = fcntl.fcntl(fdesc, fcntl.F_GETFD)
+	fcntl.fcntl(fdesc, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+def _retry(func, *args):
+	## Repeat a system call interrupted by SIGCHLD
+	while True:
+		try:
+			return func(*args)
+		except (OSError, select.error) as ex:
+			if ex.args[0] != errno.EINTR:
+				raise
+
+def _send(sock, message):
+	data = marshal.dumps(message)
+	sock.sendall(_LENGTH.pack(len(data)) + data)
+
+def _split_messages(buf):
+	## Return the complete messages in 'buf' and the leftover bytes
+	messages = []
+	while len(buf) >= _LENGTH.size:
+		length = _LENGTH.unpack_from(buf)[0]
+		if len(buf) < _LENGTH.size + length:
+			break
+		messages.append(marshal.loads(
+				buf[_LENGTH.size:_LENGTH.size + length]))
+		buf = buf[_LENGTH.size + length:]
+	return messages, buf
+
+
+###
+## The server side, which runs in the forked helper process
+###
+
+class _Job(object):
+	__slots__ = ('job_id', 'pid', 'pipe', 'output', 'status')
+
+	def __init__(self, job_id, pid, pipe):
+		self.job_id = job_id
+		self.pid = pid
+		self.pipe = pipe
+		self.output = []
+		self.status = None
+
+def _exec_child(argv, env, cwd, new_group, inr, outw, errw):
+	## Runs in the forked child and never returns
+	try:
+		if inr is not None:
+			os.dup2(inr, 0)
+		if outw is not None:
+			os.dup2(outw, 1)
+		if new_group:
+			os.setpgrp()
+		if cwd is not None:
+			os.chdir(cwd)
+		os.execvpe(argv[0], argv, env)
+	except OSError as ex:
+		os.write(errw, str(ex.errno))
+	finally:
+		os._exit(127)
+
+def _start_job(sock, jobs, pipes, request):
+	job_id, argv, env, cwd, new_group, capture, stdin = request
+	errr, errw = os.pipe()
+	_set_cloexec(errw)
+	inr, inw = os.pipe() if stdin is not None else (None, None)
+	if stdin is not None:
+		_set_cloexec(inw)
+	outr, outw = os.pipe() if capture else (None, None)
+
+	pid = os.fork()
+	if pid == 0:
+		signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+		_exec_child(argv, env, cwd, new_group, inr, outw, errw)
+	os.close(errw)
+	if stdin is not None:
+		os.close(inr)
+	if capture:
+		os.close(outw)
+		_set_cloexec(outr)
+
+	## The error pipe is closed by a successful exec()
+	error = ''
+	while True:
+		data = _retry(os.read, errr, 64)
+		if not data:
+			break
+		error += data
+	os.close(errr)
+	if error:
+		_retry(os.waitpid, pid, 0)
+		if stdin is not None:
+			os.close(inw)
+		if capture:
+			os.close(outr)
+		_send(sock, ('error', job_id, int(error)))
+		return
+
+	## Standard input is only used for the few lines given to mapping
+	## scripts, so it is simply written out before going on.
+	if stdin is not None:
+		try:
+			while stdin:
+				stdin = stdin[_retry(os.write, inw, stdin):]
+		except OSError as ex:
+			if ex.errno != errno.EPIPE:
+				raise
+		os.close(inw)
+
+	job = _Job(job_id, pid, outr)
+	jobs[pid] = job
+	if capture:
+		pipes[outr] = job
+	_send(sock, ('started', job_id, pid))
+
+def _finish_job(sock, jobs, job):
+	if job.status is None or job.pipe is not None:
+		return
+	del jobs[job.pid]
+	_send(sock, ('exited', job.job_id, job.status, ''.join(job.output)))
+
+def _serve(sock):
+	"""Handle spawn requests until the client closes the connection"""
+	## SIGCHLD only needs to wake up select(), which is done by the
+	## wakeup fd; the handler itself does nothing.
+	wake_r, wake_w = os.pipe()
+	for fdesc in (wake_r, wake_w):
+		_set_cloexec(fdesc)
+		fcntl.fcntl(fdesc, fcntl.F_SETFL, os.O_NONBLOCK)
+	signal.set_wakeup_fd(wake_w)
+	signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+	jobs = dict()
+	pipes = dict()
+	buf = ''
+	while True:
+		ready = _retry(select.select, [sock, wake_r] + list(pipes),
+				[], [])[0]
+		if wake_r in ready:
+			try:
+				os.read(wake_r, 4096)
+			except OSError:
+				pass
+
+		for fdesc in ready:
+			job = pipes.get(fdesc)
+			if job is None:
+				continue
+			data = _retry(os.read, fdesc, 65536)
+			if data:
+				job.output.append(data)
+				continue
+			os.close(fdesc)
+			del pipes[fdesc]
+			job.pipe = None
+			_finish_job(sock, jobs, job)
+
+		while jobs:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except OSError as ex:
+				if ex.errno == errno.EINTR:
+					continue
+				break
+			if not pid:
+				break
+			job = jobs.get(pid)
+			if job is not None:
+				job.status = status
+				_finish_job(sock, jobs, job)
+
+		if sock in ready:
+			data = _retry(sock.recv, 65536)
+			if not data:
+				return
+			requests, buf = _split_messages(buf + data)
+			for request in requests:
+				_start_job(sock, jobs, pipes, request)
+
+
+###
+## Waiting for a command with a timeout
+###
+
+def _pidfd_open(pid):
+	## Return a pidfd for 'pid', or None if the kernel has no pidfds
+	global _PIDFD_SUPPORTED # pylint: disable=W0603
+	if _PIDFD_SUPPORTED is False:
+		return None
+	## ctypes is only needed once a command is given a timeout
+	import ctypes
+	libc = ctypes.CDLL(None, use_errno=True)
+	fdesc = libc.syscall(_NR_PIDFD_OPEN, ctypes.c_int(pid), 0)
+	if fdesc >= 0:
+		_PIDFD_SUPPORTED = True
+		return fdesc
+	error = ctypes.get_errno()
+	if error in (errno.ENOSYS, errno.EPERM):
+		_PIDFD_SUPPORTED = False
+		return None
+	raise OSError(error, os.strerror(error))
+
+def wait_pid(pid, timeout):
+	"""Wait for up to 'timeout' seconds for a process to exit
+
+	This blocks in select() on a pidfd (see pidfd_open(2)), so unlike
+	SIGCHLD it works in any thread and does not need the process to be
+	a child of this one (EG: it may be one started by a spawn server).
+	The process is not reaped.
+
+	Returns:
+		True if the process has exited, False if the timeout passed
+		first, or None if the kernel does not support pidfds
+	"""
+	try:
+		fdesc = _pidfd_open(pid)
+	except OSError as ex:
+		if ex.errno != errno.ESRCH:
+			raise
+		return True
+	if fdesc is None:
+		return None
+	try:
+		deadline = time.time() + timeout
+		while True:
+			try:
+				return bool(select.select([fdesc], [], [],
+						max(0.0, deadline -
+							time.time()))[0])
+			except select.error as ex:
+				if ex.args[0] != errno.EINTR:
+					raise
+	finally:
+		os.close(fdesc)
+
+def wait_process(proc, timeout):
+	"""Wait for up to 'timeout' seconds for a command to exit
+
+	Arguments:
+		proc: A subprocess.Popen, or a Popen-like object returned
+			by SERVER (whose wait() takes a timeout, as in
+			Python 3)
+		timeout: The maximum number of seconds to wait
+	Returns:
+		The exit status, or None if the timeout passed first
+	"""
+	import subprocess
+	if not isinstance(proc, subprocess.Popen):
+		return proc.wait(timeout)
+	status = proc.poll()
+	if status is not None:
+		return status
+	if wait_pid(proc.pid, timeout) is not None:
+		return proc.poll()
+
+	## Without pidfds, poll with exponential backoff
+	deadline = time.time() + timeout
+	delay = 0.001
+	while True:
+		status = proc.poll()
+		if status is not None:
+			return status
+		remaining = deadline - time.time()
+		if remaining <= 0:
+			return None
+		time.sleep(min(delay, remaining))
+		delay = min(delay * 2, 0.05)
+
+
+###
+## The client side, used by script.Environment
+###
+
+class Process(object):
+	"""A command started by the spawn server
+
+	This provides the parts of the subprocess.Popen interface which are
+	used by script.Environment.
+
+	Attributes:
+		pid: The process ID of the command
+		returncode: The exit status (negative for a signal), or None
+			while the command is still running
+		output: The captured standard output, if it was requested
+	"""
+	def __init__(self):
+		self.pid = None
+		self.returncode = None
+		self.output = None
+		self._error = None
+		self._started = threading.Event()
+		self._exited = threading.Event()
+
+	def poll(self):
+		return self.returncode
+
+	def wait(self, timeout=None):
+		"""Wait for the command, returning None if 'timeout' passes"""
+		if timeout is not None and not self._exited.is_set():
+			exited = wait_pid(self.pid, timeout)
+			if exited is None:
+				self._exited.wait(timeout)
+			if not exited:
+				return self.returncode
+		## The server reports the status as soon as it reaps it
+		self._exited.wait()
+		return self.returncode
+
+	def communicate(self):
+		self.wait()
+		return (self.output, None)
+
+
+class SpawnClient(object):
+	"""The connection to a running spawn server
+
+	Requests may be made from any thread.  A reader thread collects the
+	replies and wakes up whichever Process each one is for.
+
+	Attributes:
+		sock: The socket connected to the server
+		pid: The process ID of the server
+	"""
+	def __init__(self, sock, pid):
+		self.sock = sock
+		self.pid = pid
+		self._lock = threading.Lock()
+		self._next_id = 0
+		self._processes = dict()
+		self._reader = threading.Thread(target=self._read_replies)
+		self._reader.daemon = True
+		self._reader.start()
+
+	def spawn(self, argv, env, cwd=None, new_group=False, capture=False,
+			data=None):
+		"""Start a command, returning once it has been exec()ed
+
+		Arguments:
+			argv: The command and its arguments
+			env: Dict of environment variables for the command
+			cwd: Working directory for the command, or None
+			new_group: If True, run it in a new process group
+			capture: If True, collect its standard output
+			data: String to feed to its standard input, or None
+				to leave standard input alone
+		Raises:
+			OSError: If the command could not be started
+		"""
+		process = Process()
+		with self._lock:
+			self._next_id += 1
+			job_id = self._next_id
+			self._processes[job_id] = process
+			_send(self.sock, (job_id, list(argv), dict(env), cwd,
+					bool(new_group), bool(capture), data))
+		process._started.wait()
+		if process._error is not None:
+			raise OSError(process._error, os.strerror(process._error))
+		return process
+
+	def _read_replies(self):
+		buf = ''
+		while True:
+			try:
+				data = self.sock.recv(65536)
+			except socket.error:
+				data = ''
+			if not data:
+				break
+			replies, buf = _split_messages(buf + data)
+			for reply in replies:
+				self._dispatch(reply)
+
+		## The server has gone away, so nothing else will finish
+		with self._lock:
+			processes, self._processes = self._processes, dict()
+		for process in processes.itervalues():
+			if process.pid is None:
+				process._error = errno.EPIPE
+			else:
+				process.returncode = -signal.SIGKILL
+			process._started.set()
+			process._exited.set()
+
+	def _dispatch(self, reply):
+		with self._lock:
+			process = self._processes.get(reply[1])
+			if reply[0] != 'started':
+				self._processes.pop(reply[1], None)
+		if process is None:
+			return
+		if reply[0] == 'started':
+			process.pid = reply[2]
+		elif reply[0] == 'error':
+			process._error = reply[2]
+		else:
+			status = reply[2]
+			if os.WIFSIGNALED(status):
+				process.returncode = -os.WTERMSIG(status)
+			else:
+				process.returncode = os.WEXITSTATUS(status)
+			process.output = reply[3]
+			process._exited.set()
+		process._started.set()
+
+	def close(self):
+		"""Stop the server, which exits once the connection closes"""
+		self.sock.shutdown(socket.SHUT_RDWR)
+		self.sock.close()
+		_retry(os.waitpid, self.pid, 0)
+
+
+def start_server():
+	"""Fork a spawn server and make it the global SERVER
+
+	This should be done as early as possible, since the cost of each
+	fork() in the server depends on how much memory it has.
+	"""
+	global SERVER # pylint: disable=W0603
+	client_sock, server_sock = socket.socketpair(socket.AF_UNIX,
+			socket.SOCK_STREAM)
+	_set_cloexec(client_sock.fileno())
+	_set_cloexec(server_sock.fileno())
+	pid = os.fork()
+	if pid == 0:
+		try:
+			client_sock.close()
+			_serve(server_sock)
+		finally:
+			os._exit(0)
+	server_sock.close()
+	SERVER = SpawnClient(client_sock, pid)
+	return SERVER
+
+def stop_server():
+	"""Stop the global spawn server, if there is one"""
+	global SERVER # pylint: disable=W0603
+	client, SERVER = SERVER, None
+	if client is not None:
+		client.close()
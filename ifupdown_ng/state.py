@@ -0,0 +1,176 @@
+"""
+ifupdown_ng.state  -  Persistent record of applied interface configs
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import os
+
+from ifupdown_ng.autogen.config import RUN_DIR
+
+STATE_FILE = os.path.join(RUN_DIR, 'ifstate')
+
+
+class AppliedStanza(object):
+	"""Record of a single stanza which was applied to an interface
+
+	Attributes:
+		address_family: The address family of the applied stanza
+		method: The method of the applied stanza
+		fingerprint: The InterfaceConfig.fingerprint at apply time
+	"""
+	__slots__ = ('address_family', 'method', 'fingerprint')
+
+	def __init__(self, address_family, method, fingerprint):
+		self.address_family = address_family
+		self.method = method
+		self.fingerprint = fingerprint
+
+	def __eq__(self, other):
+		return (self.address_family == other.address_family and
+				self.method == other.method and
+				self.fingerprint == other.fingerprint)
+
+	def __ne__(self, other):
+		return not self == other
+
+
+class InterfaceState(object):
+	"""Record of the config applied to a single physical interface
+
+	Attributes:
+		ifname: The name of the physical interface
+		config_name: The logical interface config name applied to it
+		stanzas: List of AppliedStanza objects, in the order applied
+	"""
+	def __init__(self, ifname, config_name, stanzas=None):
+		self.ifname = ifname
+		self.config_name = config_name
+		self.stanzas = list(stanzas or ())
+
+	@classmethod
+	def from_configs(cls, ifname, configs):
+		"""Build a record from a sequence of InterfaceConfig objects"""
+		configs = list(configs)
+		config_name = configs[0].name if configs else ifname
+		return cls(ifname, config_name, [
+			AppliedStanza(config.address_family, config.method,
+					config.fingerprint)
+			for config in configs
+		])
+
+	def matches(self, configs):
+		"""Return True if 'configs' is exactly what was applied"""
+		return self.stanzas == self.from_configs(self.ifname,
+				configs).stanzas
+
+	def lines(self):
+		"""Return the state file lines for this interface"""
+		return ['\t'.join((self.ifname, self.config_name,
+				stanza.address_family, stanza.method,
+				stanza.fingerprint)) + '\n'
+			for stanza in self.stanzas]
+
+
+class StateFile(object):
+	"""The on-disk database of which interfaces are currently up
+
+	The file contains one tab-separated line per applied stanza:
+
+	  IFNAME  CONFIG-NAME  ADDRESS-FAMILY  METHOD  FINGERPRINT
+
+	Lines for the same interface are kept together in the order in
+	which the stanzas were applied.  Updates are written to a temporary
+	file which is then atomically renamed over the original.
+
+	Attributes:
+		path: The location of the state file
+		interfaces: Dict mapping from an ifname to its InterfaceState
+	"""
+	def __init__(self, path=None):
+		self.path = path if path is not None else STATE_FILE
+		self.interfaces = dict()
+
+	def load(self):
+		"""Read the state file, treating a missing file as empty
+
+		Raises:
+			IOError: If the file exists but cannot be read
+		"""
+		self.interfaces.clear()
+		try:
+			sfile = open(self.path, 'r')
+		except IOError as ex:
+			if ex.errno == errno.ENOENT:
+				return self
+			raise
+
+		with sfile:
+			for line in sfile:
+				fields = line.rstrip('\n').split('\t')
+				if len(fields) != 5:
+					continue
+				ifname, config_name = fields[0:2]
+				ifstate = self.interfaces.get(ifname)
+				if ifstate is None:
+					ifstate = InterfaceState(ifname,
+							config_name)
+					self.interfaces[ifname] = ifstate
+				ifstate.stanzas.append(
+						AppliedStanza(*fields[2:5]))
+		return self
+
+	def save(self):
+		"""Atomically replace the state file with current contents
+
+		Raises:
+			IOError: If the file cannot be written
+			OSError: If the file cannot be renamed into place
+		"""
+		dirpath = os.path.dirname(self.path)
+		if dirpath and not os.path.isdir(dirpath):
+			os.makedirs(dirpath)
+
+		tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+		with open(tmp_path, 'w') as sfile:
+			for ifname in sorted(self.interfaces):
+				sfile.writelines(self.interfaces[ifname].lines())
+		os.rename(tmp_path, self.path)
+		return self
+
+	def __contains__(self, ifname):
+		return ifname in self.interfaces
+
+	def __getitem__(self, ifname):
+		return self.interfaces[ifname]
+
+	def mark_up(self, ifname, configs):
+		"""Record that 'configs' have been applied to 'ifname'"""
+		ifstate = InterfaceState.from_configs(ifname, configs)
+		self.interfaces[ifname] = ifstate
+		return ifstate
+
+	def mark_down(self, ifname):
+		"""Record that 'ifname' has been deconfigured"""
+		return self.interfaces.pop(ifname, None)
+
+	def is_current(self, ifname, configs):
+		"""Return True if 'ifname' is up with exactly 'configs'"""
+		ifstate = self.interfaces.get(ifname)
+		return ifstate is not None and ifstate.matches(configs)
@@ -0,0 +1,213 @@
+"""
+ifupdown_ng.sysfs  -  Bulk snapshots of kernel network interface state
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import binascii
+import os
+import socket
+import time
+
+## How long a snapshot may be reused before the kernel is asked again
+SNAPSHOT_MAX_AGE = 1.0
+
+## The per-interface sysfs attributes which are collected
+_ATTRS = ('ifindex', 'flags', 'operstate', 'carrier', 'mtu', 'address')
+
+
+class LinkState(object):
+	"""Runtime kernel state of a single network interface
+
+	Attributes:
+		name: The kernel interface name
+		index: The kernel interface index, or None if unknown
+		flags: The IFF_* interface flags, or None if unknown
+		operstate: The RFC2863 operational state (EG: "up", "down")
+		carrier: True/False, or None if unknown (EG: link is down)
+		mtu: The MTU as an integer, or None if unknown
+		master: Name of the master device (EG: bridge), if any
+		hwaddress: The link-layer address, if any
+		addresses: List of "ADDRESS/PREFIXLEN" strings
+	"""
+	__slots__ = ('name', 'index', 'flags', 'operstate', 'carrier', 'mtu',
+			'master', 'hwaddress', 'addresses')
+
+	## From <linux/if.h>
+	IFF_UP = 0x1
+
+	def __init__(self, name):
+		self.name = name
+		self.index = None
+		self.flags = None
+		self.operstate = None
+		self.carrier = None
+		self.mtu = None
+		self.master = None
+		self.hwaddress = None
+		self.addresses = []
+
+	def items(self):
+		"""Return the state as an ordered list of (key, value)"""
+		return [
+			('operstate', self.operstate),
+			('carrier', self.carrier),
+			('mtu', self.mtu),
+			('master', self.master),
+			('hwaddress', self.hwaddress),
+			('addresses', self.addresses),
+		]
+
+	@property
+	def is_up(self):
+		"""True if the interface is administratively up"""
+		return bool(self.flags and self.flags & self.IFF_UP)
+
+
+def _read_attr(path):
+	"""Read a single sysfs attribute, returning None on any error"""
+	try:
+		fdesc = os.open(path, os.O_RDONLY)
+	except OSError:
+		return None
+	try:
+		return os.read(fdesc, 4096).rstrip('\n')
+	except OSError:
+		## EG: "carrier" returns EINVAL while the link is down
+		return None
+	finally:
+		os.close(fdesc)
+
+def _read_link_state(net_dir, name):
+	link = LinkState(name)
+	link_dir = os.path.join(net_dir, name)
+	attrs = dict((attr, _read_attr(os.path.join(link_dir, attr)))
+			for attr in _ATTRS)
+
+	if attrs['ifindex'] is not None and attrs['ifindex'].isdigit():
+		link.index = int(attrs['ifindex'])
+	if attrs['flags'] is not None:
+		try:
+			link.flags = int(attrs['flags'], 16)
+		except ValueError:
+			pass
+	link.operstate = attrs['operstate']
+	link.hwaddress = attrs['address']
+	if attrs['carrier'] is not None:
+		link.carrier = attrs['carrier'] == '1'
+	if attrs['mtu'] is not None and attrs['mtu'].isdigit():
+		link.mtu = int(attrs['mtu'])
+	try:
+		link.master = os.path.basename(os.readlink(
+				os.path.join(link_dir, 'master')))
+	except OSError:
+		pass
+	return link
+
+def _add_inet6_addresses(links, root):
+	## All IPv6 addresses are listed in a single procfs file, with
+	## lines of the form: ADDR-HEX IFINDEX PREFIXLEN SCOPE FLAGS NAME
+	try:
+		with open(os.path.join(root, 'proc/net/if_inet6')) as afile:
+			lines = afile.readlines()
+	except IOError:
+		return
+
+	for line in lines:
+		fields = line.split()
+		if len(fields) != 6 or fields[5] not in links:
+			continue
+		addr = socket.inet_ntop(socket.AF_INET6,
+				binascii.unhexlify(fields[0]))
+		links[fields[5]].addresses.append('%s/%d' % (addr,
+				int(fields[2], 16)))
+
+def _add_netlink_addresses(links, transport):
+	## One RTM_GETADDR dump lists the IPv4 and IPv6 addresses of every
+	## link, which are matched up with the links by their ifindex.  The
+	## netlink module is imported here since it depends on this one.
+	from ifupdown_ng import netlink
+	by_index = dict((link.index, link) for link in links.itervalues()
+			if link.index is not None)
+	conn = netlink.RouteNetlink(transport)
+	try:
+		conn.get_addresses(by_index)
+	finally:
+		conn.close()
+
+def read_snapshot(root='/', transport=None):
+	"""Read the state of every network interface in one pass
+
+	This makes a single scan of /sys/class/net and reads each link's
+	attributes directly.  For the running system (or when a netlink
+	transport is given, EG: a netlink.RecordedNetlink), the addresses
+	then come from a single rtnetlink address dump.  Any other root
+	cannot be asked for its addresses, so only the IPv6 addresses in
+	its proc/net/if_inet6 are collected.  No external commands are run.
+
+	Arguments:
+		root: Directory containing the "sys" and "proc" trees to
+			read, which may be a fake tree for testing.
+		transport: The netlink transport for the address dump
+	Returns:
+		A dict mapping from each interface name to its LinkState
+	"""
+	net_dir = os.path.join(root, 'sys/class/net')
+	try:
+		names = os.listdir(net_dir)
+	except OSError:
+		names = []
+
+	links = dict((name, _read_link_state(net_dir, name))
+			for name in names)
+	if transport is not None or os.path.abspath(root) == '/':
+		try:
+			_add_netlink_addresses(links, transport)
+			return links
+		except EnvironmentError:
+			## EG: No netlink support, so fall back to procfs
+			for link in links.itervalues():
+				del link.addresses[:]
+	_add_inet6_addresses(links, root)
+	return links
+
+
+## Recent snapshots indexed by root, each stored as (timestamp, snapshot)
+_SNAPSHOT_CACHE = dict()
+
+def snapshot(root='/', max_age=SNAPSHOT_MAX_AGE):
+	"""Return a recent snapshot, reading a new one if it is too old
+
+	Repeated queries made within 'max_age' seconds of each other (EG:
+	within a single batch of requests) share the same snapshot.
+	"""
+	now = time.time()
+	cached = _SNAPSHOT_CACHE.get(root)
+	if cached is not None and 0 <= now - cached[0] <= max_age:
+		return cached[1]
+
+	links = read_snapshot(root)
+	_SNAPSHOT_CACHE[root] = (now, links)
+	return links
+
+def invalidate(root=None):
+	"""Discard cached snapshots (for one root or for all of them)"""
+	if root is None:
+		_SNAPSHOT_CACHE.clear()
+	else:
+		_SNAPSHOT_CACHE.pop(root, None)
@@ -0,0 +1,188 @@
+"""
+ifupdown_ng.tests.fixtures  -  Shared helpers for the unit tests
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import logging
+import os
+import shutil
+import socket
+import StringIO
+import sys
+import tempfile
+import unittest
+
+from ifupdown_ng import netlink
+from ifupdown_ng import parser as fileparser
+from ifupdown_ng.commands import ARGS
+from ifupdown_ng.commands import CommandHandlerType
+from ifupdown_ng.commands import ifcheck
+from ifupdown_ng.config import parser
+from ifupdown_ng.config import tokenizer
+
+
+###
+## Recorded rtnetlink messages
+###
+## Each function returns one encoded message, as the kernel would send it in
+## reply to the request with sequence number 'seq'.
+###
+def message(msg_type, seq, payload, flags=0):
+	"""Encode a single netlink message"""
+	return netlink.NLMSGHDR.pack(netlink.NLMSGHDR.size + len(payload),
+			msg_type, flags, seq, 0) + payload
+
+def done(seq):
+	"""Encode the NLMSG_DONE which ends a dump"""
+	return message(netlink.NLMSG_DONE, seq, netlink.U32.pack(0),
+			netlink.NLM_F_MULTI)
+
+def new_link(seq, index, name, flags=netlink.IFF_UP, mtu=1500):
+	"""Encode an RTM_NEWLINK dump entry"""
+	payload = (netlink.IFINFOMSG.pack(socket.AF_UNSPEC, 0, index,
+			flags, 0) +
+			netlink.pack_attr(netlink.IFLA_IFNAME, name + '\0') +
+			netlink.pack_attr(netlink.IFLA_MTU,
+				netlink.U32.pack(mtu)))
+	return message(netlink.RTM_NEWLINK, seq, payload,
+			netlink.NLM_F_MULTI)
+
+def new_address(seq, index, address):
+	"""Encode an RTM_NEWADDR dump entry for "ADDRESS/PREFIXLEN" """
+	address, prefixlen = address.split('/')
+	family = socket.AF_INET6 if ':' in address else socket.AF_INET
+	payload = (netlink.IFADDRMSG.pack(family, int(prefixlen), 0, 0,
+			index) + netlink.pack_attr(netlink.IFA_LOCAL,
+				socket.inet_pton(family, address)))
+	return message(netlink.RTM_NEWADDR, seq, payload,
+			netlink.NLM_F_MULTI)
+
+
+###
+## Temporary files and commands
+###
+class TempDirTestCase(unittest.TestCase):
+	"""TestCase with a scratch directory, removed after each test
+
+	Attributes:
+		tmpdir: The path of the scratch directory
+	"""
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp(prefix='ifupdown-ng-test.')
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def write_file(self, name, text):
+		"""Write a file in the scratch directory and return its path"""
+		path = os.path.join(self.tmpdir, name)
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+		with open(path, 'w') as tfile:
+			tfile.write(text)
+		return path
+
+	def load_config(self, text, nr_errors=0):
+		"""Load an interfaces(5) file with 'text' as a SystemConfig
+
+		Any warnings (and the expected number of errors) are kept in
+		the 'config_messages' attribute.
+		"""
+		collector = ifcheck.MessageCollector()
+		sysconfig = parser.SystemConfig(log_handler=collector)
+		sysconfig.load_interfaces_file(tokenizer.InterfacesFile(
+				self.write_file('interfaces', text),
+				handler=collector))
+		self.assertEqual(sysconfig.total_nr_errors, nr_errors)
+		self.config_messages = collector.messages
+		return sysconfig
+
+	def collect_log(self, logger):
+		"""Return the list of messages 'logger' gets during the test"""
+		collector = ifcheck.MessageCollector()
+		logger.addHandler(collector)
+		self.addCleanup(logger.removeHandler, collector)
+		return collector.messages
+
+	def use_config_dir(self, dirpath):
+		"""Look for hooks in 'dirpath' until the test is done"""
+		self.addCleanup(setattr, parser, 'CONFIG_DIR',
+				parser.CONFIG_DIR)
+		parser.CONFIG_DIR = dirpath
+
+	def set_args(self, **values):
+		"""Set command-line options in ARGS until the test is done"""
+		missing = object()
+		for name, value in values.iteritems():
+			self.addCleanup(_restore_arg, name,
+					getattr(ARGS, name, missing), missing)
+			setattr(ARGS, name, value)
+
+def _restore_arg(name, value, missing):
+	if value is missing:
+		delattr(ARGS, name)
+	else:
+		setattr(ARGS, name, value)
+
+
+def run_command(command, args):
+	"""Run a command in-process and return (status, standard output)
+
+	Anything written to standard error (EG: usage errors) is dropped,
+	and the logging setup done by the command (including any handlers
+	it opened, EG: for "--log-json") is undone afterwards.
+	ARGS starts out empty, since parse_args() only fills in defaults
+	for options which are not already set, and is put back afterwards.
+	"""
+	handler = CommandHandlerType.load_command(command)(command)
+	saved_args = dict(vars(ARGS))
+	vars(ARGS).clear()
+	root = logging.getLogger()
+	level, handlers = root.level, list(root.handlers)
+	filters = [(log_handler, list(log_handler.filters))
+			for log_handler in handlers]
+	global_handlers = list(fileparser.GLOBAL_HANDLERS)
+	stdout, sys.stdout = sys.stdout, StringIO.StringIO()
+	stderr, sys.stderr = sys.stderr, StringIO.StringIO()
+	## The config file handler was bound to stderr when imported
+	default_stream = fileparser.DEFAULT_HANDLER.stream
+	default_level = fileparser.DEFAULT_HANDLER.level
+	fileparser.DEFAULT_HANDLER.stream = sys.stderr
+	try:
+		try:
+			status = handler.main(['--log-level', 'CRITICAL'] +
+					list(args))
+		except SystemExit as ex:
+			status = ex.code
+		return status, sys.stdout.getvalue()
+	finally:
+		sys.stdout = stdout
+		sys.stderr = stderr
+		fileparser.DEFAULT_HANDLER.stream = default_stream
+		fileparser.DEFAULT_HANDLER.setLevel(default_level)
+		root.setLevel(level)
+		for log_handler in root.handlers:
+			if log_handler not in handlers:
+				log_handler.close()
+		root.handlers[:] = handlers
+		fileparser.GLOBAL_HANDLERS[:] = global_handlers
+		for log_handler, saved in filters:
+			log_handler.filters[:] = saved
+		vars(ARGS).clear()
+		vars(ARGS).update(saved_args)
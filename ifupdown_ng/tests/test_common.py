@@ -0,0 +1,97 @@
+"""
+ifupdown_ng.tests.test_common  -  Tests for the options shared by commands
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import unittest
+
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+iface eth0 inet static
+	address 192.0.2.1/24
+	up echo eth0
+
+iface vlan[100-199] inet static
+	address 10.0.{N}.1/24
+	up echo vlan{N}
+'''
+
+
+class OverrideTestCase(fixtures.TempDirTestCase):
+	"""Override stanza options with "-o OPTION=VALUE" """
+	def setUp(self):
+		super(OverrideTestCase, self).setUp()
+		self.interfaces = self.write_file('interfaces', INTERFACES)
+
+	def query(self, ifname, *options):
+		args = ['-i', self.interfaces, ifname]
+		for option in options:
+			args += ['-o', option]
+		return fixtures.run_command('ifquery', args)
+
+	def test_malformed(self):
+		for option in ('=x', 'mtu', '', 'MTU=9000', '9mtu=1',
+				'mtu x=1'):
+			self.assertEqual(self.query('eth0', option), (2, ''))
+
+	def test_empty_value(self):
+		## Only the option name is needed
+		self.assertEqual(self.query('eth0', 'address='),
+				(0, 'address: \nup: echo eth0\n'))
+		self.assertEqual(self.query('eth0', 'mtu=a=b'), (0,
+				'address: 192.0.2.1/24\nmtu: a=b\n'
+				'up: echo eth0\n'))
+
+	def test_repeated(self):
+		## The last value wins, except for commands which all run
+		## after the stanza's own
+		self.assertEqual(self.query('eth0', 'mtu=1500', 'mtu=9000',
+				'up=echo one', 'post-up=echo two'), (0,
+				'address: 192.0.2.1/24\nmtu: 9000\n'
+				'up: echo eth0\nup: echo one\nup: echo two\n'))
+
+	def test_template(self):
+		## Overrides apply to each generated instance after "{N}" is
+		## substituted, and are not substituted themselves
+		self.assertEqual(self.query('vlan150', 'address=10.1.{N}.1/24',
+				'up=echo override'), (0,
+				'address: 10.1.{N}.1/24\n'
+				'up: echo vlan150\nup: echo override\n'))
+		self.assertEqual(self.query('vlan150', 'mtu=9000'), (0,
+				'address: 10.0.150.1/24\nmtu: 9000\n'
+				'up: echo vlan150\n'))
+
+	def test_template_unchanged(self):
+		## The template itself is not changed by an override
+		sysconfig = self.load_config(INTERFACES)
+		overlay = sysconfig.configs_for_name('vlan100',
+				{'mtu': '9000', 'up': ['echo override']})[0]
+		self.assertEqual(overlay.options['up'],
+				['echo vlan100', 'echo override'])
+		self.assertEqual(sysconfig.templates[0].options['up'],
+				['echo vlan{N}'])
+		self.assertNotIn('mtu', sysconfig.templates[0].options)
+		plain = sysconfig.configs_for_name('vlan100')[0]
+		self.assertNotIn('mtu', plain.options)
+		self.assertNotEqual(plain.fingerprint, overlay.fingerprint)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,296 @@
+"""
+ifupdown_ng.tests.test_execute  -  Tests for running ifup/ifdown phases
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import imp
+import os
+import StringIO
+import sys
+import unittest
+
+from ifupdown_ng import execute
+from ifupdown_ng import netlink
+from ifupdown_ng import plugins
+from ifupdown_ng import state
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+iface eth0 inet static
+	address 192.0.2.1/24
+	mtu 9000
+
+iface eth0 inet6 static
+	address 2001:db8:0::1
+	netmask 64
+
+iface eth1 inet dhcp
+
+iface vlan10 inet static
+	address 198.51.100.1/24
+	down echo stopping $IFACE
+'''
+
+
+class IsConfiguredTestCase(fixtures.TempDirTestCase):
+	"""Decide which interfaces ifup/ifdown can skip"""
+	def setUp(self):
+		super(IsConfiguredTestCase, self).setUp()
+		self.stanzas = self.load_config(INTERFACES).configs_by_name(
+				['eth0', 'eth1', 'vlan10'])
+		self.statefile = state.StateFile(self.tmpdir + '/ifstate')
+
+		## The kernel has eth0 and eth1, but vlan10 has been deleted
+		self.transport = netlink.RecordedNetlink([
+			fixtures.new_link(1, 1, 'lo', mtu=65536) +
+			fixtures.new_link(1, 2, 'eth0', mtu=9000) +
+			fixtures.new_link(1, 3, 'eth1') +
+			fixtures.done(1),
+			fixtures.new_address(2, 1, '127.0.0.1/8') +
+			fixtures.new_address(2, 2, '192.0.2.1/24') +
+			fixtures.new_address(2, 2, '2001:db8::1/64') +
+			fixtures.new_address(2, 3, '203.0.113.7/24') +
+			fixtures.done(2),
+		])
+		self.links = netlink.snapshot(self.transport)
+
+	def is_configured(self, ifname):
+		return execute.is_configured(
+				self.statefile.interfaces.get(ifname),
+				self.links.get(ifname), self.stanzas[ifname])
+
+	def is_deconfigured(self, ifname):
+		return execute.is_deconfigured(
+				self.statefile.interfaces.get(ifname),
+				self.links.get(ifname))
+
+	def test_snapshot(self):
+		self.assertEqual(sorted(self.links), ['eth0', 'eth1', 'lo'])
+		self.assertEqual(self.links['eth0'].addresses,
+				['192.0.2.1/24', '2001:db8::1/64'])
+		self.assertEqual(len(self.transport.sent), 2)
+
+	def test_static(self):
+		## The addresses are there, but only the state file shows
+		## that these exact stanzas were applied
+		self.assertFalse(self.is_configured('eth0'))
+		self.statefile.mark_up('eth0', self.stanzas['eth0'])
+		self.assertTrue(self.is_configured('eth0'))
+
+	def test_static_changed(self):
+		self.statefile.mark_up('eth0', self.stanzas['eth0'])
+		self.links['eth0'].addresses.remove('2001:db8::1/64')
+		self.assertFalse(self.is_configured('eth0'))
+		self.links['eth0'].addresses.append('2001:db8::1/48')
+		self.assertFalse(self.is_configured('eth0'))
+		self.links['eth0'].addresses.append('2001:db8:0:0::1/64')
+		self.assertTrue(self.is_configured('eth0'))
+		self.links['eth0'].mtu = 1500
+		self.assertFalse(self.is_configured('eth0'))
+
+	def test_static_down(self):
+		self.statefile.mark_up('eth0', self.stanzas['eth0'])
+		self.links['eth0'].flags &= ~netlink.IFF_UP
+		self.assertFalse(self.is_configured('eth0'))
+
+	def test_dhcp(self):
+		## A link which is up says nothing about dhclient
+		self.statefile.mark_up('eth1', self.stanzas['eth1'])
+		self.assertFalse(self.is_configured('eth1'))
+
+	def test_deleted(self):
+		self.statefile.mark_up('vlan10', self.stanzas['vlan10'])
+		self.assertFalse(self.is_configured('vlan10'))
+		self.assertFalse(self.is_deconfigured('vlan10'))
+		self.statefile.mark_down('vlan10')
+		self.assertTrue(self.is_deconfigured('vlan10'))
+
+	def test_deconfigured(self):
+		self.assertFalse(self.is_deconfigured('eth0'))
+		self.links['eth0'].flags &= ~netlink.IFF_UP
+		self.assertTrue(self.is_deconfigured('eth0'))
+		self.statefile.mark_up('eth0', self.stanzas['eth0'])
+		self.assertFalse(self.is_deconfigured('eth0'))
+
+	def test_stop_deleted(self):
+		## Only the "down" commands and hooks are run for a link
+		## which no longer exists
+		self.set_args(verbose=False)
+		output = StringIO.StringIO()
+		executor = execute.Executor('stop', act=False, scripts=False,
+				output=output)
+		self.assertTrue(executor.run('vlan10', self.stanzas['vlan10']))
+		self.assertIn('ip addr del', output.getvalue())
+
+		output.truncate(0)
+		executor.deleted_links.add('vlan10')
+		self.assertTrue(executor.run('vlan10', self.stanzas['vlan10']))
+		self.assertEqual(output.getvalue(), 'echo stopping $IFACE\n')
+
+
+SLOW_PLUGIN = '''\
+import time
+
+def up(context):
+	if context.remaining() is not None:
+		context.logger.warning('%.1f', context.remaining())
+	time.sleep(0.2)
+'''
+
+COUNT_PLUGIN = '''\
+CALLS = []
+
+def up(context):
+	CALLS.append(context.ifname)
+'''
+
+
+class PluginTimeoutTestCase(fixtures.TempDirTestCase):
+	"""In-process hook plugins are held to the phase deadline"""
+	def setUp(self):
+		super(PluginTimeoutTestCase, self).setUp()
+		self.set_args(verbose=False)
+		self.use_config_dir(self.tmpdir)
+		self.write_file('if-up.d/a-slow.py', SLOW_PLUGIN)
+		self.write_file('if-up.d/b-count.py', COUNT_PLUGIN)
+		self.messages = self.collect_log(execute.LOGGER)
+
+	def errors(self):
+		return [msg['message'] for msg in self.messages
+			if msg['level'] == 'ERROR']
+
+	def run_up(self, options):
+		stanzas = self.load_config('iface dummy0 inet test\n' +
+				options).configs_by_name(['dummy0'])
+		executor = execute.Executor('start', output=StringIO.StringIO())
+		success = executor.run('dummy0', stanzas['dummy0'])
+		return success, plugins._load_module(os.path.join(self.tmpdir,
+				'if-up.d', 'b-count.py')).CALLS
+
+	def test_no_timeout(self):
+		self.assertEqual(self.run_up(''), (True, ['dummy0']))
+		self.assertEqual(self.errors(), [])
+
+	def test_phase_timeout(self):
+		## The slow plugin uses up the phase, so the next one never
+		## starts
+		self.assertEqual(self.run_up('\tphase-timeout 0.1\n'),
+				(False, []))
+		slow = os.path.join(self.tmpdir, 'if-up.d', 'a-slow.py')
+		errors = self.errors()
+		self.assertEqual(len(errors), 2)
+		self.assertTrue(errors[0].startswith('%s: Timed out after '
+				% slow))
+		self.assertEqual(errors[1], 'Phase timed out after 0.1 seconds')
+		self.assertIn('0.1', [msg['message']
+				for msg in self.messages])
+
+	def test_command_timeout(self):
+		self.assertEqual(self.run_up('\tcommand-timeout 0.1\n'),
+				(False, []))
+		self.assertEqual(len(self.errors()), 1)
+
+	def test_plan(self):
+		status, _ = fixtures.run_command('ifup', ['-i',
+				self.write_file('plan.if', 'auto dummy0\n'
+					'iface dummy0 inet test\n'),
+				'--all', '--compile-plan',
+				os.path.join(self.tmpdir, 'plan.sh')])
+		self.assertEqual(status, 2)
+		self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+				'plan.sh')))
+
+	def test_trace(self):
+		## A plugin would run for real during a replay, and would be
+		## missing from a recorded trace
+		args = ['-i', self.write_file('trace.if',
+				'iface dummy0 inet test\n'), 'dummy0', '-n']
+		trace = os.path.join(self.tmpdir, 'trace.json')
+		for option in ('--record', '--replay'):
+			status, _ = fixtures.run_command('ifup', args +
+					[option, trace])
+			self.assertEqual(status, 2)
+			self.assertFalse(os.path.exists(trace))
+
+		## Without the plugins, the trace can be used as usual
+		for option in ('--record', '--replay'):
+			status, _ = fixtures.run_command('ifup', args +
+					['--no-scripts', option, trace])
+			self.assertEqual(status, 0)
+			self.assertTrue(os.path.exists(trace))
+		self.assertEqual(plugins._load_module(os.path.join(self.tmpdir,
+				'if-up.d', 'b-count.py')).CALLS, [])
+
+
+class EntryPointTestCase(fixtures.TempDirTestCase):
+	"""Hooks from installed packages are only found when asked for"""
+	def setUp(self):
+		super(EntryPointTestCase, self).setUp()
+		self.set_args(verbose=False)
+		self.use_config_dir(self.tmpdir)
+		self.addCleanup(setattr, state, 'STATE_FILE', state.STATE_FILE)
+		state.STATE_FILE = os.path.join(self.tmpdir, 'ifstate')
+		for name in ('ENTRY_POINTS', '_ENTRY_POINTS'):
+			self.addCleanup(setattr, plugins, name,
+					getattr(plugins, name))
+		self.calls = []
+		plugin = imp.new_module('hook')
+		plugin.up = lambda context: self.calls.append(context.ifname)
+		plugins._ENTRY_POINTS = [('50-hook', 'hook = hook', plugin)]
+
+	def run_ifup(self, *args):
+		status, output = fixtures.run_command('ifup', ['-i',
+				self.write_file('interfaces',
+					'iface dummy0 inet test\n'),
+				'dummy0'] + list(args))
+		self.assertEqual(status, 0)
+		return output
+
+	def test_disabled(self):
+		self.run_ifup()
+		self.assertFalse(plugins.ENTRY_POINTS)
+		self.assertEqual(self.calls, [])
+
+	def test_enabled(self):
+		self.run_ifup('--entry-point-hooks')
+		self.assertTrue(plugins.ENTRY_POINTS)
+		self.assertEqual(self.calls, ['dummy0'])
+
+		## Disabling every hook wins
+		del self.calls[:]
+		self.run_ifup('--entry-point-hooks', '--no-scripts')
+		self.assertFalse(plugins.ENTRY_POINTS)
+		self.assertEqual(self.calls, [])
+
+	def test_no_import(self):
+		## Nothing is looked up (and pkg_resources is not imported)
+		## unless entry points are enabled
+		plugins._ENTRY_POINTS = None
+		saved = sys.modules.pop('pkg_resources', None)
+		if saved is not None:
+			self.addCleanup(sys.modules.__setitem__,
+					'pkg_resources', saved)
+		plugins.ENTRY_POINTS = False
+		self.assertEqual(plugins.list_plugins(self.tmpdir, 'up'), [])
+		self.assertNotIn('pkg_resources', sys.modules)
+		self.assertIs(plugins._ENTRY_POINTS, None)
+
+
+if __name__ == '__main__':
+	unittest.main()
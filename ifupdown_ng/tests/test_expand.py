@@ -0,0 +1,162 @@
+"""
+ifupdown_ng.tests.test_expand  -  Tests for "source" path expansion
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import glob
+import os
+import shutil
+import unittest
+
+from ifupdown_ng.config import expand
+from ifupdown_ng.tests import fixtures
+
+## Created in the scratch directory (a trailing "/" makes a directory)
+NAMES = ('a', 'b', 'ab', 'abc', 'b1', 'b2', 'b10', 'c.conf', 'd.conf',
+		'.hidden', '.hidden.conf', 'sub/x1', 'sub/x2', 'sub/.x3',
+		'sub2/x1', 'sub2/y1', 'empty/')
+
+
+class GlobTestCase(fixtures.TempDirTestCase):
+	"""Match patterns as glob.glob would, from cached listings"""
+	def setUp(self):
+		super(GlobTestCase, self).setUp()
+		for name in NAMES:
+			if name.endswith('/'):
+				os.mkdir(os.path.join(self.tmpdir, name))
+			else:
+				self.write_file(name, '')
+
+	def glob(self, pattern, scanned=None):
+		paths = expand.glob(os.path.join(self.tmpdir, pattern),
+				scanned)
+		return [os.path.relpath(path, self.tmpdir) for path in paths]
+
+	def test_star(self):
+		self.assertEqual(self.glob('a*'), ['a', 'ab', 'abc'])
+		self.assertEqual(self.glob('*.conf'), ['c.conf', 'd.conf'])
+		self.assertEqual(self.glob('sub*/x*'), ['sub/x1', 'sub/x2',
+				'sub2/x1'])
+
+	def test_question(self):
+		self.assertEqual(self.glob('b?'), ['b1', 'b2'])
+		self.assertEqual(self.glob('?b*'), ['ab', 'abc'])
+
+	def test_brackets(self):
+		self.assertEqual(self.glob('b[12]'), ['b1', 'b2'])
+		self.assertEqual(self.glob('b[0-9]*'), ['b1', 'b10', 'b2'])
+		self.assertEqual(self.glob('b[!1]'), ['b2'])
+		self.assertEqual(self.glob('[cd].conf'), ['c.conf', 'd.conf'])
+
+	def test_hidden(self):
+		## Only a pattern starting with "." matches hidden names
+		self.assertNotIn('.hidden', self.glob('*'))
+		self.assertEqual(self.glob('.h*'), ['.hidden', '.hidden.conf'])
+		self.assertEqual(self.glob('sub/?3'), [])
+		self.assertEqual(self.glob('sub/.x?'), ['sub/.x3'])
+
+	def test_no_match(self):
+		self.assertEqual(self.glob('z*'), [])
+		self.assertEqual(self.glob('empty/*'), [])
+		self.assertEqual(self.glob('missing/*'), [])
+		self.assertEqual(self.glob('*/missing'), [])
+
+		## A plain path is returned whether it exists or not
+		self.assertEqual(self.glob('missing'), ['missing'])
+
+	def test_sorted(self):
+		## Names are sorted as strings, like run-parts(8)
+		self.assertEqual(self.glob('*'), ['a', 'ab', 'abc', 'b', 'b1',
+				'b10', 'b2', 'c.conf', 'd.conf', 'empty',
+				'sub', 'sub2'])
+
+	def test_like_glob(self):
+		for pattern in ('*', '*.conf', '?', 'b?*', '[a-b]*', '[!a]*',
+				'*/*', 'sub/*', '*/x[0-9]', '.*', '*/.*',
+				'su?/*1', 'z*', '*[!0-9]'):
+			path = os.path.join(self.tmpdir, pattern)
+			self.assertEqual(expand.glob(path),
+					sorted(glob.glob(path)), pattern)
+
+	def test_scanned(self):
+		scanned = []
+		self.glob('sub*/x*', scanned)
+		self.assertEqual(scanned, [self.tmpdir, os.path.join(
+				self.tmpdir, 'sub'), os.path.join(self.tmpdir,
+				'sub2')])
+
+
+class ListingCacheTestCase(fixtures.TempDirTestCase):
+	"""Directory listings are reused until the directory changes"""
+	def setUp(self):
+		super(ListingCacheTestCase, self).setUp()
+		self.write_file('a', '')
+		self.write_file('b', '')
+		self.addCleanup(expand._LISTING_CACHE.pop, self.tmpdir, None)
+
+	def touch_dir(self, offset):
+		## Move the modification time, which may otherwise not change
+		## within the resolution of the filesystem's timestamps
+		stat = os.stat(self.tmpdir)
+		os.utime(self.tmpdir, (stat.st_atime, stat.st_mtime + offset))
+
+	def glob_all(self):
+		return [os.path.basename(path) for path in
+				expand.glob(os.path.join(self.tmpdir, '*'))]
+
+	def test_cached(self):
+		self.assertEqual(expand.list_directory(self.tmpdir), ['a', 'b'])
+		key = expand._LISTING_CACHE[self.tmpdir][0]
+		expand._LISTING_CACHE[self.tmpdir] = (key, ['cached'])
+		self.assertEqual(expand.list_directory(self.tmpdir),
+				['cached'])
+
+	def test_changed(self):
+		self.assertEqual(expand.list_directory(self.tmpdir), ['a', 'b'])
+		self.write_file('c', '')
+		self.touch_dir(10)
+		self.assertEqual(expand.list_directory(self.tmpdir),
+				['a', 'b', 'c'])
+		self.assertEqual(self.glob_all(), ['a', 'b', 'c'])
+
+		os.unlink(os.path.join(self.tmpdir, 'a'))
+		self.touch_dir(-5)
+		self.assertEqual(self.glob_all(), ['b', 'c'])
+
+	def test_replaced(self):
+		## A new directory at the same path is listed again, even
+		## with the same modification time
+		self.assertEqual(expand.list_directory(self.tmpdir), ['a', 'b'])
+		stat = os.stat(self.tmpdir)
+		moved = self.tmpdir + '.old'
+		os.rename(self.tmpdir, moved)
+		self.addCleanup(shutil.rmtree, moved)
+		os.mkdir(self.tmpdir)
+		os.utime(self.tmpdir, (stat.st_atime, stat.st_mtime))
+		self.assertEqual(expand.list_directory(self.tmpdir), [])
+
+	def test_missing(self):
+		self.assertEqual(expand.list_directory(os.path.join(
+				self.tmpdir, 'missing')), [])
+		self.assertNotIn(os.path.join(self.tmpdir, 'missing'),
+				expand._LISTING_CACHE)
+
+
+if __name__ == '__main__':
+	unittest.main()
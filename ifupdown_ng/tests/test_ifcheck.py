@@ -0,0 +1,121 @@
+"""
+ifupdown_ng.tests.test_ifcheck  -  Tests for validating many config trees
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import os
+import unittest
+
+from ifupdown_ng.tests import fixtures
+
+VALID = '''\
+auto eth0
+iface eth0 inet static
+	address 192.0.2.1/24
+source /etc/network/interfaces.d/*
+'''
+
+## A generated file which no longer matches what the methods accept
+BROKEN = '''\
+auto eth0
+iface eth0 inet static
+	address 192.0.2.300/24
+'''
+
+## Only deprecated options, which are a warning
+DEPRECATED = '''\
+iface eth0 inet manual
+	post-up echo up
+'''
+
+
+class IfCheckTestCase(fixtures.TempDirTestCase):
+	"""The exit status reflects every tree which was checked"""
+	def write_tree(self, router, text):
+		self.write_file(os.path.join(router, 'etc/network/interfaces'),
+				text)
+		self.write_file(os.path.join(router,
+				'etc/network/interfaces.d/vlan'),
+				'iface vlan10 inet manual\n')
+		return os.path.join(self.tmpdir, router)
+
+	def check(self, *args):
+		status, output = fixtures.run_command('ifcheck', list(args))
+		records = [json.loads(line) for line in output.splitlines()]
+		results = dict((os.path.basename(record['root']), record)
+				for record in records[:-1])
+		return status, results, records[-1]['summary']
+
+	def test_valid(self):
+		status, results, summary = self.check(self.write_tree('r1',
+				VALID))
+		self.assertEqual(status, 0)
+		self.assertEqual(results['r1']['errors'], 0)
+		self.assertEqual(results['r1']['files'], 2)
+		self.assertEqual(results['r1']['stanzas'], 2)
+		self.assertEqual(summary['failed'], 0)
+
+	def test_broken(self):
+		status, results, summary = self.check(self.write_tree('r1',
+				BROKEN))
+		self.assertEqual(status, 1)
+		self.assertEqual(results['r1']['errors'], 1)
+		self.assertEqual(results['r1']['messages'][0]['line'], 3)
+		self.assertEqual(summary['failed'], 1)
+
+	def test_mixed(self):
+		## One broken tree fails the whole run, with any number of
+		## workers
+		self.write_tree('fleet/r1', VALID)
+		self.write_tree('fleet/r2', BROKEN)
+		self.write_tree('fleet/r3', VALID)
+		for jobs in ('1', '2'):
+			status, results, summary = self.check('-j', jobs,
+					os.path.join(self.tmpdir, 'fleet'))
+			self.assertEqual(status, 1)
+			self.assertEqual(sorted(results), ['r1', 'r2', 'r3'])
+			self.assertEqual(dict((name, results[name]['errors'])
+					for name in results),
+					{'r1': 0, 'r2': 1, 'r3': 0})
+			self.assertEqual((summary['trees'], summary['failed'],
+					summary['errors']), (3, 1, 1))
+
+	def test_strict(self):
+		## Warnings only fail a tree with --strict
+		path = self.write_tree('r1', DEPRECATED)
+		status, results, _ = self.check(path)
+		self.assertEqual(status, 0)
+		self.assertEqual(results['r1']['warnings'], 1)
+		self.assertEqual(self.check('--strict', path)[0], 1)
+
+	def test_missing(self):
+		status, output = fixtures.run_command('ifcheck',
+				[os.path.join(self.tmpdir, 'missing')])
+		self.assertEqual(status, 1)
+		self.assertEqual(json.loads(output.splitlines()[0])['errors'],
+				1)
+
+	def test_usage(self):
+		self.assertEqual(fixtures.run_command('ifcheck', ['-j', '-1',
+				self.tmpdir])[0], 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
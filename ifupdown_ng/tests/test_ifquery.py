@@ -0,0 +1,124 @@
+"""
+ifupdown_ng.tests.test_ifquery  -  Tests for the ifquery output formats
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import unittest
+
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+auto lo eth0
+allow-critical vlan10
+allow-hotplug eth1
+
+iface lo inet loopback
+
+iface eth0 inet static
+	address 192.0.2.1/24
+	up echo one\ttwo
+
+iface eth0 inet6 auto
+
+iface eth1 inet dhcp
+
+iface vlan10 inet manual
+'''
+
+
+class QueryTestCase(fixtures.TempDirTestCase):
+	"""List and display interfaces in each output format"""
+	def setUp(self):
+		super(QueryTestCase, self).setUp()
+		self.interfaces = self.write_file('query.if', INTERFACES)
+		self.fingerprints = dict(((config.name,
+				config.address_family), config.fingerprint)
+			for configs in self.load_config(INTERFACES)
+				.configs_by_name(['eth0', 'eth1']).values()
+			for config in configs)
+
+	def query(self, *args):
+		return fixtures.run_command('ifquery', ['-i', self.interfaces]
+				+ list(args))
+
+	def test_list(self):
+		self.assertEqual(self.query('--list'),
+				(0, 'eth0\nlo\nvlan10\n'))
+		self.assertEqual(self.query('--list', '--allow', 'hotplug'),
+				(0, 'eth1\n'))
+
+	def test_text(self):
+		## Only the options are shown, so eth1 has no lines at all
+		self.assertEqual(self.query('eth0', 'eth1'), (0,
+				'address: 192.0.2.1/24\nup: echo one\ttwo\n'))
+		self.assertEqual(self.query('--fingerprint', 'eth1'), (0,
+				'%s  eth1 inet dhcp\n'
+				% self.fingerprints['eth1', 'inet']))
+
+	def test_json(self):
+		status, output = self.query('--format', 'json', 'eth0',
+				'eth1')
+		self.assertEqual(status, 0)
+		records = [json.loads(line) for line in output.splitlines()]
+		self.assertEqual([(record['iface'], record['address_family'],
+				record['method']) for record in records], [
+			('eth0', 'inet', 'static'),
+			('eth0', 'inet6', 'auto'),
+			('eth1', 'inet', 'dhcp'),
+		])
+		self.assertEqual(records[0]['options'], {
+			'address': '192.0.2.1/24',
+			'up': ['echo one\ttwo'],
+		})
+		self.assertEqual(records[2]['fingerprint'],
+				self.fingerprints['eth1', 'inet'])
+		self.assertNotIn('state', records[0])
+
+	def test_tsv(self):
+		status, output = self.query('--format', 'tsv', 'eth1',
+				'eth0')
+		self.assertEqual(status, 0)
+		self.assertEqual([line.split('\t')
+			for line in output.splitlines()], [
+			['eth1', 'eth1', 'inet', 'dhcp',
+				self.fingerprints['eth1', 'inet']],
+			['eth0', 'eth0', 'inet', 'static',
+				self.fingerprints['eth0', 'inet'],
+				'address=192.0.2.1/24', 'up=echo one\\ttwo'],
+			['eth0', 'eth0', 'inet6', 'auto',
+				self.fingerprints['eth0', 'inet6']],
+		])
+
+	def test_mapped(self):
+		## "IFACE=CONFIG" looks up the config under the given name
+		status, output = self.query('--format', 'tsv', 'eth9=eth1')
+		self.assertEqual(status, 0)
+		self.assertEqual(output.split('\t')[:2], ['eth9', 'eth1'])
+
+	def test_unknown(self):
+		## The other interfaces are still written
+		status, output = self.query('--format', 'tsv', 'eth7', 'eth1')
+		self.assertEqual(status, 1)
+		self.assertEqual([line.split('\t')[0]
+			for line in output.splitlines()], ['eth1'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,131 @@
+"""
+ifupdown_ng.tests.test_linkwait  -  Tests for event-driven carrier waits
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+from ifupdown_ng import linkwait
+from ifupdown_ng import netlink
+from ifupdown_ng.tests import fixtures
+
+## The flags of a link which is up and has a carrier
+CARRIER = netlink.IFF_UP | netlink.IFF_LOWER_UP
+
+
+class LinkWaiterTestCase(unittest.TestCase):
+	"""Wait for carrier from a dump and then link notifications"""
+	def setUp(self):
+		## eth0 has a carrier, eth1 and eth2 are up without one
+		self.transport = netlink.RecordedNetlink([
+			fixtures.new_link(1, 1, 'eth0', flags=CARRIER) +
+			fixtures.new_link(1, 2, 'eth1') +
+			fixtures.new_link(1, 3, 'eth2') +
+			fixtures.done(1),
+		])
+		self.waiter = linkwait.LinkWaiter(self.transport)
+		self.addCleanup(self.waiter.close)
+
+	def notify(self, index, name, flags):
+		## Notifications are not replies, so they have no sequence
+		self.transport.feed(fixtures.new_link(0, index, name, flags))
+
+	def notify_later(self, delay, index, name, flags):
+		timer = threading.Timer(delay, self.notify,
+				(index, name, flags))
+		timer.start()
+		self.addCleanup(timer.join)
+		self.addCleanup(timer.cancel)
+
+	def test_already_up(self):
+		start = time.time()
+		self.assertTrue(self.waiter.wait('eth0', 5))
+		self.assertLess(time.time() - start, 1)
+		self.assertEqual(self.waiter.carrier, {'eth0': True,
+				'eth1': False, 'eth2': False})
+
+		## Only the priming dump was requested
+		self.assertEqual(len(self.transport.sent), 1)
+		msg_type, flags = netlink.NLMSGHDR.unpack_from(
+				self.transport.sent[0])[1:3]
+		self.assertEqual(msg_type, netlink.RTM_GETLINK)
+		self.assertEqual(flags & netlink.NLM_F_DUMP,
+				netlink.NLM_F_DUMP)
+
+	def test_comes_up(self):
+		self.notify_later(0.1, 2, 'eth1', CARRIER)
+		start = time.time()
+		self.assertTrue(self.waiter.wait('eth1', 5))
+		self.assertGreaterEqual(time.time() - start, 0.09)
+		self.assertLess(time.time() - start, 2)
+
+	def test_timeout(self):
+		start = time.time()
+		self.assertFalse(self.waiter.wait('eth1', 0.2))
+		self.assertGreaterEqual(time.time() - start, 0.19)
+		self.assertLess(time.time() - start, 1)
+
+		## A link which is not in the dump is treated the same way
+		self.assertFalse(self.waiter.wait('eth9', 0))
+
+	def test_lost(self):
+		## A carrier which goes away is waited for again (once the
+		## notification has been read by some other wait)
+		self.notify(1, 'eth0', netlink.IFF_UP)
+		self.assertFalse(self.waiter.wait('eth1', 0.1))
+		self.assertFalse(self.waiter.carrier['eth0'])
+		self.assertFalse(self.waiter.wait('eth0', 0.1))
+		self.notify_later(0.1, 1, 'eth0', CARRIER)
+		self.assertTrue(self.waiter.wait('eth0', 5))
+
+	def test_wait_all(self):
+		self.notify_later(0.1, 2, 'eth1', CARRIER)
+		self.assertEqual(self.waiter.wait_all({'eth0': 5, 'eth1': 5,
+				'eth2': 0.3}), {'eth0': True, 'eth1': True,
+				'eth2': False})
+
+	def test_concurrent(self):
+		## A later waiter with a shorter deadline does not have to
+		## wait for the poll of the earlier one
+		results = dict()
+		def wait_long():
+			results['eth1'] = self.waiter.wait('eth1', 5)
+		thread = threading.Thread(target=wait_long)
+		thread.start()
+		try:
+			for _ in xrange(500):
+				if self.waiter._pumping:
+					break
+				time.sleep(0.01)
+			self.assertTrue(self.waiter._pumping)
+
+			start = time.time()
+			self.assertFalse(self.waiter.wait('eth2', 0.2))
+			self.assertLess(time.time() - start, 1)
+			self.assertNotIn('eth1', results)
+		finally:
+			self.notify(2, 'eth1', CARRIER)
+			thread.join()
+		self.assertEqual(results, {'eth1': True})
+
+
+if __name__ == '__main__':
+	unittest.main()
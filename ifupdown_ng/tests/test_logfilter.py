@@ -0,0 +1,150 @@
+"""
+ifupdown_ng.tests.test_logfilter  -  Tests for log counting and JSON logs
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+import StringIO
+import sys
+import unittest
+
+from ifupdown_ng import logfilter
+from ifupdown_ng.tests import fixtures
+
+
+class LoggerTestCase(unittest.TestCase):
+	"""Log through a private logger with a StringIO handler"""
+	def setUp(self):
+		self.logger = logging.getLogger('ifupdown_ng.tests.%s'
+				% self.id())
+		self.logger.propagate = False
+		self.logger.setLevel(logging.DEBUG)
+		self.stream = StringIO.StringIO()
+		self.handler = logging.StreamHandler(self.stream)
+		self.logger.addHandler(self.handler)
+		self.addCleanup(self.logger.removeHandler, self.handler)
+
+
+class LogCountTestCase(LoggerTestCase):
+	"""Count the messages of each level which reach a handler"""
+	def setUp(self):
+		super(LogCountTestCase, self).setUp()
+		self.count = logfilter.LogCount()
+		self.handler.addFilter(self.count)
+
+	def test_levels(self):
+		self.logger.debug('a')
+		self.logger.info('b')
+		self.logger.warning('c')
+		self.logger.warning('d')
+		self.logger.error('e')
+		self.logger.log(logging.ERROR + 5, 'f')
+		self.logger.critical('g')
+		self.assertEqual([self.count.nr_logs(level) for level in (
+				logging.DEBUG, logging.INFO, logging.WARNING,
+				logging.ERROR, logging.ERROR + 5,
+				logging.CRITICAL, logging.NOTSET)],
+				[1, 1, 2, 1, 1, 1, 0])
+		self.assertEqual(self.count.nr_logs_above(logging.NOTSET), 7)
+		self.assertEqual(self.count.nr_logs_above(logging.WARNING), 5)
+		self.assertEqual(self.count.nr_logs_above(logging.ERROR), 3)
+		self.assertEqual(self.count.nr_logs_above(logging.ERROR + 1),
+				2)
+		self.assertEqual(self.count.nr_logs_above(logging.ERROR + 6),
+				1)
+
+		self.count.clear_nr_logs()
+		self.assertEqual(self.count.nr_logs_above(logging.NOTSET), 0)
+		self.assertEqual(self.count.nr_logs(logging.ERROR + 5), 0)
+
+	def test_filtered(self):
+		## Only the messages which reach the handler are counted
+		self.handler.setLevel(logging.WARNING)
+		self.logger.info('a')
+		self.logger.warning('b')
+		self.assertEqual(self.count.nr_logs(logging.INFO), 0)
+		self.assertEqual(self.count.nr_logs(logging.WARNING), 1)
+
+
+class JSONFormatterTestCase(LoggerTestCase):
+	"""Write each record as a line of JSON"""
+	def setUp(self):
+		super(JSONFormatterTestCase, self).setUp()
+		self.handler.setFormatter(logfilter.JSONFormatter())
+
+	def records(self):
+		return [json.loads(line)
+			for line in self.stream.getvalue().splitlines()]
+
+	def test_fields(self):
+		self.logger.warning('%d %s', 3, 'x')
+		logfilter.ContextAdapter(self.logger, interface='eth0',
+				phase='up').error('failed')
+		plain, tagged = self.records()
+		self.assertEqual(sorted(plain), ['level', 'logger', 'message',
+				'time'])
+		self.assertEqual((plain['level'], plain['logger'],
+				plain['message']), ('WARNING',
+				self.logger.name, '3 x'))
+		self.assertIsInstance(plain['time'], float)
+		self.assertEqual(dict((key, tagged[key]) for key in (
+				'interface', 'phase', 'level', 'message')),
+				{'interface': 'eth0', 'phase': 'up',
+				'level': 'ERROR', 'message': 'failed'})
+
+	def test_exception(self):
+		try:
+			raise KeyError('x')
+		except KeyError:
+			self.logger.exception('lookup failed')
+		record, = self.records()
+		self.assertEqual(record['message'], 'lookup failed')
+		self.assertTrue(record['exception'].startswith(
+				'Traceback (most recent call last):\n'))
+		self.assertTrue(record['exception'].endswith("KeyError: 'x'"))
+		self.assertNotIn('\n', self.stream.getvalue().rstrip('\n'))
+
+
+class LogJSONTestCase(fixtures.TempDirTestCase):
+	"""Config file messages carry their file and line with "--log-json" """
+	def test_command(self):
+		interfaces = self.write_file('json.if', 'auto eth0\n'
+				'iface eth0 inet bogus\n')
+		path = os.path.join(self.tmpdir, 'log.json')
+		status, output = fixtures.run_command('ifquery', ['--list',
+				'-i', interfaces, '--log-level', 'WARNING',
+				'--log-json', path])
+		self.assertEqual((status, output), (0, 'eth0\n'))
+		with open(path) as jfile:
+			records = [json.loads(line) for line in jfile]
+		self.assertEqual([(record['level'], record['message'],
+				record.get('file'), record.get('line'))
+				for record in records], [
+			('WARNING', 'Unknown method for eth0: inet bogus',
+				interfaces, 2),
+			('WARNING', 'Unsafe config: 1 warnings', None, None),
+		])
+		self.assertNotIn(path, [getattr(handler, 'baseFilename', None)
+			for handler in logging.getLogger().handlers])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,298 @@
+"""
+ifupdown_ng.tests.test_methods  -  Tests for method operations and backends
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import socket
+import StringIO
+import unittest
+
+from ifupdown_ng import execute
+from ifupdown_ng import methods
+from ifupdown_ng import netlink
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+iface eth0 inet static
+	address 192.0.2.1/24
+	gateway 192.0.2.254
+	mtu 9000
+
+iface eth0 inet6 static
+	address 2001:db8::1/64
+	gateway 2001:db8::fe
+	metric 100
+
+iface tun0 inet static
+	address 10.0.0.1
+	pointopoint 10.0.0.2
+'''
+
+
+def decode(datagram):
+	"""Return (msg_type, flags, seq, payload) for each message sent"""
+	buf = bytearray(datagram)
+	return [(msg_type, flags, seq, bytes(buf[offset:end]))
+		for msg_type, flags, seq, offset, end
+		in netlink.iter_messages(buf, len(buf))]
+
+def decode_attrs(payload, header_size):
+	"""Return a dict of the attributes after a fixed-size header"""
+	buf = bytearray(payload)
+	return dict((attr, bytes(buf[offset:end]))
+		for attr, offset, end
+		in netlink.iter_attrs(buf, header_size, len(buf)))
+
+
+class OperationTestCase(unittest.TestCase):
+	"""Encode operations as rtnetlink requests and ip(8) commands"""
+	def test_link(self):
+		operation = methods.LinkChange('eth0', True, 9000)
+		self.assertEqual(operation.argv(), ['ip', 'link', 'set', 'dev',
+				'eth0', 'up', 'mtu', '9000'])
+		msg_type, flags, payload = operation.request(5)
+		self.assertEqual((msg_type, flags), (netlink.RTM_NEWLINK, 0))
+		self.assertEqual(netlink.IFINFOMSG.unpack_from(payload),
+				(socket.AF_UNSPEC, 0, 5, netlink.IFF_UP,
+					netlink.IFF_UP))
+		attrs = decode_attrs(payload, netlink.IFINFOMSG.size)
+		self.assertEqual(attrs, {netlink.IFLA_MTU:
+				netlink.U32.pack(9000)})
+
+		## Taking the link down leaves the MTU alone
+		operation = operation.inverse()
+		self.assertEqual(operation.argv(), ['ip', 'link', 'set', 'dev',
+				'eth0', 'down'])
+		msg_type, flags, payload = operation.request(5)
+		self.assertEqual(netlink.IFINFOMSG.unpack_from(payload),
+				(socket.AF_UNSPEC, 0, 5, 0, netlink.IFF_UP))
+		self.assertEqual(len(payload), netlink.IFINFOMSG.size)
+
+	def test_address(self):
+		operation = methods.AddressChange('eth0', True, 'inet',
+				'192.0.2.1', 24, '192.0.2.255')
+		self.assertEqual(operation.argv(), ['ip', 'addr', 'add',
+				'192.0.2.1/24', 'broadcast', '192.0.2.255',
+				'dev', 'eth0'])
+		msg_type, flags, payload = operation.request(5)
+		self.assertEqual((msg_type, flags), (netlink.RTM_NEWADDR,
+				netlink.NLM_F_CREATE | netlink.NLM_F_EXCL))
+		self.assertEqual(netlink.IFADDRMSG.unpack_from(payload),
+				(socket.AF_INET, 24, 0,
+					netlink.RT_SCOPE_UNIVERSE, 5))
+		local = socket.inet_aton('192.0.2.1')
+		self.assertEqual(decode_attrs(payload, netlink.IFADDRMSG.size),
+				{netlink.IFA_LOCAL: local,
+				netlink.IFA_ADDRESS: local,
+				netlink.IFA_BROADCAST:
+					socket.inet_aton('192.0.2.255')})
+
+		operation = operation.inverse()
+		self.assertEqual(operation.argv()[:3], ['ip', 'addr', 'del'])
+		msg_type, flags, _ = operation.request(5)
+		self.assertEqual((msg_type, flags), (netlink.RTM_DELADDR, 0))
+
+	def test_peer_address(self):
+		operation = methods.AddressChange('tun0', True, 'inet',
+				'10.0.0.1', 32, peer='10.0.0.2')
+		self.assertEqual(operation.argv(), ['ip', 'addr', 'add',
+				'10.0.0.1/32', 'peer', '10.0.0.2', 'dev',
+				'tun0'])
+		attrs = decode_attrs(operation.request(7)[2],
+				netlink.IFADDRMSG.size)
+		self.assertEqual(attrs[netlink.IFA_LOCAL],
+				socket.inet_aton('10.0.0.1'))
+		self.assertEqual(attrs[netlink.IFA_ADDRESS],
+				socket.inet_aton('10.0.0.2'))
+		self.assertNotIn(netlink.IFA_BROADCAST, attrs)
+
+	def test_route(self):
+		operation = methods.RouteChange('eth0', True, 'inet6',
+				'2001:db8::fe', 100)
+		self.assertEqual(operation.argv(), ['ip', 'route', 'add',
+				'default', 'via', '2001:db8::fe', 'metric',
+				'100', 'dev', 'eth0'])
+		msg_type, flags, payload = operation.request(5)
+		self.assertEqual((msg_type, flags), (netlink.RTM_NEWROUTE,
+				netlink.NLM_F_CREATE | netlink.NLM_F_EXCL))
+		self.assertEqual(netlink.RTMSG.unpack_from(payload),
+				(socket.AF_INET6, 0, 0, 0,
+					netlink.RT_TABLE_MAIN,
+					netlink.RTPROT_BOOT,
+					netlink.RT_SCOPE_UNIVERSE,
+					netlink.RTN_UNICAST, 0))
+		self.assertEqual(decode_attrs(payload, netlink.RTMSG.size), {
+			netlink.RTA_GATEWAY: socket.inet_pton(socket.AF_INET6,
+				'2001:db8::fe'),
+			netlink.RTA_OIF: netlink.U32.pack(5),
+			netlink.RTA_PRIORITY: netlink.U32.pack(100),
+		})
+
+		## A deletion matches a route of any protocol, scope and type
+		operation = operation.inverse()
+		msg_type, flags, payload = operation.request(5)
+		self.assertEqual((msg_type, flags), (netlink.RTM_DELROUTE, 0))
+		self.assertEqual(netlink.RTMSG.unpack_from(payload),
+				(socket.AF_INET6, 0, 0, 0,
+					netlink.RT_TABLE_MAIN, 0,
+					netlink.RT_SCOPE_NOWHERE, 0, 0))
+
+
+class NetlinkBackendTestCase(fixtures.TempDirTestCase):
+	"""Apply the operations of stanzas through a FakeNetlinkPeer"""
+	def setUp(self):
+		super(NetlinkBackendTestCase, self).setUp()
+		self.set_args(verbose=False)
+		self.stanzas = self.load_config(INTERFACES).configs_by_name(
+				['eth0', 'tun0'])
+
+	def operations(self, mode, ifname):
+		## Stanzas are stopped in the reverse order
+		configs = self.stanzas[ifname]
+		if mode == 'stop':
+			configs = reversed(configs)
+		return [operation for config in configs
+			for operation in methods.get_method(
+				config.address_family,
+				config.method).operations(mode, ifname, config)]
+
+	def test_apply(self):
+		peer = netlink.FakeNetlinkPeer(links={'eth0': 5})
+		backend = methods.NetlinkBackend(peer)
+		operations = self.operations('start', 'eth0')
+		self.assertEqual(backend.apply('eth0', operations),
+				[0] * len(operations))
+
+		## The ifindex is looked up, then everything is sent at once
+		self.assertEqual(len(peer.sent), 2)
+		lookup = decode(peer.sent[0])
+		self.assertEqual([msg[0] for msg in lookup],
+				[netlink.RTM_GETLINK])
+		batch = decode(peer.sent[1])
+		self.assertEqual([msg_type for msg_type, _, _, _ in batch], [
+			netlink.RTM_NEWLINK, netlink.RTM_NEWADDR,
+			netlink.RTM_NEWROUTE,
+			netlink.RTM_NEWLINK, netlink.RTM_NEWADDR,
+			netlink.RTM_NEWROUTE,
+		])
+		self.assertEqual([seq for _, _, seq, _ in batch], range(2, 8))
+		for (msg_type, flags, _, payload), operation in zip(batch,
+				operations):
+			expected = operation.request(5)
+			self.assertEqual(flags, expected[1] |
+					netlink.NLM_F_REQUEST |
+					netlink.NLM_F_ACK)
+			self.assertEqual((msg_type, payload),
+					(expected[0], expected[2]))
+		backend.close()
+
+	def test_errors(self):
+		peer = netlink.FakeNetlinkPeer(links={'eth0': 5}, errors={
+			netlink.RTM_NEWADDR: errno.EEXIST,
+		})
+		backend = methods.NetlinkBackend(peer)
+		self.assertEqual(backend.apply('eth0',
+				self.operations('start', 'eth0')),
+				[0, errno.EEXIST, 0, 0, errno.EEXIST, 0])
+
+		## A missing interface fails before anything is sent
+		with self.assertRaises(netlink.NetlinkError) as ctx:
+			backend.apply('eth1', self.operations('start', 'eth0'))
+		self.assertEqual(ctx.exception.errno, errno.ENODEV)
+		self.assertEqual(len(peer.sent), 3)
+		backend.close()
+
+	def test_same_commands(self):
+		## "-v" prints the same commands with either backend
+		for mode in ('start', 'stop'):
+			for ifname in ('eth0', 'tun0'):
+				self.check_same_commands(mode, ifname)
+
+	def check_same_commands(self, mode, ifname):
+		commands = StringIO.StringIO()
+		executor = execute.Executor(mode, act=False, scripts=False,
+				output=commands)
+		self.assertTrue(executor.run(ifname, self.stanzas[ifname]))
+
+		output = StringIO.StringIO()
+		peer = netlink.FakeNetlinkPeer(links={ifname: 9})
+		executor = execute.Executor(mode, verbose=True, scripts=False,
+				output=output,
+				backend=methods.NetlinkBackend(peer))
+		self.assertTrue(executor.run(ifname, self.stanzas[ifname]))
+		self.assertEqual(output.getvalue(), commands.getvalue())
+		self.assertTrue(commands.getvalue().startswith('ip '))
+
+		## Each printed command is the one which was applied (with
+		## an ifindex lookup for each stanza)
+		applied = [(msg_type, payload) for sent in peer.sent
+			for msg_type, _, _, payload in decode(sent)
+			if msg_type != netlink.RTM_GETLINK]
+		expected = [operation.request(9)
+			for operation in self.operations(mode, ifname)]
+		self.assertEqual(applied, [(msg_type, payload)
+			for msg_type, _, payload in expected])
+		self.assertEqual([' '.join(operation.argv())
+			for operation in self.operations(mode, ifname)],
+			commands.getvalue().splitlines())
+
+
+class DhcpTestCase(fixtures.TempDirTestCase):
+	"""Start dhclient(8), warning about options it cannot use"""
+	def test_operations(self):
+		config = self.load_config('iface eth1 inet dhcp\n'
+				'\tmetric 10\n').configs_by_name(['eth1'])
+		config = config['eth1'][0]
+		self.assertEqual(self.config_messages, [])
+		start = methods.get_method('inet', 'dhcp').operations('start',
+				'eth1', config)
+		self.assertEqual(start[0].argv(), ['ip', 'link', 'set', 'dev',
+				'eth1', 'up'])
+		argv = start[1].argv()
+		self.assertEqual(argv[:3], ['dhclient', '-1', '-4'])
+		self.assertEqual(argv[-3:], ['-e', 'IF_METRIC=10', 'eth1'])
+
+		stop = methods.get_method('inet', 'dhcp').operations('stop',
+				'eth1', config)
+		self.assertEqual(stop[0].argv()[:3], ['dhclient', '-4', '-r'])
+		self.assertEqual(stop[1].argv()[-1], 'down')
+
+	def test_ignored(self):
+		self.load_config('iface eth1 inet dhcp\n'
+				'\thostname client1\n\tleasetime 3600\n'
+				'\tvendor acme\n\tclient 01:02\n'
+				'iface vlan[1-2] inet dhcp\n'
+				'\thostname host{N}\n')
+		self.assertEqual(sorted((msg['level'], msg['message'])
+				for msg in self.config_messages), [
+			('WARNING', '%s: Option %s is ignored by the inet dhcp '
+					'method' % (name, option))
+			for name, option in sorted([('eth1', 'client'),
+				('eth1', 'hostname'), ('eth1', 'leasetime'),
+				('eth1', 'vendor'), ('vlan[1-2]', 'hostname')])
+		])
+
+		## Invalid values are still errors
+		self.load_config('iface eth1 inet dhcp\n\tleasetime soon\n',
+				nr_errors=1)
+
+
+if __name__ == '__main__':
+	unittest.main()
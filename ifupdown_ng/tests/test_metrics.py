@@ -0,0 +1,298 @@
+"""
+ifupdown_ng.tests.test_metrics  -  Tests for Prometheus textfile metrics
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+import stat
+import unittest
+
+from ifupdown_ng import logfilter
+from ifupdown_ng import metrics
+from ifupdown_ng import simulate
+from ifupdown_ng import state
+from ifupdown_ng import trace
+from ifupdown_ng.tests import fixtures
+
+## One sample line: NAME{LABELS} VALUE
+SAMPLE_RE = re.compile(r'^([a-z_]+)\{(.*)\} (\S+)$')
+LABEL_RE = re.compile(r'([a-z_]+)="((?:[^"\\\n]|\\[\\"n])*)"(,|$)')
+UNESCAPES = {'\\\\': '\\', '\\"': '"', '\\n': '\n'}
+
+
+def _unescape(match):
+	return UNESCAPES[match.group()]
+
+def parse(text):
+	"""Check the text format strictly, and return the samples
+
+	Each metric must have one "# HELP" and then one "# TYPE" line
+	before its samples, and appear only once.  Returns a dict mapping
+	from (metric name, labels) to the value as a string, where the
+	labels are a sorted tuple of (name, unescaped value) pairs.
+	"""
+	assert text.endswith('\n'), 'no final newline'
+	samples = dict()
+	seen = []
+	for line in text.decode('utf-8').splitlines():
+		if line.startswith('# HELP '):
+			metric = line.split(' ', 3)[2]
+			assert metric not in seen, 'repeated %s' % metric
+			seen.append(metric)
+			expected = '# TYPE %s gauge' % metric
+			continue
+		if line.startswith('# TYPE '):
+			assert line == expected, line
+			expected = None
+			continue
+		assert expected is None, 'no TYPE for %s' % seen[-1]
+		match = SAMPLE_RE.match(line)
+		assert match and match.group(1) == seen[-1], line
+		labels, end = [], 0
+		for label in LABEL_RE.finditer(match.group(2)):
+			assert label.start() == end, line
+			end = label.end()
+			labels.append((label.group(1), re.sub(r'\\.', _unescape,
+					label.group(2))))
+		assert end == len(match.group(2)), line
+		float(match.group(3))
+		samples[(match.group(1), tuple(sorted(labels)))] = \
+				match.group(3)
+	return samples
+
+
+class FormatTestCase(unittest.TestCase):
+	"""Metrics are written in the Prometheus text format"""
+	def setUp(self):
+		self.collector = metrics.MetricsCollector('ifup')
+
+	def test_help_and_type(self):
+		## Only metrics with samples are written, in METRICS order
+		self.collector.set('ifupdown_config_stanzas', 3)
+		self.collector.set('ifupdown_run_exit_status', 0)
+		self.assertEqual(self.collector.format(),
+				'# HELP ifupdown_run_exit_status The exit '
+				'status of the command\n'
+				'# TYPE ifupdown_run_exit_status gauge\n'
+				'ifupdown_run_exit_status{command="ifup"} 0\n'
+				'# HELP ifupdown_config_stanzas "iface" '
+				'stanzas loaded\n'
+				'# TYPE ifupdown_config_stanzas gauge\n'
+				'ifupdown_config_stanzas{command="ifup"} 3\n')
+
+	def test_all_metrics(self):
+		for metric, _ in metrics.METRICS:
+			self.collector.set(metric, 1)
+		samples = parse(self.collector.format())
+		self.assertEqual(sorted(metric for metric, _ in samples),
+				sorted(metric for metric, _ in metrics.METRICS))
+
+	def test_labels(self):
+		## Samples are sorted by their labels, after the command
+		labels = (('interface', 'eth1'), ('phase', 'up'))
+		self.collector.set('ifupdown_phase_failed', False, labels)
+		self.collector.set('ifupdown_phase_failed', True,
+				(('interface', 'eth0'), ('phase', 'up')))
+		lines = self.collector.format().splitlines()[2:]
+		self.assertEqual(lines, [
+			'ifupdown_phase_failed{command="ifup",'
+				'interface="eth0",phase="up"} 1',
+			'ifupdown_phase_failed{command="ifup",'
+				'interface="eth1",phase="up"} 0',
+		])
+
+	def test_escaping(self):
+		name = u'a\\b"c\nd\xe9'
+		self.collector.command = 'if"up'
+		self.collector.set('ifupdown_commands', 1,
+				(('program', name),))
+		text = self.collector.format()
+		self.assertIn('{command="if\\"up",program="a\\\\b\\"c\\nd'
+				'\xc3\xa9"} 1\n', text)
+		labels = (('command', 'if"up'), ('program', name))
+		self.assertEqual(parse(text),
+				{('ifupdown_commands', labels): '1'})
+
+	def test_values(self):
+		self.collector.set('ifupdown_command_seconds', 0.1,
+				(('program', 'ip'),))
+		self.collector.set('ifupdown_command_seconds', 2.0,
+				(('program', 'sh'),))
+		self.collector.set('ifupdown_command_seconds', 1e-07,
+				(('program', 'x'),))
+		samples = parse(self.collector.format())
+		self.assertEqual(sorted(samples.values()),
+				['0.1', '1e-07', '2.0'])
+
+
+class CollectorTestCase(unittest.TestCase):
+	"""Completed spans are totalled up into metrics"""
+	def setUp(self):
+		self.tracer = trace.Tracer()
+		self.collector = metrics.MetricsCollector('ifup', self.tracer)
+		self.log_total = logfilter.LogCount()
+
+	def span(self, name, category, **args):
+		self.collector.span(name, category, **args).end()
+
+	def value(self, metric, **labels):
+		return self.collector.values[(metric,
+				tuple(sorted(labels.iteritems())))]
+
+	def test_commands(self):
+		self.span('ip link', 'exec', status=0)
+		self.span('ip addr', 'exec', status=2)
+		self.span('hook', 'exec', killed=True)
+		self.span('hook', 'exec', exception='OSError')
+		self.span('hook', 'exec')
+		self.collector.finish(0, self.log_total)
+		self.assertEqual((self.value('ifupdown_commands', program='ip'),
+				self.value('ifupdown_command_failures',
+					program='ip')), (2, 1))
+		self.assertEqual((self.value('ifupdown_commands',
+					program='hook'),
+				self.value('ifupdown_command_failures',
+					program='hook')), (3, 2))
+		self.assertGreaterEqual(self.value('ifupdown_command_seconds',
+				program='ip'), 0.0)
+
+		## Every span is passed on to the tracer as well
+		self.assertEqual(len(self.tracer.events), 5)
+
+	def test_interfaces(self):
+		self.span('up eth0', 'phase', iface='eth0', phase='up',
+				failed=True)
+		self.span('start eth0', 'iface', iface='eth0', failed=True)
+		self.span('start eth1', 'iface', iface='eth1')
+		self.assertIs(self.value('ifupdown_phase_failed',
+				interface='eth0', phase='up'), True)
+		self.assertIs(self.value('ifupdown_interface_failed',
+				interface='eth0'), True)
+		self.assertIs(self.value('ifupdown_interface_failed',
+				interface='eth1'), False)
+
+	def test_totals(self):
+		self.span('mapping eth0', 'mapping', status=0)
+		self.span('mapping eth1', 'mapping', status=1)
+		self.span('link-wait eth0', 'wait', carrier=False)
+		self.span('plugin', 'hook')
+		self.span('load config', 'config', files=2, stanzas=5,
+				errors=1, warnings=0)
+		self.log_total.filter(logging.makeLogRecord(
+				dict(levelno=logging.ERROR)))
+		self.collector.finish(1, self.log_total)
+		for metric, value in (('ifupdown_mapping_runs', 2),
+				('ifupdown_mapping_failures', 1),
+				('ifupdown_link_waits', 1),
+				('ifupdown_link_wait_timeouts', 1),
+				('ifupdown_plugin_hooks', 1),
+				('ifupdown_plugin_hook_failures', 0),
+				('ifupdown_config_files', 2),
+				('ifupdown_config_stanzas', 5),
+				('ifupdown_config_errors', 1),
+				('ifupdown_run_exit_status', 1)):
+			self.assertEqual(self.value(metric), value, metric)
+		self.assertEqual(self.value('ifupdown_log_messages',
+				level='error'), 1)
+		self.assertEqual(self.value('ifupdown_log_messages',
+				level='debug'), 0)
+
+
+INTERFACES = '''\
+auto eth0 eth1
+iface eth0 inet static
+	address 192.0.2.1/24
+
+iface eth1 inet manual
+	up /usr/local/sbin/announce $IFACE
+'''
+
+
+class TextfileTestCase(fixtures.TempDirTestCase):
+	"""Each run atomically replaces the command's textfile"""
+	def setUp(self):
+		super(TextfileTestCase, self).setUp()
+		self.metrics_dir = os.path.join(self.tmpdir, 'textfile')
+		os.mkdir(self.metrics_dir)
+		self.path = os.path.join(self.metrics_dir,
+				'ifupdown-ng-ifup.prom')
+
+	def test_write(self):
+		collector = metrics.MetricsCollector('ifup')
+		collector.set('ifupdown_run_exit_status', 0)
+		self.write_file(self.path, 'old\n')
+		self.assertEqual(collector.write_textfile(self.metrics_dir),
+				self.path)
+		with open(self.path) as mfile:
+			self.assertEqual(mfile.read(), collector.format())
+		self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode),
+				0644)
+		self.assertEqual(os.listdir(self.metrics_dir),
+				['ifupdown-ng-ifup.prom'])
+
+	def test_failed_write(self):
+		## The temporary file is removed, and nothing is replaced
+		os.mkdir(self.path)
+		collector = metrics.MetricsCollector('ifup')
+		with self.assertRaises(EnvironmentError):
+			collector.write_textfile(self.metrics_dir)
+		self.assertEqual(os.listdir(self.metrics_dir),
+				['ifupdown-ng-ifup.prom'])
+		with self.assertRaises(EnvironmentError):
+			collector.write_textfile(os.path.join(self.tmpdir,
+					'missing'))
+
+	def test_command(self):
+		self.addCleanup(setattr, state, 'STATE_FILE', state.STATE_FILE)
+		state.STATE_FILE = os.path.join(self.tmpdir, 'ifstate')
+		system = simulate.SimulatedSystem({None: 0})
+		system.add_link('eth0')
+		system.add_link('eth1')
+		system.install()
+		self.addCleanup(system.uninstall)
+		status, _ = fixtures.run_command('ifup', ['-i',
+				self.write_file('interfaces', INTERFACES),
+				'--all', '--no-scripts', '--metrics-dir',
+				self.metrics_dir])
+		self.assertEqual(status, 0)
+		self.assertIs(trace.TRACER, None)
+		with open(self.path) as mfile:
+			samples = parse(mfile.read())
+		command = (('command', 'ifup'),)
+		self.assertEqual(samples[('ifupdown_run_exit_status',
+				command)], '0')
+		self.assertEqual(samples[('ifupdown_config_stanzas',
+				command)], '2')
+		self.assertEqual(samples[('ifupdown_config_errors',
+				command)], '0')
+		for ifname in ('eth0', 'eth1'):
+			self.assertEqual(samples[('ifupdown_interface_failed',
+					command + (('interface', ifname),))],
+					'0')
+		self.assertEqual(samples[('ifupdown_commands',
+				command + (('program', 'ip'),))],
+				str(system.spawns['ip']))
+		self.assertEqual(os.listdir(self.metrics_dir),
+				['ifupdown-ng-ifup.prom'])
+
+
+if __name__ == '__main__':
+	unittest.main()
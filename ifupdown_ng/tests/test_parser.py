@@ -0,0 +1,312 @@
+"""
+ifupdown_ng.tests.test_parser  -  Tests for the interfaces(5) parser
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import unittest
+
+from ifupdown_ng import simulate
+from ifupdown_ng.config import parser
+from ifupdown_ng.tests import fixtures
+
+
+class TemplateTestCase(fixtures.TempDirTestCase):
+	"""Validate "iface" stanzas for a range of names"""
+	def errors(self):
+		return [msg['message'] for msg in self.config_messages
+			if msg['level'] == 'ERROR']
+
+	def test_valid(self):
+		sysconfig = self.load_config('iface vlan[100-255] inet static\n'
+				'\taddress 10.0.{N}.1/24\n')
+		self.assertEqual(self.errors(), [])
+		self.assertEqual(sysconfig.configs_by_name(['vlan200'])[
+				'vlan200'][0].options['address'],
+				'10.0.200.1/24')
+
+	def test_last_invalid(self):
+		## Only the end of the range substitutes too large a number
+		self.load_config('iface vlan[100-4099] inet static\n'
+				'\taddress 10.0.{N}.1/24\n', nr_errors=1)
+		self.assertEqual(self.errors(), ['vlan[100-4099]: Invalid '
+				'value for option address: 10.0.4099.1/24'])
+
+	def test_missing(self):
+		## An error for every instance is only reported once
+		self.load_config('iface vlan[100-4099] inet static\n'
+				'\tmtu 9000\n', nr_errors=1)
+		self.assertEqual(self.errors(), ['vlan[100-4099]: Missing '
+				'required option: address'])
+
+	def test_error_line(self):
+		## Errors are reported at the "iface" line of the range, not
+		## where the stanza happens to end
+		self.load_config('auto lo\n'
+				'iface vlan[100-4099] inet static\n'
+				'\taddress 10.0.{N}.1/24\n'
+				'\tmtu 9000\n'
+				'\n'
+				'# comment\n'
+				'iface lo inet loopback\n', nr_errors=1)
+		self.assertEqual([(msg['line'], msg['message'])
+				for msg in self.config_messages],
+				[(2, 'vlan[100-4099]: Invalid value for option '
+					'address: 10.0.4099.1/24')])
+
+	def test_invalid_range(self):
+		## A stanza with an invalid range is skipped along with its
+		## options, rather than matching any config names
+		sysconfig = self.load_config('iface vlan[200-100] inet static\n'
+				'\taddress 10.0.{N}.1/24\n'
+				'iface vlan[1-2 inet static\n'
+				'\taddress 10.0.{N}.1/24\n'
+				'iface eth0 inet manual\n', nr_errors=2)
+		self.assertEqual(self.errors(), [
+				'Empty interface name range: vlan[200-100]',
+				'Invalid interface name range: vlan[1-2'])
+		self.assertEqual(sysconfig.templates, [])
+		self.assertEqual(sorted(sysconfig.configs_by_name(
+				['vlan100', 'vlan0', 'eth0'])), ['eth0'])
+
+
+class IncludeTestCase(fixtures.TempDirTestCase):
+	"""Follow "source" statements without loops or repeats"""
+	def messages(self, level):
+		return [(os.path.basename(msg['file']), msg['message'])
+			for msg in self.config_messages
+			if msg['level'] == level]
+
+	def test_diamond(self):
+		## Both "a" and "b" include "c", which is only parsed once,
+		## even when reached by another path
+		common = self.write_file('c', 'iface c0 inet manual\n')
+		os.symlink(common, os.path.join(self.tmpdir, 'c-link'))
+		self.write_file('a', 'source c\niface a0 inet manual\n')
+		self.write_file('b', 'source c-link\niface b0 inet manual\n')
+		sysconfig = self.load_config('source a\nsource b\n')
+		self.assertEqual(self.messages('ERROR'), [])
+		self.assertEqual(self.messages('WARNING'), [('b',
+				'Skipping duplicate include: %s' % os.path.join(
+					self.tmpdir, 'c-link'))])
+		self.assertEqual([os.path.basename(filename) for filename, _
+				in sysconfig.file_fingerprints],
+				['c', 'a', 'b', 'interfaces'])
+		self.assertEqual(sorted(config.name
+				for config in sysconfig.configs),
+				['a0', 'b0', 'c0'])
+
+	def test_cycle(self):
+		## The chain is shown from the first file in the cycle
+		path_a = self.write_file('a',
+				'source b\niface a0 inet manual\n')
+		path_b = self.write_file('b',
+				'source a\niface b0 inet manual\n')
+		sysconfig = self.load_config('source a\n', nr_errors=1)
+		self.assertEqual(self.messages('ERROR'), [('b',
+				'Include cycle: %s -> %s -> %s'
+				% (path_a, path_b, path_a))])
+		self.assertEqual(sorted(config.name
+				for config in sysconfig.configs), ['a0', 'b0'])
+
+	def test_self(self):
+		path = self.write_file('interfaces.d/self',
+				'source self\niface eth0 inet manual\n')
+		sysconfig = self.load_config('source interfaces.d/*\n',
+				nr_errors=1)
+		self.assertEqual(self.messages('ERROR'), [('self',
+				'Include cycle: %s -> %s' % (path, path))])
+		self.assertEqual(len(sysconfig.configs), 1)
+
+
+INDEXED = '''\
+auto lo eth0 vlan[100-102]
+allow-hotplug eth[1-3] wlan0
+allow-critical eth0
+
+mapping eth*
+	script /sbin/map-eth
+	map home
+
+mapping wlan0 eth2
+	script /sbin/map-wlan
+
+iface lo inet loopback
+
+iface eth0 inet static
+	address 192.0.2.1/24
+
+iface eth0 inet6 auto
+
+iface vlan[100-199] inet static
+	address 10.0.{N}.1/24
+
+iface vlan[150-249] inet static
+	address 10.1.{N}.1/24
+
+iface vlan[150-249] inet6 auto
+
+iface vlan101 inet manual
+
+iface home-eth1 inet dhcp
+
+source extra
+'''
+
+EXTRA = '''\
+allow-hotplug vlan200
+
+mapping vlan2*
+	script /sbin/map-vlan
+
+iface eth9 inet manual
+'''
+
+## Names covering the plain stanzas, each template, the overlap between
+## templates, a stanza which overrides a template, and mapped names
+NAMES = ('lo', 'eth0', 'eth1', 'eth2', 'eth3', 'eth9', 'wlan0', 'vlan99',
+		'vlan100', 'vlan101', 'vlan150', 'vlan199', 'vlan200',
+		'vlan249', 'vlan250', 'home-eth1', 'missing')
+
+
+class IndexTestCase(fixtures.TempDirTestCase):
+	"""The lookup indexes agree with a search of the parsed config"""
+	def setUp(self):
+		super(IndexTestCase, self).setUp()
+		self.write_file('extra', EXTRA)
+		self.sysconfig = self.load_config(INDEXED)
+
+	def search_configs(self, config_name):
+		## Every matching stanza, or else the first matching template
+		## for each address family and method
+		configs = [config for config in self.sysconfig.configs
+				if config.name == config_name]
+		if not configs:
+			keys = set()
+			for template in self.sysconfig.templates:
+				key = (template.address_family, template.method)
+				if key not in keys and config_name in \
+						template.names:
+					keys.add(key)
+					configs.append(template.instance(
+							template.names.number(
+								config_name)))
+		return sorted(configs, key=lambda config:
+				(config.address_family, config.method))
+
+	@staticmethod
+	def describe(configs, overrides=None):
+		return [(config.name, config.address_family, config.method,
+				sorted(dict(config.options,
+					**(overrides or {})).items()))
+			for config in configs]
+
+	def check_indexes(self, overrides=None):
+		sysconfig = self.sysconfig
+		by_name = sysconfig.configs_by_name(NAMES, overrides)
+		for name in NAMES:
+			expected = self.describe(self.search_configs(name),
+					overrides)
+			self.assertEqual(self.describe(
+					sysconfig.configs_for_name(name,
+						overrides)), expected, name)
+			self.assertEqual(self.describe(by_name.get(name, [])),
+					expected, name)
+
+			self.assertEqual(sysconfig.mapping_candidates(name),
+					[mapping for mapping
+						in sysconfig.mappings
+						if mapping.should_map(name)],
+					name)
+
+			for group in ('auto', 'hotplug', 'critical', 'none'):
+				members = sysconfig.allowed_interfaces([group])
+				self.assertEqual(sysconfig.is_allowed(name,
+						[group]), name in members,
+						(name, group))
+
+	def test_indexes(self):
+		self.assertEqual(self.config_messages, [])
+		self.check_indexes()
+		self.assertEqual(self.sysconfig.allowed_interfaces(['hotplug']),
+				['eth1', 'eth2', 'eth3', 'vlan200', 'wlan0'])
+		self.assertEqual(self.describe(self.sysconfig.configs_for_name(
+				'vlan150')), [
+			('vlan150', 'inet', 'static',
+				[('address', '10.0.150.1/24')]),
+			('vlan150', 'inet6', 'auto', [])])
+		self.assertEqual(len(self.sysconfig.mapping_candidates(
+				'eth2')), 2)
+
+	def test_overlay(self):
+		## Overlays leave the parsed stanzas and templates unchanged
+		before = dict((name, self.describe(
+				self.sysconfig.configs_for_name(name)))
+			for name in NAMES)
+		self.check_indexes({'mtu': '9000'})
+		self.check_indexes()
+		for name in NAMES:
+			self.assertEqual(self.describe(
+					self.sysconfig.configs_for_name(name)),
+					before[name])
+		self.assertNotIn('mtu', self.sysconfig.templates[0].options)
+
+	def test_mapping(self):
+		## Running the mapping scripts does not change the indexes
+		system = simulate.SimulatedSystem(mappings={
+			'/sbin/map-eth': lambda ifname, data: 'home-%s\n'
+				% ifname,
+			'/sbin/map-wlan': lambda ifname, data: '',
+			'/sbin/map-vlan': lambda ifname, data: 'vlan101\n',
+		})
+		messages = self.collect_log(parser.LOGGER)
+		system.install()
+		try:
+			mapped = dict((name, self.sysconfig.map_interface(name))
+					for name in NAMES)
+		finally:
+			system.uninstall()
+		self.assertEqual(mapped['eth1'], 'home-eth1')
+		self.assertEqual(mapped['wlan0'], 'wlan0')
+		self.assertEqual([msg['message'] for msg in messages],
+				['Mapping script succeeded with no output'])
+		self.assertEqual(mapped['vlan200'], 'vlan101')
+		self.assertEqual(self.describe(self.sysconfig.configs_for_name(
+				mapped['eth1'])),
+				[('home-eth1', 'inet', 'dhcp', [])])
+		self.check_indexes()
+
+	def test_reload(self):
+		## The indexes are rebuilt from scratch for another config
+		self.sysconfig.clear()
+		self.assertEqual(self.sysconfig.configs_by_name(NAMES), {})
+		self.assertEqual(self.sysconfig.mapping_candidates('eth1'), [])
+		self.assertFalse(self.sysconfig.is_allowed('eth0', ['auto']))
+
+		self.write_file('other', 'auto eth9\nsource extra\n')
+		self.sysconfig.load_interfaces_file(os.path.join(self.tmpdir,
+				'other'))
+		self.check_indexes()
+		self.assertEqual(sorted(self.sysconfig.configs_by_name(NAMES)),
+				['eth9'])
+		self.assertTrue(self.sysconfig.is_allowed('eth9', ['auto']))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+"""
+ifupdown_ng.tests.test_plan  -  Tests for compiled boot plans
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import unittest
+
+from ifupdown_ng import plan
+from ifupdown_ng.tests import fixtures
+
+
+class ConfigDirsTestCase(fixtures.TempDirTestCase):
+	"""Plans depend on the directories which config files came from"""
+	def setUp(self):
+		super(ConfigDirsTestCase, self).setUp()
+		self.write_file('parts/eth0', 'iface eth0 inet manual\n')
+		self.write_file('extra/a.cfg', 'iface eth1 inet manual\n')
+		self.write_file('extra/b.txt', 'iface eth2 inet manual\n')
+		self.sysconfig = self.load_config('source-directory parts\n'
+				'source extra/*.cfg\n')
+		self.parts = os.path.join(self.tmpdir, 'parts')
+		self.extra = os.path.join(self.tmpdir, 'extra')
+
+	def test_scanned_dirs(self):
+		interfaces = os.path.join(self.tmpdir, 'interfaces')
+		self.assertEqual(self.sysconfig.scanned_dirs, {
+			interfaces: [self.parts, self.extra],
+			os.path.join(self.parts, 'eth0'): [],
+			os.path.join(self.extra, 'a.cfg'): [],
+		})
+		self.assertEqual(sorted(self.sysconfig.stanzas_by_name),
+				['eth0', 'eth1'])
+
+	def test_check_dir(self):
+		path = os.path.join(self.tmpdir, 'plan.sh')
+		plan.PlanWriter(['false']).write(path,
+				self.sysconfig.file_fingerprints,
+				[self.parts, self.extra])
+		with open(path) as pfile:
+			lines = pfile.read().splitlines()
+		self.assertIn("check_dir %s '. .. eth0 '" % self.parts, lines)
+		self.assertIn("check_dir %s '. .. a.cfg b.txt '" % self.extra,
+				lines)
+		self.assertEqual(len([line for line in lines
+				if line.startswith('check_file ')]), 3)
+
+
+class FallbackTestCase(fixtures.TempDirTestCase):
+	"""A stale plan runs ifup with the options it was compiled with"""
+	def setUp(self):
+		super(FallbackTestCase, self).setUp()
+		self.interfaces = self.write_file('plan.if', 'auto eth0\n'
+				'iface eth0 inet static\n'
+				'\taddress 192.0.2.1/24\n')
+		self.path = os.path.join(self.tmpdir, 'plan.sh')
+
+	def compile_plan(self, *args):
+		## A relative config path is made absolute in the plan
+		status, _ = fixtures.run_command('ifup', ['--all',
+				'--no-scripts', '--compile-plan', self.path,
+				'-i', os.path.relpath(self.interfaces)] +
+				list(args))
+		return status
+
+	def test_options(self):
+		self.assertEqual(self.compile_plan('-o', 'mtu=9000',
+				'-o', 'up=echo x', '--jobs', '4', '-X', 'eth9',
+				'--netlink'), 0)
+		with open(self.path) as pfile:
+			lines = pfile.read().splitlines()
+		fallback = lines[lines.index('fallback() {') + 1].split()
+		self.assertEqual(fallback, ['exec', 'ifup', '--all', '-i',
+				self.interfaces, '-X', 'eth9', '-o', 'mtu=9000',
+				'-o', "'up=echo", "x'", '--no-scripts',
+				'--netlink', '--jobs', '4'])
+
+		## The plan body has the same overrides baked in
+		steps = [line for line in lines if line.startswith('\tenv -i ')]
+		self.assertTrue(steps[0].endswith(' VERBOSITY=0 ip link set '
+				'dev eth0 up mtu 9000 || return 1'))
+		self.assertTrue(steps[-1].endswith(" /bin/sh -c 'echo x' || "
+				'return 1'))
+
+	def test_timeouts(self):
+		for option in ('--command-timeout', '--phase-timeout'):
+			self.assertEqual(self.compile_plan(option, '5'), 2)
+			self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+	unittest.main()
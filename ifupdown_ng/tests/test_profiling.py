@@ -0,0 +1,86 @@
+"""
+ifupdown_ng.tests.test_profiling  -  Tests for the "--profile" option
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import pstats
+import unittest
+
+from ifupdown_ng import profiling
+from ifupdown_ng.tests import fixtures
+
+
+def _work():
+	return sum(xrange(100))
+
+
+class WriteStatsTestCase(fixtures.TempDirTestCase):
+	"""Write profiles as text or as pstats dumps"""
+	def setUp(self):
+		super(WriteStatsTestCase, self).setUp()
+		self.startup = profiling.new_profiler()
+		self.startup.runcall(_work)
+		self.main = profiling.new_profiler()
+		self.main.runcall(_work)
+		self.path = os.path.join(self.tmpdir, 'profile')
+
+	def test_text(self):
+		profiling.write_stats(self.path, [('startup', None),
+				('execute', self.main)])
+		with open(self.path) as pfile:
+			text = pfile.read()
+		self.assertTrue(text.startswith('==== execute ====\n'))
+		self.assertNotIn('==== startup', text)
+		self.assertIn('_work', text)
+
+	def test_pstats(self):
+		profiling.write_stats(self.path, [('startup', self.startup),
+				('execute', self.main)], fmt='pstats')
+		for path in (self.path, self.path + '.startup'):
+			stats = pstats.Stats(path)
+			self.assertIn('_work', [func[2]
+				for func in stats.stats])
+		self.assertEqual(sorted(os.listdir(self.tmpdir)),
+				['profile', 'profile.startup'])
+
+	def test_pstats_stderr(self):
+		with self.assertRaises(ValueError):
+			profiling.write_stats('-', [('execute', self.main)],
+					fmt='pstats')
+
+	def test_command(self):
+		## "-" cannot hold a binary dump, so nothing is written
+		args = ['--list', '-i', self.write_file('profile.if',
+				'auto eth0\niface eth0 inet manual\n')]
+		status, _ = fixtures.run_command('ifquery', args + [
+				'--profile', '-', '--profile-format', 'pstats'])
+		self.assertEqual(status, 2)
+		self.assertFalse(os.path.exists('-'))
+
+		status, output = fixtures.run_command('ifquery', args +
+				['--profile', self.path, '--profile-format',
+				'pstats'])
+		self.assertEqual((status, output), (0, 'eth0\n'))
+		self.assertIn('execute', [func[2] for func in
+				pstats.Stats(self.path).stats])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,190 @@
+"""
+ifupdown_ng.tests.test_replay  -  Tests for recording and replaying runs
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import os
+import unittest
+
+from ifupdown_ng import linkwait
+from ifupdown_ng import replay
+from ifupdown_ng import simulate
+from ifupdown_ng import state
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+auto eth0 eth1 eth2
+
+mapping eth*
+	script /sbin/map
+
+iface net-eth0 inet static
+	address 192.0.2.1/24
+	link-wait 5
+
+iface net-eth1 inet manual
+	link-wait 5
+	up /usr/local/sbin/announce $IFACE
+
+iface net-eth2 inet static
+	address 198.51.100.1/24
+'''
+
+
+class FakeLinkWaiter(object):
+	"""Stands in for linkwait.LinkWaiter while recording"""
+	CARRIER = {'eth0': True, 'eth1': False}
+
+	def wait(self, ifname, timeout):
+		del timeout
+		return self.CARRIER[ifname]
+
+
+class ObservedLinkWaiter(replay.ReplayLinkWaiter):
+	"""A ReplayLinkWaiter which keeps what it answered with"""
+	def __init__(self, replayer):
+		super(ObservedLinkWaiter, self).__init__(replayer)
+		self.answers = []
+
+	def wait(self, ifname, timeout):
+		carrier = super(ObservedLinkWaiter, self).wait(ifname, timeout)
+		self.answers.append((ifname, carrier))
+		return carrier
+
+
+class ObservedReplayer(replay.Replayer):
+	"""A Replayer which keeps what it answered with"""
+	last = None
+
+	def __init__(self, path):
+		super(ObservedReplayer, self).__init__(path)
+		self.answers = []
+		self.link_waiter = ObservedLinkWaiter(self)
+		ObservedReplayer.last = self
+
+	def spawn(self, argv, env, **kwargs):
+		proc = super(ObservedReplayer, self).spawn(argv, env, **kwargs)
+		output = proc.communicate()[0]
+		self.answers.append(_answer(argv, env, proc.returncode,
+				output))
+		return proc
+
+
+def _answer(argv, env, status, output):
+	return (tuple(argv), env.get('IFACE'), env.get('PHASE'), status,
+			output or '')
+
+
+class RoundTripTestCase(fixtures.TempDirTestCase):
+	"""Replaying a recorded run gives the same results"""
+	def setUp(self):
+		super(RoundTripTestCase, self).setUp()
+		self.addCleanup(setattr, state, 'STATE_FILE', state.STATE_FILE)
+		state.STATE_FILE = os.path.join(self.tmpdir, 'ifstate')
+		self.addCleanup(setattr, linkwait, 'LinkWaiter',
+				linkwait.LinkWaiter)
+		linkwait.LinkWaiter = FakeLinkWaiter
+		self.addCleanup(setattr, replay, 'Replayer', replay.Replayer)
+		replay.Replayer = ObservedReplayer
+		self.trace = os.path.join(self.tmpdir, 'trace.json')
+
+	def run_ifup(self, config, *args):
+		## Commands are only ever run on a simulated system
+		system = simulate.SimulatedSystem({'ip': 0.01},
+				{'/sbin/map': lambda ifname, data:
+					'net-%s\n' % ifname})
+		for ifname in ('eth0', 'eth1', 'eth2'):
+			system.add_link(ifname)
+		system.install()
+		try:
+			status, _ = fixtures.run_command('ifup', ['-i',
+					self.write_file('interfaces', config),
+					'--all', '--no-scripts', '-j', '3'] +
+					list(args))
+		finally:
+			system.uninstall()
+		return status, system
+
+	def recorded(self):
+		with open(self.trace) as tfile:
+			events = [json.loads(line) for line in tfile]
+		answers = [_answer(event['argv'], event['env'],
+					event['status'], event.get('output'))
+				for event in events if event['event'] == 'exec']
+		waits = [(event['iface'], event['carrier'])
+				for event in events if event['event'] == 'wait']
+		return answers, waits
+
+	def test_round_trip(self):
+		status, system = self.run_ifup(INTERFACES, '--record',
+				self.trace)
+		self.assertEqual(status, 0)
+		self.assertEqual(system.links['eth0'].addresses,
+				['192.0.2.1/24'])
+		answers, waits = self.recorded()
+		self.assertEqual(sorted(waits),
+				[('eth0', True), ('eth1', False)])
+		self.assertIn((('/sbin/map', 'eth2'), None, None, 0,
+				'net-eth2\n'), answers)
+
+		## Nothing is run during the replay, but the commands get
+		## the same answers in the same order for each interface
+		status, system = self.run_ifup(INTERFACES, '--replay',
+				self.trace)
+		self.assertEqual(status, 0)
+		self.assertEqual(sum(system.spawns.itervalues()), 0)
+		self.assertEqual(system.links['eth0'].addresses, [])
+		replayer = ObservedReplayer.last
+		self.assertEqual(replayer.unmatched, 0)
+		self.assertEqual(sorted(replayer.answers), sorted(answers))
+		for ifname in ('eth0', 'eth1', 'eth2'):
+			self.assertEqual([answer for answer in replayer.answers
+					if answer[1] == ifname],
+					[answer for answer in answers
+					if answer[1] == ifname])
+		self.assertEqual(sorted(replayer.link_waiter.answers),
+				sorted(waits))
+
+	def test_diverged(self):
+		## A command which was never recorded fails as though it
+		## were missing, which fails its interface, but the others
+		## are still answered from the trace
+		self.assertEqual(self.run_ifup(INTERFACES, '--record',
+				self.trace)[0], 0)
+		answers = self.recorded()[0]
+		status, _ = self.run_ifup(INTERFACES.replace('192.0.2.1/24',
+				'192.0.2.9/24'), '--replay', self.trace)
+		self.assertEqual(status, 1)
+		replayer = ObservedReplayer.last
+		self.assertEqual(replayer.unmatched, 1)
+		for ifname in (None, 'eth1', 'eth2'):
+			self.assertEqual([answer for answer in replayer.answers
+					if answer[1] == ifname],
+					[answer for answer in answers
+					if answer[1] == ifname])
+		self.assertEqual([answer[0] for answer in replayer.answers
+				if answer[1] == 'eth0'],
+				[('ip', 'link', 'set', 'dev', 'eth0', 'up')])
+		self.assertEqual(replayer.link_waiter.answers,
+				[('eth1', False)])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,93 @@
+"""
+ifupdown_ng.tests.test_schedule  -  Tests for the interface scheduler
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from ifupdown_ng import schedule
+from ifupdown_ng.commands import ifcheck
+
+
+class SchedulerTestCase(unittest.TestCase):
+	"""Run tasks in order and signal when the critical ones are done"""
+	def setUp(self):
+		self.events = []
+		self.lock = threading.Lock()
+		self.log = ifcheck.MessageCollector()
+		schedule.LOGGER.addHandler(self.log)
+		self.addCleanup(schedule.LOGGER.removeHandler, self.log)
+
+	def task(self, key):
+		with self.lock:
+			self.events.append(key)
+		return key != 'bad'
+
+	def on_ready(self):
+		## The scheduler's lock must be free for other threads
+		result = []
+		def try_lock():
+			result.append(self.scheduler._cond.acquire(False))
+			if result[0]:
+				self.scheduler._cond.release()
+		thread = threading.Thread(target=try_lock)
+		thread.start()
+		thread.join()
+		with self.lock:
+			self.events.append(('ready', result[0]))
+
+	def run_tasks(self, jobs, keys, deps, critical=()):
+		self.scheduler = schedule.Scheduler(self.task, jobs=jobs,
+				on_ready=self.on_ready)
+		return self.scheduler.run(keys, deps, critical)
+
+	def test_critical(self):
+		for jobs in (1, 4):
+			del self.events[:]
+			results = self.run_tasks(jobs, ['a', 'b', 'c', 'd'],
+					{'c': set(['d'])}, critical=['c', 'd'])
+			self.assertEqual(results, dict.fromkeys('abcd', True))
+			ready = self.events.index(('ready', True))
+			self.assertEqual(sorted(self.events[:ready]),
+					['c', 'd'])
+			self.assertEqual(self.events.count(('ready', True)), 1)
+			self.assertEqual(len(self.events), 5)
+
+	def test_no_critical(self):
+		self.run_tasks(1, ['a', 'b'], {})
+		self.assertEqual(self.events, ['a', 'b', ('ready', True)])
+
+	def test_failed_dependency(self):
+		## A skipped critical task still completes the critical set
+		for jobs in (1, 4):
+			del self.events[:]
+			results = self.run_tasks(jobs, ['bad', 'c', 'x'],
+					{'c': set(['bad'])},
+					critical=['bad', 'c'])
+			self.assertEqual(results, {'bad': False, 'c': False,
+					'x': True})
+			self.assertEqual(self.events, ['bad', ('ready', True),
+					'x'])
+		self.assertEqual([msg['message'] for msg in self.log.messages],
+				['Skipping c: bad failed'] * 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,128 @@
+"""
+ifupdown_ng.tests.test_script  -  Tests for running commands and hooks
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import time
+import unittest
+
+from ifupdown_ng import script
+from ifupdown_ng import spawn
+from ifupdown_ng.tests import fixtures
+
+## Writes "PID PGRP" for the shell, from /proc/self/stat
+_SHOW_GROUP = 'read pid comm state ppid pgrp rest < /proc/$$/stat; ' \
+		'echo "$pid $pgrp" > "$0"'
+
+
+class ProcessGroupTestCase(fixtures.TempDirTestCase):
+	"""Commands with a timeout run (and are killed) as a new group"""
+	def setUp(self):
+		super(ProcessGroupTestCase, self).setUp()
+		self.env = script.Environment(cwd=self.tmpdir)
+
+	def group_of(self, timeout):
+		path = os.path.join(self.tmpdir, 'group')
+		status = self.env.call(['/bin/sh', '-c', _SHOW_GROUP, path],
+				timeout=timeout)
+		self.assertEqual(status, 0)
+		with open(path) as gfile:
+			pid, pgrp = gfile.read().split()
+		return int(pid), int(pgrp)
+
+	def check_groups(self):
+		pid, pgrp = self.group_of(timeout=None)
+		self.assertEqual(pgrp, os.getpgrp())
+		pid, pgrp = self.group_of(timeout=30)
+		self.assertEqual(pgrp, pid)
+
+	def test_subprocess(self):
+		self.assertIs(spawn.SERVER, None)
+		self.check_groups()
+
+	def test_spawn_server(self):
+		spawn.start_server()
+		try:
+			self.check_groups()
+		finally:
+			spawn.stop_server()
+
+	def test_timeout(self):
+		## The command's children are killed along with it
+		path = os.path.join(self.tmpdir, 'child')
+		start = time.time()
+		with self.assertRaises(script.TimeoutExpired):
+			self.env.call(['/bin/sh', '-c', 'sleep 30 & '
+					'echo $! > "$0"; wait', path],
+					timeout=0.3)
+		self.assertLess(time.time() - start, 10)
+		with open(path) as cfile:
+			child = int(cfile.read())
+		for _ in xrange(100):
+			if not _is_running(child):
+				break
+			time.sleep(0.01)
+		self.assertFalse(_is_running(child))
+
+
+class WaitTestCase(fixtures.TempDirTestCase):
+	"""Timed commands are noticed as soon as they exit"""
+	def setUp(self):
+		super(WaitTestCase, self).setUp()
+		self.env = script.Environment(cwd=self.tmpdir)
+
+	def check_wait(self):
+		## Polling with a backoff from 1ms to 50ms would check at
+		## 113ms and then 163ms, noticing the exit about 45ms late
+		for command, expected in (('sleep 0.115', 0),
+				('sleep 0.115; exit 3', 3)):
+			start = time.time()
+			status = self.env.call(['/bin/sh', '-c', command],
+					timeout=30)
+			self.assertEqual(status, expected)
+			self.assertLess(time.time() - start, 0.115 + 0.03)
+
+	def test_subprocess(self):
+		self.check_wait()
+
+	def test_spawn_server(self):
+		spawn.start_server()
+		try:
+			self.check_wait()
+		finally:
+			spawn.stop_server()
+
+	def test_wait_pid(self):
+		## A pid which does not exist has already exited
+		self.assertIn(spawn.wait_pid(2 ** 22 + 1, 1.0), (True, None))
+		self.assertIn(spawn.wait_pid(os.getpid(), 0.05), (False, None))
+
+
+def _is_running(pid):
+	## A killed child which has not been reaped yet is a zombie
+	try:
+		with open('/proc/%d/stat' % pid) as sfile:
+			return sfile.read().split()[2] != 'Z'
+	except IOError:
+		return False
+
+
+if __name__ == '__main__':
+	unittest.main()
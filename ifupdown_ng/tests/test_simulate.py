@@ -0,0 +1,224 @@
+"""
+ifupdown_ng.tests.test_simulate  -  Tests for the simulated system
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import os
+import time
+import unittest
+
+from ifupdown_ng import simulate
+from ifupdown_ng import spawn
+from ifupdown_ng import state
+from ifupdown_ng import sysfs
+from ifupdown_ng.tests import fixtures
+
+
+class ProcessTestCase(unittest.TestCase):
+	"""A simulated command exits once its latency has passed"""
+	def test_poll(self):
+		proc = simulate.SimulatedProcess(simulate.FIRST_PID, 0.05, 3,
+				None)
+		self.assertIs(proc.poll(), None)
+		time.sleep(0.06)
+		self.assertEqual(proc.poll(), 3)
+
+	def test_wait(self):
+		proc = simulate.SimulatedProcess(simulate.FIRST_PID, 0.05, 3,
+				'output\n')
+		start = time.time()
+		self.assertIs(proc.wait(0.01), None)
+		self.assertLess(time.time() - start, 0.04)
+		self.assertEqual(proc.communicate(), ('output\n', None))
+		self.assertGreaterEqual(time.time() - start, 0.05)
+		self.assertEqual(proc.returncode, 3)
+
+	def test_no_latency(self):
+		proc = simulate.SimulatedProcess(simulate.FIRST_PID, 0, 0, None)
+		self.assertEqual(proc.poll(), 0)
+		self.assertEqual(proc.wait(0), 0)
+
+
+class SystemTestCase(fixtures.TempDirTestCase):
+	"""Commands change the fake link table"""
+	def setUp(self):
+		super(SystemTestCase, self).setUp()
+		self.system = simulate.SimulatedSystem({'ip': 0.01, None: 0},
+				{'/sbin/map': self.mapping})
+		self.eth0 = self.system.add_link('eth0')
+		self.eth1 = self.system.add_link('eth1', mtu=9000,
+				carrier=False)
+		self.mapped = []
+
+	def mapping(self, ifname, data):
+		self.mapped.append((ifname, data))
+		return 'net-%s\n' % ifname
+
+	def call(self, *argv):
+		return self.system.spawn(list(argv), {}).wait()
+
+	def ip(self, args):
+		return self.call('ip', *args.split())
+
+	def test_add_link(self):
+		self.assertEqual(self.eth1.index, 2)
+		self.assertEqual(self.eth1.hwaddress, '02:00:00:00:00:02')
+		self.assertEqual(self.eth1.mtu, 9000)
+		self.assertFalse(self.eth0.is_up)
+		self.assertEqual(self.eth0.operstate, 'down')
+
+	def test_link(self):
+		self.assertEqual(self.ip('link set dev eth0 up mtu 9000'), 0)
+		self.assertTrue(self.eth0.is_up)
+		self.assertEqual(self.eth0.operstate, 'up')
+		self.assertEqual(self.eth0.mtu, 9000)
+
+		## Without a carrier the link is up but not running
+		self.assertEqual(self.ip('link set dev eth1 up'), 0)
+		self.assertTrue(self.eth1.is_up)
+		self.assertEqual(self.eth1.operstate, 'down')
+
+		self.assertEqual(self.ip('link set dev eth0 down'), 0)
+		self.assertFalse(self.eth0.is_up)
+		self.assertEqual(self.eth0.operstate, 'down')
+
+	def test_addr(self):
+		self.assertEqual(self.ip('addr add 192.0.2.1/24 dev eth0'), 0)
+		self.assertEqual(self.ip('addr add 192.0.2.1/24 dev eth0'), 2)
+		self.assertEqual(self.eth0.addresses, ['192.0.2.1/24'])
+		self.assertEqual(self.ip('addr del 192.0.2.1/24 dev eth0'), 0)
+		self.assertEqual(self.ip('addr del 192.0.2.1/24 dev eth0'), 2)
+		self.assertEqual(self.eth0.addresses, [])
+
+	def test_errors(self):
+		self.assertEqual(self.ip('route add default via 192.0.2.254 '
+				'dev eth0'), 0)
+		self.assertEqual(self.ip('link set dev eth9 up'), 1)
+		self.assertEqual(self.ip('link set eth0 up'), 1)
+		self.assertEqual(self.ip('neigh flush dev eth0'), 1)
+		self.assertFalse(self.eth0.is_up)
+
+	def test_other(self):
+		## Everything else succeeds without changing anything
+		proc = self.system.spawn(['/etc/network/if-up.d/hook'], {},
+				capture=True)
+		self.assertEqual(proc.communicate(), ('', None))
+		self.assertEqual(proc.returncode, 0)
+		self.assertEqual(self.system.spawns, {'hook': 1})
+
+	def test_mapping(self):
+		proc = self.system.spawn(['/sbin/map', 'eth0'], {},
+				capture=True, data='key\n')
+		self.assertEqual(proc.communicate(), ('net-eth0\n', None))
+		self.assertEqual(self.mapped, [('eth0', 'key\n')])
+		with self.assertRaises(OSError) as context:
+			self.system.spawn(['/sbin/missing', 'eth0'], {},
+					capture=True, data='')
+		self.assertEqual(context.exception.errno, errno.ENOENT)
+
+	def test_latency(self):
+		start = time.time()
+		self.assertEqual(self.call('true'), 0)
+		self.assertLess(time.time() - start, 0.01)
+		self.assertEqual(self.ip('link set dev eth0 up'), 0)
+		self.assertGreaterEqual(time.time() - start, 0.01)
+		self.assertEqual(self.system.spawns, {'ip': 1, 'true': 1})
+
+	def test_pids(self):
+		## Fake pids can never be signalled by mistake
+		pids = [self.system.spawn(['true'], {}).pid for _ in xrange(3)]
+		self.assertEqual(len(set(pids)), 3)
+		self.assertTrue(all(pid > simulate.FIRST_PID for pid in pids))
+		with self.assertRaises(OSError) as context:
+			os.kill(-pids[0], 0)
+		self.assertEqual(context.exception.errno, errno.ESRCH)
+
+	def test_install(self):
+		previous = spawn.SERVER
+		self.assertIs(self.system.install(), self.system)
+		self.assertIs(spawn.SERVER, self.system)
+		self.system.uninstall()
+		self.assertIs(spawn.SERVER, previous)
+
+	def test_write_tree(self):
+		self.ip('link set dev eth0 up')
+		self.ip('addr add 2001:db8::1/64 dev eth0')
+		self.system.write_tree(self.tmpdir)
+		links = sysfs.read_snapshot(self.tmpdir)
+		self.assertTrue(links['eth0'].is_up)
+		self.assertEqual(links['eth0'].addresses, ['2001:db8::1/64'])
+
+
+INTERFACES = '''\
+auto eth0 eth1
+iface eth0 inet static
+	address 192.0.2.1/24
+	mtu 9000
+
+iface eth1 inet manual
+	up /usr/local/sbin/announce $IFACE
+'''
+
+
+class IfupTestCase(fixtures.TempDirTestCase):
+	"""Run ifup and ifdown against a simulated system"""
+	def setUp(self):
+		super(IfupTestCase, self).setUp()
+		self.addCleanup(setattr, state, 'STATE_FILE', state.STATE_FILE)
+		state.STATE_FILE = os.path.join(self.tmpdir, 'ifstate')
+		self.system = simulate.SimulatedSystem({'ip': 0.01,
+				'sh': 0.2})
+		self.system.add_link('eth0')
+		self.system.add_link('eth1')
+		self.system.install()
+		self.addCleanup(self.system.uninstall)
+		self.interfaces = self.write_file('interfaces', INTERFACES)
+
+	def run_command(self, command, *args):
+		return fixtures.run_command(command, ['-i', self.interfaces,
+				'--all', '--no-scripts'] + list(args))[0]
+
+	def test_ifup(self):
+		self.assertEqual(self.run_command('ifup', '-j', '2'), 0)
+		eth0 = self.system.links['eth0']
+		self.assertTrue(eth0.is_up)
+		self.assertEqual(eth0.mtu, 9000)
+		self.assertEqual(eth0.addresses, ['192.0.2.1/24'])
+		self.assertTrue(self.system.links['eth1'].is_up)
+		self.assertEqual(self.system.spawns['sh'], 1)
+		self.assertEqual(sorted(state.StateFile().load().interfaces),
+				['eth0', 'eth1'])
+
+		self.assertEqual(self.run_command('ifdown'), 0)
+		self.assertFalse(eth0.is_up)
+		self.assertEqual(eth0.addresses, [])
+		self.assertEqual(state.StateFile().load().interfaces, {})
+
+	def test_timeout(self):
+		## A simulated command can be timed out like a real one
+		self.assertEqual(self.run_command('ifup',
+				'--command-timeout', '0.05'), 1)
+		self.assertTrue(self.system.links['eth0'].is_up)
+		self.assertEqual(state.StateFile().load().interfaces.keys(),
+				['eth0'])
+
+
+if __name__ == '__main__':
+	unittest.main()
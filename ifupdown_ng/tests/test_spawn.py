@@ -0,0 +1,248 @@
+"""
+ifupdown_ng.tests.test_spawn  -  Tests for the fork server
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import errno
+import os
+import signal
+import socket
+import threading
+import time
+import unittest
+
+from ifupdown_ng import spawn
+
+
+class MessageTestCase(unittest.TestCase):
+	"""Split the byte stream back into messages"""
+	def encode(self, message):
+		sock_a, sock_b = socket.socketpair()
+		try:
+			spawn._send(sock_a, message)
+			return sock_b.recv(65536)
+		finally:
+			sock_a.close()
+			sock_b.close()
+
+	def test_split(self):
+		first = (1, ['/bin/true'], {'PATH': '/bin'}, None, False,
+				True, None)
+		second = ('exited', 1, 0, 'output\n')
+		data = self.encode(first) + self.encode(second)
+		self.assertEqual(spawn._split_messages(data),
+				([first, second], ''))
+
+	def test_partial(self):
+		## A message is only returned once all of it has arrived
+		data = self.encode(('started', 1, 1234))
+		for split in xrange(len(data)):
+			messages, rest = spawn._split_messages(data[:split])
+			self.assertEqual((messages, rest), ([], data[:split]))
+			self.assertEqual(spawn._split_messages(rest +
+					data[split:] + data[:split]),
+					([('started', 1, 1234)], data[:split]))
+
+
+def _children(pid):
+	## Return the state of each child of 'pid', from /proc
+	states = []
+	for name in os.listdir('/proc'):
+		if not name.isdigit():
+			continue
+		try:
+			with open('/proc/%s/stat' % name) as sfile:
+				stat = sfile.read()
+		except IOError:
+			continue
+		fields = stat[stat.rindex(')') + 2:].split()
+		if int(fields[1]) == pid:
+			states.append(fields[0])
+	return states
+
+
+class ServerTestCase(unittest.TestCase):
+	"""Talk to the server directly, one message at a time"""
+	def setUp(self):
+		self.sock, server_sock = socket.socketpair(socket.AF_UNIX,
+				socket.SOCK_STREAM)
+		self.pid = os.fork()
+		if self.pid == 0:
+			try:
+				self.sock.close()
+				spawn._serve(server_sock)
+			finally:
+				os._exit(0)
+		server_sock.close()
+		self.sock.settimeout(10)
+		self.buf = ''
+		self.replies = []
+		self.next_id = 0
+
+	def tearDown(self):
+		self.sock.close()
+		os.waitpid(self.pid, 0)
+
+	def request(self, argv, new_group=False, capture=False, data=None):
+		self.next_id += 1
+		spawn._send(self.sock, (self.next_id, argv, dict(os.environ),
+				None, new_group, capture, data))
+		return self.next_id
+
+	def reply(self):
+		while not self.replies:
+			data = self.sock.recv(65536)
+			self.assertTrue(data)
+			self.replies, self.buf = spawn._split_messages(
+					self.buf + data)
+		return self.replies.pop(0)
+
+	def test_exited(self):
+		job_id = self.request(['/bin/sh', '-c', 'exit 3'])
+		started = self.reply()
+		self.assertEqual(started[:2], ('started', job_id))
+		exited = self.reply()
+		self.assertEqual(exited[:2], ('exited', job_id))
+		self.assertTrue(os.WIFEXITED(exited[2]))
+		self.assertEqual(os.WEXITSTATUS(exited[2]), 3)
+		self.assertEqual(exited[3], '')
+
+	def test_signaled(self):
+		self.request(['/bin/sh', '-c', 'kill -TERM $$'])
+		self.assertEqual(self.reply()[0], 'started')
+		status = self.reply()[2]
+		self.assertTrue(os.WIFSIGNALED(status))
+		self.assertEqual(os.WTERMSIG(status), signal.SIGTERM)
+
+	def test_error(self):
+		## A command which cannot be exec()ed is never started
+		job_id = self.request(['/nonexistent/command'])
+		self.assertEqual(self.reply(), ('error', job_id, errno.ENOENT))
+
+	def test_capture(self):
+		## The output is sent with the exit status, even if the pipe
+		## is closed after the command has been reaped
+		job_id = self.request(['/bin/sh', '-c', 'cat; echo done; '
+				'exec >&-; sleep 0.1'], capture=True,
+				data='line 1\nline 2\n')
+		self.assertEqual(self.reply()[0], 'started')
+		self.assertEqual(self.reply(), ('exited', job_id, 0,
+				'line 1\nline 2\ndone\n'))
+
+	def test_new_group(self):
+		for new_group in (False, True):
+			job_id = self.request(['/bin/sh', '-c',
+					'read pid comm state ppid pgrp rest '
+					'< /proc/$$/stat; echo $pgrp'],
+					new_group=new_group, capture=True)
+			pid = self.reply()[2]
+			exited = self.reply()
+			self.assertEqual(exited[1], job_id)
+			pgrp = int(exited[3])
+			if new_group:
+				self.assertEqual(pgrp, pid)
+			else:
+				self.assertEqual(pgrp, os.getpgid(self.pid))
+
+	def test_concurrent(self):
+		## Replies for each job come back as it finishes, not in the
+		## order the jobs were started
+		slow = self.request(['/bin/sh', '-c', 'sleep 0.3'])
+		fast = self.request(['/bin/true'])
+		replies = [self.reply() for _ in xrange(4)]
+		self.assertEqual([reply[:2] for reply in replies
+				if reply[0] == 'exited'],
+				[('exited', fast), ('exited', slow)])
+
+	def test_reaped(self):
+		## Every finished job is reaped, leaving no zombies behind
+		for _ in xrange(5):
+			self.request(['/bin/sh', '-c', 'sleep 0.05 & exit 0'])
+		self.request(['/nonexistent/command'])
+		replies = [self.reply() for _ in xrange(11)]
+		self.assertEqual(sorted(reply[0] for reply in replies),
+				['error'] + ['exited'] * 5 + ['started'] * 5)
+		self.assertEqual(_children(self.pid), [])
+
+	def test_close(self):
+		## The server exits once the connection is closed
+		self.sock.shutdown(socket.SHUT_WR)
+		self.assertEqual(self.sock.recv(65536), '')
+
+
+class ClientTestCase(unittest.TestCase):
+	"""Run commands through the global SERVER"""
+	def setUp(self):
+		self.client = spawn.start_server()
+
+	def tearDown(self):
+		spawn.stop_server()
+
+	def test_spawn(self):
+		process = self.client.spawn(['/bin/sh', '-c',
+				'echo $X; exit 2'], {'X': 'value'},
+				capture=True)
+		self.assertEqual(process.communicate(), ('value\n', None))
+		self.assertEqual(process.poll(), 2)
+
+	def test_signaled(self):
+		process = self.client.spawn(['/bin/sh', '-c', 'kill -KILL $$'],
+				{})
+		self.assertEqual(process.wait(), -signal.SIGKILL)
+
+	def test_error(self):
+		with self.assertRaises(OSError) as context:
+			self.client.spawn(['/nonexistent/command'], {})
+		self.assertEqual(context.exception.errno, errno.ENOENT)
+
+	def test_wait_timeout(self):
+		process = self.client.spawn(['/bin/sh', '-c', 'sleep 0.2'], {})
+		self.assertIs(process.wait(0.01), None)
+		self.assertEqual(process.wait(10), 0)
+
+	def test_threads(self):
+		## Requests from several threads each get their own reply
+		results = dict()
+		def run(index):
+			process = self.client.spawn(['/bin/sh', '-c',
+					'echo %d' % index], {}, capture=True)
+			results[index] = process.communicate()[0]
+		threads = [threading.Thread(target=run, args=(index,))
+				for index in xrange(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(results, dict((index, '%d\n' % index)
+				for index in xrange(8)))
+		self.assertEqual(_children(self.client.pid), [])
+
+	def test_server_gone(self):
+		## A command still running when the server dies can never be
+		## reaped, so it is reported as killed
+		process = self.client.spawn(['/bin/sh', '-c', 'sleep 30'], {})
+		os.kill(self.client.pid, signal.SIGKILL)
+		start = time.time()
+		self.assertEqual(process.wait(), -signal.SIGKILL)
+		self.assertLess(time.time() - start, 10)
+		os.kill(process.pid, signal.SIGKILL)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,138 @@
+"""
+ifupdown_ng.tests.test_state  -  Tests for fingerprints and the state file
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import hashlib
+import os
+import unittest
+
+from ifupdown_ng import state
+from ifupdown_ng.tests import fixtures
+
+INTERFACES = '''\
+iface eth0 inet static
+	address 192.0.2.1/24
+	mtu 9000
+	up echo one
+	up echo two
+'''
+
+
+class FingerprintTestCase(fixtures.TempDirTestCase):
+	"""Stanzas and files are fingerprinted by their contents"""
+	def fingerprint(self, text):
+		configs = self.load_config(text).configs_by_name(['eth0'])
+		return configs['eth0'][0].fingerprint
+
+	def test_stanza(self):
+		fingerprint = self.fingerprint(INTERFACES)
+		self.assertEqual(len(fingerprint), 40)
+
+		## Single-valued options may be given in any order
+		self.assertEqual(self.fingerprint('iface eth0 inet static\n'
+				'\tmtu 9000\n\tup echo one\n'
+				'\taddress 192.0.2.1/24\n\tup echo two\n'),
+				fingerprint)
+
+		## The commands are run in order, so that is part of it
+		self.assertNotEqual(self.fingerprint(INTERFACES.replace('one',
+				'three').replace('two', 'one').replace(
+				'three', 'two')), fingerprint)
+		self.assertNotEqual(self.fingerprint(INTERFACES.replace('9000',
+				'1500')), fingerprint)
+
+		## The name, family and method are covered too
+		self.assertNotEqual(self.fingerprint(INTERFACES.replace('inet',
+				'inet6').replace('192.0.2.1/24',
+				'2001:db8::1/64')), fingerprint)
+
+	def test_files(self):
+		sysconfig = self.load_config(INTERFACES)
+		self.assertEqual(sysconfig.file_fingerprints, [
+			(os.path.join(self.tmpdir, 'interfaces'),
+				hashlib.sha1(INTERFACES).hexdigest()),
+		])
+		before = sysconfig.fingerprint
+		self.assertEqual(self.load_config(INTERFACES).fingerprint,
+				before)
+		self.assertNotEqual(self.load_config(INTERFACES +
+				'\n').fingerprint, before)
+
+	def test_ifquery(self):
+		path = self.write_file('query.if', INTERFACES)
+		status, output = fixtures.run_command('ifquery', ['-i', path,
+				'--fingerprint', 'eth0'])
+		self.assertEqual(status, 0)
+		self.assertEqual(output, '%s  eth0 inet static\n'
+				% self.fingerprint(INTERFACES))
+		status, output = fixtures.run_command('ifquery', ['-i', path,
+				'--fingerprint', '--list'])
+		self.assertEqual(status, 0)
+		digest = hashlib.sha1(INTERFACES).hexdigest()
+		self.assertEqual(output.splitlines(), [
+			'%s  %s' % (digest, path),
+			'%s  -' % hashlib.sha1('%s\0%s\0' % (path,
+					digest)).hexdigest(),
+		])
+
+
+class StateFileTestCase(fixtures.TempDirTestCase):
+	"""The state file records exactly which stanzas were applied"""
+	def setUp(self):
+		super(StateFileTestCase, self).setUp()
+		self.configs = self.load_config(INTERFACES +
+				'iface eth0 inet6 auto\n').configs_by_name(
+				['eth0'])['eth0']
+		self.path = os.path.join(self.tmpdir, 'run', 'ifstate')
+
+	def test_round_trip(self):
+		statefile = state.StateFile(self.path)
+		self.assertEqual(statefile.load().interfaces, {})
+		statefile.mark_up('eth0', self.configs)
+		statefile.save()
+
+		loaded = state.StateFile(self.path).load()
+		self.assertEqual(sorted(loaded.interfaces), ['eth0'])
+		self.assertEqual(loaded['eth0'].config_name, 'eth0')
+		self.assertTrue(loaded.is_current('eth0', self.configs))
+		self.assertFalse(loaded.is_current('eth0', self.configs[:1]))
+		self.assertFalse(loaded.is_current('eth1', self.configs))
+		with open(self.path) as sfile:
+			lines = sfile.read().splitlines()
+		self.assertEqual([line.split('\t')[:4] for line in lines], [
+			['eth0', 'eth0', 'inet', 'static'],
+			['eth0', 'eth0', 'inet6', 'auto'],
+		])
+
+		loaded.mark_down('eth0')
+		loaded.save()
+		self.assertEqual(state.StateFile(self.path).load().interfaces,
+				{})
+
+	def test_changed(self):
+		statefile = state.StateFile(self.path)
+		statefile.mark_up('eth0', self.configs)
+		changed = self.load_config(INTERFACES.replace('9000', '1500') +
+				'iface eth0 inet6 auto\n').configs_by_name(
+				['eth0'])['eth0']
+		self.assertFalse(statefile.is_current('eth0', changed))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+"""
+ifupdown_ng.tests.test_sysfs  -  Tests for kernel state snapshots
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import os
+import unittest
+
+from ifupdown_ng import netlink
+from ifupdown_ng import simulate
+from ifupdown_ng import sysfs
+from ifupdown_ng.tests import fixtures
+
+
+class FakeTreeTestCase(fixtures.TempDirTestCase):
+	"""Read state from a fake /sys and /proc written by simulate"""
+	def setUp(self):
+		super(FakeTreeTestCase, self).setUp()
+		self.root = os.path.join(self.tmpdir, 'root')
+		system = simulate.SimulatedSystem()
+		system.add_link('br0')
+		eth0 = system.add_link('eth0', mtu=9000, carrier=False)
+		eth0.addresses.extend(['2001:db8::1/64', '192.0.2.1/24'])
+		system.write_tree(self.root)
+		os.symlink('../br0', os.path.join(self.root,
+				'sys/class/net/eth0/master'))
+
+	def test_links(self):
+		links = sysfs.read_snapshot(self.root)
+		self.assertEqual(sorted(links), ['br0', 'eth0'])
+		eth0 = links['eth0']
+		self.assertEqual(eth0.index, 2)
+		self.assertEqual(eth0.mtu, 9000)
+		self.assertEqual(eth0.carrier, False)
+		self.assertEqual(eth0.operstate, 'down')
+		self.assertEqual(eth0.master, 'br0')
+		self.assertFalse(eth0.is_up)
+		self.assertEqual(links['br0'].master, None)
+
+	def test_fake_root_addresses(self):
+		## Only IPv6 addresses can be read from a fake tree
+		links = sysfs.read_snapshot(self.root)
+		self.assertEqual(links['eth0'].addresses, ['2001:db8::1/64'])
+		self.assertEqual(links['br0'].addresses, [])
+
+	def test_netlink_addresses(self):
+		## A recorded dump gives the addresses of both families
+		transport = netlink.RecordedNetlink([
+			fixtures.new_address(1, 2, '192.0.2.1/24') +
+			fixtures.new_address(1, 2, '2001:db8::1/64') +
+			fixtures.new_address(1, 7, '198.51.100.1/24') +
+			fixtures.done(1),
+		])
+		links = sysfs.read_snapshot(self.root, transport)
+		self.assertEqual(links['eth0'].addresses,
+				['192.0.2.1/24', '2001:db8::1/64'])
+		self.assertEqual(links['br0'].addresses, [])
+
+		## The request was for every address of every family
+		self.assertEqual(len(transport.sent), 1)
+		msg_type, flags = netlink.NLMSGHDR.unpack_from(
+				transport.sent[0])[1:3]
+		self.assertEqual(msg_type, netlink.RTM_GETADDR)
+		self.assertEqual(flags & netlink.NLM_F_DUMP,
+				netlink.NLM_F_DUMP)
+
+	def test_missing_tree(self):
+		missing = os.path.join(self.tmpdir, 'missing')
+		self.assertEqual(sysfs.read_snapshot(missing), {})
+
+	def test_ifquery_state_root(self):
+		config = self.write_file('interfaces',
+				'iface eth0 inet manual\n')
+		status, output = fixtures.run_command('ifquery', ['-i', config,
+				'--state', '--state-root', self.root,
+				'--format', 'json', 'eth0', 'eth1=eth0'])
+		self.assertEqual(status, 0)
+		records = [json.loads(line) for line in output.splitlines()]
+		self.assertEqual([r['iface'] for r in records],
+				['eth0', 'eth1'])
+		state = records[0]['state']
+		self.assertEqual(state['mtu'], 9000)
+		self.assertEqual(state['master'], 'br0')
+		self.assertEqual(state['addresses'], ['2001:db8::1/64'])
+		self.assertEqual(records[1]['state'], None)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,120 @@
+"""
+ifupdown_ng.tests.test_trace  -  Tests for tracing spans
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import json
+import os
+import thread
+import threading
+import unittest
+
+from ifupdown_ng import trace
+from ifupdown_ng.tests import fixtures
+
+
+class TracerTestCase(unittest.TestCase):
+	"""Spans are recorded as Chrome trace-event "complete" events"""
+	def setUp(self):
+		self.addCleanup(trace.disable)
+
+	def test_disabled(self):
+		self.assertIs(trace.TRACER, None)
+		with trace.span('x', 'exec', iface='eth0') as span:
+			span.set(status=0)
+		self.assertIs(span, trace.NULL_SPAN)
+
+	def test_spans(self):
+		tracer = trace.enable()
+		self.assertIs(trace.TRACER, tracer)
+		with trace.span('outer', 'iface', iface='eth0'):
+			with trace.span('inner', 'exec') as span:
+				span.set(status=3)
+			explicit = trace.span('parse', 'config')
+			explicit.end()
+		self.assertIs(trace.disable(), tracer)
+		self.assertIs(trace.span('x', 'exec'), trace.NULL_SPAN)
+
+		self.assertEqual([(event['name'], event['cat'], event['args'])
+			for event in tracer.events], [
+			('inner', 'exec', {'status': 3}),
+			('parse', 'config', {}),
+			('outer', 'iface', {'iface': 'eth0'}),
+		])
+		inner, _, outer = tracer.events
+		for event in tracer.events:
+			self.assertEqual(event['ph'], 'X')
+			self.assertEqual(event['pid'], os.getpid())
+			self.assertEqual(event['tid'], thread.get_ident())
+		self.assertLessEqual(outer['ts'], inner['ts'])
+		self.assertLessEqual(inner['ts'] + inner['dur'],
+				outer['ts'] + outer['dur'])
+
+	def test_exception(self):
+		tracer = trace.enable()
+		with self.assertRaises(KeyError):
+			with trace.span('failed', 'exec'):
+				raise KeyError('x')
+		self.assertEqual(tracer.events[0]['args'],
+				{'exception': 'KeyError'})
+
+	def test_threads(self):
+		tracer = trace.enable()
+		idents = []
+		def run():
+			idents.append(thread.get_ident())
+			with trace.span('thread', 'iface'):
+				pass
+		thread_obj = threading.Thread(target=run)
+		thread_obj.start()
+		thread_obj.join()
+		self.assertEqual(tracer.events[0]['tid'], idents[0])
+		self.assertNotEqual(idents[0], thread.get_ident())
+
+
+class TraceFileTestCase(fixtures.TempDirTestCase):
+	"""Write the spans of a whole command with "--trace" """
+	def test_write(self):
+		tracer = trace.Tracer()
+		tracer.span('x', 'exec', iface='eth0').end()
+		path = os.path.join(self.tmpdir, 'trace.json')
+		tracer.write(path)
+		with open(path) as tfile:
+			data = json.load(tfile)
+		self.assertEqual(data['displayTimeUnit'], 'ms')
+		self.assertEqual(data['traceEvents'], tracer.events)
+
+	def test_command(self):
+		path = os.path.join(self.tmpdir, 'trace.json')
+		status, _ = fixtures.run_command('ifup', ['-n', '--force',
+				'-i', self.write_file('trace.if',
+					'iface eth0 inet manual\n'),
+				'eth0', '--trace', path])
+		self.assertEqual(status, 0)
+		self.assertIs(trace.TRACER, None)
+		with open(path) as tfile:
+			events = json.load(tfile)['traceEvents']
+		names = [event['name'] for event in events]
+		self.assertEqual(names[-1], 'ifup')
+		self.assertIn('load config', names)
+		self.assertIn('start eth0', names)
+
+
+if __name__ == '__main__':
+	unittest.main()
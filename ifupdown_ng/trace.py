@@ -0,0 +1,165 @@
+"""
+ifupdown_ng.trace  -  Lightweight execution tracing
+Copyright (C) 2012-2013  Kyle Moffett <kyle@moffetthome.net>
+
+This program is free software; you can redistribute it and/or modify it
+under the terms of version 2 of the GNU General Public License, as
+published by the Free Software Foundation.
+
+This program is distributed in the hope that it will be useful, but
+WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; otherwise you can obtain it here:
+  http://www.gnu.org/licenses/gpl-2.0.txt
+"""
+
+## Futureproofing boilerplate
+from __future__ import absolute_import
+
+import os
+import thread
+import time
+
+
+## The currently active Tracer object, or None when tracing is disabled.
+## Instrumented code should always go through span() so that the disabled
+## case costs no more than a global lookup and a function call.
+TRACER = None
+
+
+class _NullSpan(object):
+	"""A do-nothing span returned when tracing is disabled"""
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, exc_tb):
+		return False
+
+	def set(self, **_unused_args):
+		"""Ignore any span arguments"""
+		pass
+
+	def end(self):
+		"""Ignore the end of the span"""
+		pass
+
+NULL_SPAN = _NullSpan()
+
+
+class Span(object):
+	"""A single timed region of execution
+
+	Spans may be used as context managers or ended explicitly with the
+	end() method, which is useful when the region does not correspond
+	to a single block of code (EG: the parsing of a sourced file).
+
+	Attributes:
+		tracer: The Tracer which will record this span
+		name: A short human-readable name for the span
+		category: The trace-event category (EG: "config", "exec")
+		args: Dict of extra data to attach to the trace event
+		start: The time.time() at which the span started
+		tid: The thread which started the span
+	"""
+	__slots__ = ('tracer', 'name', 'category', 'args', 'start', 'tid')
+
+	def __init__(self, tracer, name, category, args):
+		self.tracer = tracer
+		self.name = name
+		self.category = category
+		self.args = args
+		self.tid = thread.get_ident()
+		self.start = time.time()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, exc_tb):
+		if exc_type is not None:
+			self.args['exception'] = exc_type.__name__
+		self.end()
+		return False
+
+	def set(self, **args):
+		"""Attach extra data (EG: a pid or exit status) to the span"""
+		self.args.update(args)
+
+	def end(self):
+		"""Finish the span and record it with the tracer"""
+		self.tracer.record(self, time.time())
+
+
+class Tracer(object):
+	"""Collector of completed spans
+
+	Completed spans are stored as Chrome trace-event "complete" events,
+	which may be loaded into chrome://tracing or any compatible viewer.
+
+	Attributes:
+		events: List of trace-event dicts in order of completion
+		pid: The process ID recorded for each event
+	"""
+	def __init__(self):
+		self.events = []
+		self.pid = os.getpid()
+
+	def span(self, name, category, **args):
+		"""Start a new span"""
+		return Span(self, name, category, args)
+
+	def record(self, span, end):
+		"""Record a completed span"""
+		## Note that list.append() is atomic, so no locking is needed
+		self.events.append({
+			'name': span.name,
+			'cat': span.category,
+			'ph': 'X',
+			'ts': int(span.start * 1000000),
+			'dur': int((end - span.start) * 1000000),
+			'pid': self.pid,
+			'tid': span.tid,
+			'args': span.args,
+		})
+
+	def write(self, path):
+		"""Write all of the recorded events in Chrome JSON format
+
+		Raises:
+			IOError: If the file cannot be written
+		"""
+		import json
+		with open(path, 'w') as tfile:
+			json.dump({
+				'traceEvents': self.events,
+				'displayTimeUnit': 'ms',
+			}, tfile, sort_keys=True)
+			tfile.write('\n')
+
+
+def enable(tracer=None):
+	"""Begin tracing with a global Tracer and return it
+
+	Any object with the span() and record() methods of a Tracer may be
+	given (EG: a metrics.MetricsCollector), otherwise a new Tracer is
+	created.
+	"""
+	global TRACER # pylint: disable=W0603
+	TRACER = tracer if tracer is not None else Tracer()
+	return TRACER
+
+def disable():
+	"""Stop tracing and return the previous global Tracer"""
+	global TRACER # pylint: disable=W0603
+	tracer, TRACER = TRACER, None
+	return tracer
+
+def span(name, category, **args):
+	"""Start a new span with the global Tracer, if any"""
+	if TRACER is None:
+		return NULL_SPAN
+	return TRACER.span(name, category, **args)
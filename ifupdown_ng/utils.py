@@ -37,3 +37,24 @@ def interface_is_alias(iface):
 def interface_device(iface):
 	"""Return the physical device portion of an interface name"""
 	return iface.split(':', 1)[0]
+
+def is_interface_pattern(pattern):
+	"""Return True if an interface glob pattern is more than one name"""
+	return any(char in pattern for char in '*?[')
+
+def interface_matches(iface, patterns):
+	"""Return True if an interface name matches any of the glob patterns"""
+	## Imported here to keep startup fast when no patterns are used
+	import fnmatch
+	for pattern in patterns or ():
+		if fnmatch.fnmatchcase(iface, pattern):
+			return True
+	return False
+
+def split_interface_arg(arg):
+	"""Split an "IFACE[=CONFIG-NAME]" argument into (iface, config_name)
+
+	The config_name is None if it was not explicitly specified.
+	"""
+	iface, sep, config_name = arg.partition('=')
+	return (iface, config_name if sep else None)